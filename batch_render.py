@@ -0,0 +1,225 @@
+#
+# batch_render.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import getopt
+import math
+import os
+import sys
+import time
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.image
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import render
+from tiles import TileRenderer
+
+MODES = ('polygons', 'raster', 'ray')
+FORMATS = ('png', 'npy')
+
+
+# accumulates the time spent in each phase of the frames, in the order the phases were first seen
+class PhaseTimer:
+    def __init__(self):
+        self.totals = {}
+        self.phase = None
+        self.start = None
+
+    def begin(self, phase):
+        self.end()
+        self.phase = phase
+        self.start = time.perf_counter()
+
+    def end(self):
+        if self.phase is not None:
+            self.totals[self.phase] = self.totals.get(self.phase, 0.0) + time.perf_counter() - self.start
+            self.phase = None
+
+    def total(self):
+        return sum(self.totals.values())
+
+
+# reads a camera path: one pose per line with azimuth, elevation, angle and distance, separated by spaces or
+# commas. Missing values keep the ones of the previous pose, lines starting with # are skipped
+def read_camera_path(file_name):
+    poses = []
+    pose = [0.0, 0.0, 0.0, 5.0]
+    with open(file_name) as file:
+        for line in file:
+            values = line.split('#')[0].replace(',', ' ').split()
+            if not values:
+                continue
+            pose = [float(value) for value in values[:4]] + pose[len(values):]
+            poses.append(tuple(pose))
+    return poses
+
+
+# a full turn around the Y axis in the given number of frames
+def turntable(frames, elevation=0.0, distance=5.0):
+    return [(-math.pi + 2 * math.pi * frame / frames, elevation, 0.0, distance) for frame in range(frames)]
+
+
+# renders the frames of a camera path without any window. The polygons are drawn on an 800x800 Agg canvas, the
+# other modes write the framebuffer of the frustum. With processes, the ray mode splits the pixel grid in tiles
+# traced by that many worker processes. Returns the timer with the time of each phase
+def render_path(file_name, poses, light_angles, mode='polygons', output=None, output_format='png', resolution=(80, 80),
+                use_cache=True, lod=False, processes=None):
+    timer = PhaseTimer()
+    timer.begin('load')
+    figure = Figure(figsize=(8, 8), dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    axes = figure.add_subplot(111, aspect=1.0)
+    light = render.Vector3D(1.0, 0.0, 0.0)
+    frustum = render.Frustum(6, 6, poses[0][3], -100.0, resolution[0], resolution[1], axes, light)
+    frustum.set_light(*light_angles)
+    scene = render.Scene3D(file_name, axes, frustum, light)
+    scene.parse_file(use_cache, lod)
+    axes.set_xlim(-frustum.half_width, frustum.half_width)
+    axes.set_ylim(-frustum.half_height, frustum.half_height)
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+
+    for frame, (azimuth, elevation, angle, distance) in enumerate(poses):
+        timer.begin('camera')
+        frustum.azimuth, frustum.elevation, frustum.angle, frustum.front = azimuth, elevation, angle, distance
+        frustum.update_base()
+
+        timer.begin('cull+transform')
+        indices, points = scene.transform()
+        if mode == 'polygons':
+            timer.begin('sort')
+            order = scene.sorter.order(indices, points[:, :, 2].max(axis=1))
+            timer.begin('shade')
+            colors = scene.shade(indices[order])
+            timer.begin('draw')
+            scene.draw_polygons(points[order][:, :, :2], colors)
+            canvas.draw()
+            image = np.asarray(canvas.buffer_rgba())[:, :, :3]
+        elif mode == 'raster':
+            if scene.rasterizer is None:
+                scene.rasterizer = render.Rasterizer(frustum)
+            timer.begin('shade')
+            colors = scene.shade(indices)
+            timer.begin('draw')
+            scene.rasterizer.clear()
+            image = scene.rasterizer.draw(points, colors, indices)
+        elif processes is not None:
+            if scene.tile_renderer is None:
+                timer.begin('workers')
+                scene.tile_renderer = TileRenderer(scene, processes)
+            timer.begin('trace')
+            image, _ = scene.tile_renderer.render(indices)
+        else:
+            if scene.bvh is None:
+                timer.begin('bvh')
+                scene.bvh = render.BVH(scene.mesh, scene.triangle_data)
+            visible = np.zeros(len(scene.mesh), dtype=bool)
+            visible[indices] = True
+            timer.begin('trace')
+            eye, directions = scene.camera_rays()
+            _, triangles, _, _ = scene.bvh.intersect_packet(eye, directions, visible)
+            timer.begin('shade')
+            image = scene.shade_pixels(triangles.reshape(frustum.y_res, frustum.x_res))
+
+        if output is not None:
+            timer.begin('write')
+            path = os.path.join(output, f'frame_{frame:04d}.{output_format}')
+            if output_format == 'npy':
+                np.save(path, image)
+            else:
+                matplotlib.image.imsave(path, image)
+    timer.end()
+    scene.close_tile_renderer()
+    return timer
+
+
+def print_report(timer, frames):
+    rendering = timer.total() - timer.totals.get('load', 0.0)
+    print(f'{frames} frames in {rendering:.3f} s, {frames / rendering if rendering > 0 else math.inf:.1f} fps')
+    for phase, seconds in timer.totals.items():
+        per_frame = '' if phase == 'load' else f', {1000 * seconds / frames:.3f} ms/frame'
+        share = '' if phase == 'load' or rendering == 0 else f' ({100 * seconds / rendering:.1f}%)'
+        print(f'  {phase:<16}{1000 * seconds:10.3f} ms{per_frame}{share}')
+
+
+def main(argv):
+    file_name = None
+    path_file = None
+    frames = 36
+    light_angles = (0.0, 0.0)
+    mode = 'polygons'
+    output = None
+    output_format = 'png'
+    resolution = (80, 80)
+    use_cache = True
+    lod = False
+    processes = None
+    try:
+        opts, args = getopt.getopt(argv, "hi:p:n:l:m:o:f:r:j:",
+                                   ["help", "input=", "path=", "frames=", "light=", "mode=", "output=", "format=",
+                                    "resolution=", "no-cache", "lod", "processes="])
+    except getopt.GetoptError:
+        print('batch_render -h or batch_render --help for list of options')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            print_usage()
+            sys.exit()
+        elif opt in ("-i", "--input"):
+            file_name = arg
+        elif opt in ("-p", "--path"):
+            path_file = arg
+        elif opt in ("-n", "--frames"):
+            frames = int(arg)
+        elif opt in ("-l", "--light"):
+            light_angles = tuple(float(value) for value in arg.split(','))
+        elif opt in ("-m", "--mode"):
+            mode = arg
+        elif opt in ("-o", "--output"):
+            output = arg
+        elif opt in ("-f", "--format"):
+            output_format = arg
+        elif opt in ("-r", "--resolution"):
+            resolution = tuple(int(value) for value in arg.lower().split('x'))
+        elif opt == "--no-cache":
+            use_cache = False
+        elif opt == "--lod":
+            lod = True
+        elif opt in ("-j", "--processes"):
+            processes = int(arg)
+
+    if file_name is None or mode not in MODES or output_format not in FORMATS or len(light_angles) != 2 or \
+            len(resolution) != 2 or (processes is not None and (mode != 'ray' or processes < 1)):
+        print_usage()
+        sys.exit(2)
+
+    poses = read_camera_path(path_file) if path_file is not None else turntable(frames)
+    if not poses:
+        print(f'{path_file} has no camera poses')
+        sys.exit(2)
+    timer = render_path(file_name, poses, light_angles, mode, output, output_format, resolution, use_cache, lod,
+                        processes)
+    print_report(timer, len(poses))
+
+
+def print_usage():
+    print("batch_render -i [OBJ file] [options]")
+    print("-i, --input: OBJ file to render")
+    print("-p, --path: camera path file, one 'azimuth elevation angle distance' pose per line")
+    print("-n, --frames: frames of the turntable rendered when there is no camera path (36)")
+    print("-l, --light: light azimuth,elevation (0,0)")
+    print("-m, --mode: " + ', '.join(MODES) + " (polygons)")
+    print("-o, --output: directory for the frames, nothing is written when missing")
+    print("-f, --format: " + ', '.join(FORMATS) + " (png)")
+    print("-r, --resolution: WIDTHxHEIGHT of the frustum (80x80)")
+    print("--no-cache: parse the OBJ file even when its mesh cache is valid")
+    print("-j, --processes: trace the ray mode in tiles on this many worker processes")
+    print("--lod: build the levels of detail and draw the coarsest one within a pixel of each object")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
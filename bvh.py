@@ -0,0 +1,221 @@
+#
+# bvh.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import math
+import numpy as np
+from intersect import TriangleData
+from intersect import intersect_rays
+
+
+def surface_area(low, high):
+    extent = np.maximum(high - low, 0.0)
+    return 2.0 * (extent[0] * extent[1] + extent[1] * extent[2] + extent[2] * extent[0])
+
+
+class BVH:
+    # bounding volume hierarchy over the triangles of a mesh, given as an (N, 3, 3) array. The nodes are stored in
+    # flat arrays in depth first order: the left child of an inner node is the next node, right holds the index of
+    # the right child (-1 for leaves), and the triangles of a leaf are indices[start:start + count].
+    # triangles is the TriangleData of the mesh, computed here when not given
+    def __init__(self, vertices, triangles=None, leaf_size=4, method='sah', bins=16):
+        self.vertices = np.asarray(vertices, dtype=float)
+        if triangles is None:
+            triangles = TriangleData(self.vertices)
+        self.triangles = triangles
+        self.leaf_size = leaf_size
+        self.method = method
+        self.bins = bins
+
+        self.triangle_lows = self.vertices.min(axis=1)
+        self.triangle_highs = self.vertices.max(axis=1)
+        self.centroids = self.vertices.mean(axis=1)
+        self.indices = np.arange(len(self.vertices))
+
+        lows, highs, rights, starts, counts = [], [], [], [], []
+        if len(self.vertices) > 0:
+            self.build(0, len(self.vertices), lows, highs, rights, starts, counts)
+        self.lows = np.array(lows, dtype=float).reshape(-1, 3)
+        self.highs = np.array(highs, dtype=float).reshape(-1, 3)
+        self.right = np.array(rights, dtype=int)
+        self.start = np.array(starts, dtype=int)
+        self.count = np.array(counts, dtype=int)
+
+    # the flat arrays of the tree, without the triangle data
+    def arrays(self):
+        return {'lows': self.lows, 'highs': self.highs, 'right': self.right, 'start': self.start, 'count': self.count,
+                'indices': self.indices}
+
+    # rebuilds a tree from the arrays returned by arrays() without building it again
+    @classmethod
+    def from_arrays(cls, arrays, triangles):
+        bvh = cls.__new__(cls)
+        for name in ('lows', 'highs', 'right', 'start', 'count', 'indices'):
+            setattr(bvh, name, arrays[name])
+        bvh.triangles = triangles
+        return bvh
+
+    def build(self, start, end, lows, highs, rights, starts, counts):
+        triangles = self.indices[start:end]
+        low = self.triangle_lows[triangles].min(axis=0)
+        high = self.triangle_highs[triangles].max(axis=0)
+
+        node = len(lows)
+        lows.append(low)
+        highs.append(high)
+        rights.append(-1)
+        starts.append(start)
+        counts.append(end - start)
+
+        if end - start <= self.leaf_size:
+            return node
+        middle = self.split(start, end, low, high)
+        if middle is None:
+            return node
+
+        counts[node] = 0
+        self.build(start, middle, lows, highs, rights, starts, counts)
+        rights[node] = self.build(middle, end, lows, highs, rights, starts, counts)
+        return node
+
+    # reorders indices[start:end] and returns the position where the right child starts, or None if the node
+    # should stay a leaf
+    def split(self, start, end, low, high):
+        triangles = self.indices[start:end]
+        centroids = self.centroids[triangles]
+        centroid_low = centroids.min(axis=0)
+        centroid_high = centroids.max(axis=0)
+        extent = centroid_high - centroid_low
+        if extent.max() <= 0.0:
+            return None
+
+        if self.method == 'sah':
+            split = self.sah_split(triangles, centroids, centroid_low, extent, low, high)
+            if split is None:
+                return None
+            axis, bin_ids, bin_index = split
+            left = bin_ids[:, axis] <= bin_index
+        else:
+            # median split along the axis where the centroids spread the most
+            axis = int(np.argmax(extent))
+            half = (end - start) // 2
+            left = np.zeros(end - start, dtype=bool)
+            left[np.argpartition(centroids[:, axis], half)[:half]] = True
+
+        middle = start + int(np.count_nonzero(left))
+        if middle == start or middle == end:
+            return None
+        self.indices[start:end] = np.concatenate((triangles[left], triangles[~left]))
+        return middle
+
+    # binned surface area heuristic. Returns the best axis, the bin of every triangle and the last bin going to
+    # the left child, or None when no split is cheaper than keeping the triangles in one leaf
+    def sah_split(self, triangles, centroids, centroid_low, extent, low, high):
+        bins = self.bins
+        safe_extent = np.where(extent > 0, extent, 1.0)
+        bin_ids = ((centroids - centroid_low) / safe_extent * bins).astype(int).clip(0, bins - 1)
+        triangle_lows = self.triangle_lows[triangles]
+        triangle_highs = self.triangle_highs[triangles]
+
+        best_cost = len(triangles) * surface_area(low, high)
+        best = None
+        for axis in range(3):
+            if extent[axis] <= 0:
+                continue
+            bin_counts = np.bincount(bin_ids[:, axis], minlength=bins)
+            bin_lows = np.full((bins, 3), math.inf)
+            bin_highs = np.full((bins, 3), -math.inf)
+            np.minimum.at(bin_lows, bin_ids[:, axis], triangle_lows)
+            np.maximum.at(bin_highs, bin_ids[:, axis], triangle_highs)
+
+            # bounds and counts of everything left of (and including) each bin, and right of it
+            left_lows = np.minimum.accumulate(bin_lows)
+            left_highs = np.maximum.accumulate(bin_highs)
+            right_lows = np.minimum.accumulate(bin_lows[::-1])[::-1]
+            right_highs = np.maximum.accumulate(bin_highs[::-1])[::-1]
+            left_counts = np.cumsum(bin_counts)
+            for bin_index in range(bins - 1):
+                left_count = left_counts[bin_index]
+                right_count = len(triangles) - left_count
+                if left_count == 0 or right_count == 0:
+                    continue
+                cost = (left_count * surface_area(left_lows[bin_index], left_highs[bin_index]) +
+                        right_count * surface_area(right_lows[bin_index + 1], right_highs[bin_index + 1]))
+                if cost < best_cost:
+                    best_cost = cost
+                    best = (axis, bin_ids, bin_index)
+        return best
+
+    # returns the distance along the ray (in units of direction) and the index of the nearest triangle hit, or
+    # (inf, -1). When mask is given, only the triangles where mask is True are considered
+    def intersect(self, origin, direction, mask=None):
+        t, ids, _, _ = self.intersect_packet(origin, np.asarray(direction, dtype=float).reshape(1, 3), mask)
+        return t[0], int(ids[0])
+
+    # traverses the tree with a packet of rays at once, dropping at each node the rays that miss its box or already
+    # hit something nearer. Of the two children of a node, the one the rays enter first on average is visited first.
+    # Takes and returns the same arrays as intersect.intersect_rays
+    def intersect_packet(self, origins, directions, mask=None):
+        origins = np.asarray(origins, dtype=float)
+        directions = np.asarray(directions, dtype=float).reshape(-1, 3)
+        ray_count = len(directions)
+        best_t = np.full(ray_count, math.inf)
+        best_ids = np.full(ray_count, -1)
+        best_u = np.zeros(ray_count)
+        best_v = np.zeros(ray_count)
+        if len(self.lows) == 0 or ray_count == 0:
+            return best_t, best_ids, best_u, best_v
+
+        shared_origin = origins.ndim == 1
+        ray_origins = np.broadcast_to(origins, directions.shape)
+        with np.errstate(divide='ignore'):
+            inverse = 1.0 / directions
+
+        rays = np.arange(ray_count)
+        stack = [(0, rays, self.box_distance(0, ray_origins, inverse))]
+        while stack:
+            node, rays, entry = stack.pop()
+            rays = rays[entry < best_t[rays]]
+            if len(rays) == 0:
+                continue
+            right = self.right[node]
+            if right >= 0:
+                children = []
+                for child in (node + 1, right):
+                    child_entry = self.box_distance(child, ray_origins[rays], inverse[rays])
+                    hit = child_entry < best_t[rays]
+                    if np.any(hit):
+                        children.append((float(child_entry[hit].mean()), child, rays[hit], child_entry[hit]))
+                # the child the rays enter first is traversed first, so its hits can prune the other one
+                children.sort(key=lambda item: item[0], reverse=True)
+                stack.extend(item[1:] for item in children)
+                continue
+
+            start = self.start[node]
+            triangles = self.indices[start:start + self.count[node]]
+            if mask is not None:
+                triangles = triangles[mask[triangles]]
+            if len(triangles) == 0:
+                continue
+            t, ids, u, v = intersect_rays(origins if shared_origin else origins[rays], directions[rays],
+                                          self.triangles, triangles)
+            closer = t < best_t[rays]
+            hit_rays = rays[closer]
+            best_t[hit_rays] = t[closer]
+            best_ids[hit_rays] = ids[closer]
+            best_u[hit_rays] = u[closer]
+            best_v[hit_rays] = v[closer]
+        return best_t, best_ids, best_u, best_v
+
+    # slab test of the box of a node against many rays. Returns the distance where each ray enters the box, or inf
+    # if it misses it
+    def box_distance(self, node, origins, inverse):
+        with np.errstate(invalid='ignore'):
+            t0 = (self.lows[node] - origins) * inverse
+            t1 = (self.highs[node] - origins) * inverse
+        # fmin/fmax skip the nans of rays that are parallel to a slab and start on its border
+        t_near = np.maximum(np.fmax.reduce(np.fmin(t0, t1), axis=1), 0.0)
+        t_far = np.fmin.reduce(np.fmax(t0, t1), axis=1)
+        return np.where(t_far >= t_near, t_near, math.inf)
@@ -5,6 +5,7 @@
 #
 
 import render
+from render_loop import RenderLoop
 import tkinter as tki
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
@@ -35,45 +36,30 @@ c2.get_tk_widget().pack(side=tki.TOP, fill=tki.BOTH, expand=1)
 light = render.Vector3D(0.3, 0.5, 0.8)
 frustum = render.Frustum(6, 6, camera_dist, -100.0, 80, 80, plt2, light)
 scene = render.Scene3D('face.obj', plt2, frustum, light)
-scene.parse_file()
+scene.parse_file(lod=True)
 scene.camera_distance = camera_dist
 
 
+# frames are rendered on a background worker, with coarser levels of detail while a slider is dragged
+loop = RenderLoop(scene, on_frame=lambda frame: c2.draw(), budget=0.05, idle_time=0.25)
+
+
 def on_distance_changed(value):
     global camera_dist
     camera_dist = float(value)
-    plt2.clear()
-    plt2.plot([-box_size, box_size, box_size, -box_size, -box_size],
-              [-box_size, -box_size, box_size, box_size, -box_size], color='w')
-    scene.set_camera_distance(camera_dist)
-    c2.draw()
+    loop.request(distance=camera_dist)
 
 
 def on_angle_changed(value):
-    camera_ang = float(value)
-    plt2.clear()
-    plt2.plot([-box_size, box_size, box_size, -box_size, -box_size],
-              [-box_size, -box_size, box_size, box_size, -box_size], color='w')
-    scene.set_angle(camera_ang)
-    c2.draw()
+    loop.request(angle=float(value))
 
 
 def on_elevation_changed(value):
-    camera_elev = float(value)
-    plt2.clear()
-    plt2.plot([-box_size, box_size, box_size, -box_size, -box_size],
-              [-box_size, -box_size, box_size, box_size, -box_size], color='w')
-    scene.set_elevation(camera_elev)
-    c2.draw()
+    loop.request(elevation=float(value))
 
 
 def on_azimuth_changed(value):
-    camera_az = float(value)
-    plt2.clear()
-    plt2.plot([-box_size, box_size, box_size, -box_size, -box_size],
-              [-box_size, -box_size, box_size, box_size, -box_size], color='w')
-    scene.set_azimuth(camera_az)
-    c2.draw()
+    loop.request(azimuth=float(value))
 
 
 camera_label = tki.Label(top1, text="Camera")
@@ -105,6 +91,7 @@ distance.grid(row=4, column=1, sticky=W)
 
 
 def on_closing():
+    loop.stop()
     root.quit()
     root.destroy()
 
@@ -116,5 +103,6 @@ root.withdraw()
 plt2.plot([-box_size, box_size, box_size, -box_size, -box_size], [-box_size, -box_size, box_size, box_size, -box_size],
           color='w')
 scene.project_fast()
+loop.start(root)
 
 tki.mainloop()
@@ -0,0 +1,73 @@
+#
+# frame_cache.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+from collections import OrderedDict
+import numpy as np
+
+
+def frame_size(frame):
+    return sum(value.nbytes for value in frame.values() if isinstance(value, np.ndarray))
+
+
+class FrameCache:
+    # least recently used store of prepared frames (the dicts of Scene3D.prepare_frame), so a pose seen before is
+    # drawn again without any geometry work. Frames are keyed by the content hash of the mesh, the camera and light
+    # angles rounded to the resolution of the sliders (camera_step and light_step), the camera distance and the LOD
+    # threshold they were rendered with. The oldest frames are evicted when they take more than budget_mb megabytes
+    def __init__(self, budget_mb=64, camera_step=0.01, light_step=0.1):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.camera_step = camera_step
+        self.light_step = light_step
+        self.frames = OrderedDict()
+        self.size = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'evicted_bytes': 0}
+
+    def key(self, scene, threshold):
+        frustum = scene.frustum
+        camera = tuple(round(value / self.camera_step) for value in (frustum.azimuth, frustum.elevation,
+                                                                     frustum.angle, frustum.front))
+        light = tuple(round(value / self.light_step) for value in frustum.light_angles)
+        return (scene.mesh_hash,) + camera + light + (threshold,)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __contains__(self, key):
+        return key in self.frames
+
+    # the cached frame for key, or None. Returns a copy of the dict so the caller can annotate it
+    def get(self, key):
+        frame = self.frames.get(key)
+        if frame is None:
+            self.stats['misses'] += 1
+            return None
+        self.frames.move_to_end(key)
+        self.stats['hits'] += 1
+        return dict(frame)
+
+    def put(self, key, frame):
+        frame = {name: value for name, value in frame.items() if isinstance(value, np.ndarray)}
+        size = frame_size(frame)
+        if size > self.budget:
+            return
+        if key in self.frames:
+            self.size -= frame_size(self.frames.pop(key))
+        self.frames[key] = frame
+        self.size += size
+        while self.size > self.budget:
+            _, evicted = self.frames.popitem(last=False)
+            evicted_size = frame_size(evicted)
+            self.size -= evicted_size
+            self.stats['evictions'] += 1
+            self.stats['evicted_bytes'] += evicted_size
+
+    def clear(self):
+        self.frames.clear()
+        self.size = 0
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
@@ -0,0 +1,95 @@
+#
+# intersect.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import math
+import numpy as np
+
+
+class TriangleData:
+    # per triangle data needed by the ray tests, computed once when the mesh is loaded. vertices is an (N, 3, 3)
+    # array. The plane of each triangle is normal . p + offset = 0
+    def __init__(self, vertices):
+        vertices = np.asarray(vertices, dtype=float).reshape(-1, 3, 3)
+        self.p0 = vertices[:, 0]
+        self.edge1 = vertices[:, 1] - vertices[:, 0]
+        self.edge2 = vertices[:, 2] - vertices[:, 0]
+        self.normal = np.cross(self.edge1, self.edge2)
+        self.offset = -np.einsum('ij,ij->i', self.normal, self.p0)
+
+    def __len__(self):
+        return len(self.p0)
+
+    def arrays(self):
+        return {'p0': self.p0, 'edge1': self.edge1, 'edge2': self.edge2, 'normal': self.normal, 'offset': self.offset}
+
+    # rebuilds the data from the arrays returned by arrays(), e.g. after attaching to them from another process
+    @classmethod
+    def from_arrays(cls, arrays):
+        triangles = cls.__new__(cls)
+        for name in ('p0', 'edge1', 'edge2', 'normal', 'offset'):
+            setattr(triangles, name, arrays[name])
+        return triangles
+
+
+# Möller–Trumbore for many rays against many triangles in one call. origins is either one point shared by all the
+# rays, as for a camera, or an (R, 3) array, and directions is (R, 3). ids selects the triangles to test (all of
+# them by default). Returns, for every ray, the distance to the nearest hit in units of its direction (inf when
+# it hits nothing), the id of the triangle (-1) and the barycentric coordinates u, v of the hit point. The
+# triangles are processed in chunks to bound the size of the (R, chunk) intermediate arrays
+def intersect_rays(origins, directions, triangles, ids=None, chunk_size=1024):
+    origins = np.asarray(origins, dtype=float)
+    directions = np.asarray(directions, dtype=float).reshape(-1, 3)
+    ray_count = len(directions)
+    if ids is None:
+        ids = np.arange(len(triangles))
+    ids = np.asarray(ids)
+
+    best_t = np.full(ray_count, math.inf)
+    best_ids = np.full(ray_count, -1)
+    best_u = np.zeros(ray_count)
+    best_v = np.zeros(ray_count)
+    rays = np.arange(ray_count)
+
+    for first in range(0, len(ids), chunk_size):
+        chunk = ids[first:first + chunk_size]
+        p0 = triangles.p0[chunk]
+        edge1 = triangles.edge1[chunk]
+        edge2 = triangles.edge2[chunk]
+
+        # the determinant of the system is -direction . normal
+        determinant = -(directions @ triangles.normal[chunk].T)
+        if origins.ndim == 1:
+            # with a shared origin everything left is one matrix product per term
+            s = origins - p0
+            q = np.cross(s, edge1)
+            u = directions @ np.cross(edge2, s).T
+            v = directions @ q.T
+            t = np.broadcast_to(np.einsum('ij,ij->i', edge2, q), determinant.shape)
+        else:
+            s = origins[:, np.newaxis, :] - p0[np.newaxis]
+            q = np.cross(s, edge1)
+            u = np.einsum('rk,rck->rc', directions, np.cross(edge2, s))
+            v = np.einsum('rk,rck->rc', directions, q)
+            t = np.einsum('ck,rck->rc', edge2, q)
+
+        # rays parallel to a triangle get infinite or undefined u, v and t, which the determinant test discards
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inverse = 1.0 / determinant
+            u = u * inverse
+            v = v * inverse
+            t = t * inverse
+            hit = (determinant != 0) & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 0)
+        t = np.where(hit, t, math.inf)
+
+        nearest = np.argmin(t, axis=1)
+        nearest_t = t[rays, nearest]
+        closer = nearest_t < best_t
+        best_t[closer] = nearest_t[closer]
+        best_ids[closer] = chunk[nearest[closer]]
+        best_u[closer] = u[rays, nearest][closer]
+        best_v[closer] = v[rays, nearest][closer]
+
+    return best_t, best_ids, best_u, best_v
@@ -9,6 +9,7 @@ import random
 import sys
 import getopt
 import numbers
+import numpy as np
 
 
 def rotation_matrix_axis_x(elevation=0.0):
@@ -28,6 +29,149 @@ def rotation_matrix_axis_z(angle=0.0):
                      math.sin(angle), math.cos(angle), 0,
                      0, 0, 1)
 
+# the points of a sample as an (N, dimension) float array. The sample can be a list of vectors, a Vector3DArray or
+# a NumPy array
+def point_array(points, dimension):
+    if isinstance(points, Vector3DArray):
+        return points.array
+    if isinstance(points, np.ndarray):
+        return points.astype(float, copy=False).reshape(-1, dimension)
+    return np.array([point.components() for point in points], dtype=float).reshape(-1, dimension)
+
+
+# population covariance of the rows of an (N, dimension) array
+def covariance_array(points):
+    centered = points - points.mean(axis=0)
+    return centered.T @ centered / len(points)
+
+
+# vertices of the convex hull of an (N, 2) array of points, counter-clockwise and without collinear points
+# (Andrew's monotone chain). The points inside the octagon of the extreme points along the axes and the diagonals
+# are dropped first with array operations (Akl-Toussaint); the chain is a Python loop over the points left, which
+# for most samples are a few, but all of them when the points lie on a convex curve
+def convex_hull(points):
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(points) >= 8:
+        directions = np.array([[1, 0], [1, 1], [0, 1], [-1, 1], [-1, 0], [-1, -1], [0, -1], [1, -1]])
+        extremes = np.argmax(points @ directions.T, axis=0)
+        # the extremes in counter-clockwise direction order are the corners of a convex polygon
+        _, first = np.unique(extremes, return_index=True)
+        octagon = points[extremes[np.sort(first)]]
+        if len(octagon) >= 3:
+            inside = np.ones(len(points), dtype=bool)
+            for start, end in zip(octagon, np.roll(octagon, -1, axis=0)):
+                edge = end - start
+                inside &= edge[0] * (points[:, 1] - start[1]) - edge[1] * (points[:, 0] - start[0]) > 0
+            points = points[~inside]
+    # sorted by x and then by y
+    points = np.unique(points, axis=0)
+    if len(points) < 3:
+        return points
+
+    def chain(ordered):
+        hull = []
+        for point in ordered.tolist():
+            while len(hull) >= 2 and (hull[-1][0] - hull[-2][0]) * (point[1] - hull[-2][1]) - \
+                    (hull[-1][1] - hull[-2][1]) * (point[0] - hull[-2][0]) <= 0:
+                hull.pop()
+            hull.append(point)
+        return hull[:-1]
+
+    return np.array(chain(points) + chain(points[::-1]))
+
+
+# smallest area rectangle around the points of a counter-clockwise convex hull (rotating calipers): one of its
+# sides lies on an edge of the hull. Going round the edges, the vertices furthest ahead, behind and away from the
+# edge only move forward, so all the edges are measured in a single turn. Returns the two axes of the rectangle,
+# the longest side first, and the lowest and highest projections of the hull on each of them
+def minimum_area_rectangle(hull):
+    hull = np.asarray(hull, dtype=float).reshape(-1, 2)
+    edges = np.roll(hull, -1, axis=0) - hull
+    lengths = np.linalg.norm(edges, axis=1)
+    if len(hull) < 2 or not np.any(lengths > 0):
+        axes = np.eye(2)
+    else:
+        points = hull.tolist()
+        count = len(points)
+        directions = (edges / np.where(lengths > 0, lengths, 1.0)[:, np.newaxis]).tolist()
+        first = int(np.argmax(lengths > 0))
+        ux, uy = directions[first]
+        along = hull @ (ux, uy)
+        right, left = int(np.argmax(along)), int(np.argmin(along))
+        top = int(np.argmax(hull @ (-uy, ux)))
+        best_area = math.inf
+        best = first
+        for edge in range(first, count):
+            if lengths[edge] <= 0:
+                continue
+            ux, uy = directions[edge]
+            while ux * points[(right + 1) % count][0] + uy * points[(right + 1) % count][1] > \
+                    ux * points[right][0] + uy * points[right][1]:
+                right = (right + 1) % count
+            while ux * points[(left + 1) % count][0] + uy * points[(left + 1) % count][1] < \
+                    ux * points[left][0] + uy * points[left][1]:
+                left = (left + 1) % count
+            while ux * points[(top + 1) % count][1] - uy * points[(top + 1) % count][0] > \
+                    ux * points[top][1] - uy * points[top][0]:
+                top = (top + 1) % count
+            width = ux * (points[right][0] - points[left][0]) + uy * (points[right][1] - points[left][1])
+            height = ux * (points[top][1] - points[edge][1]) - uy * (points[top][0] - points[edge][0])
+            if width * height < best_area:
+                best_area = width * height
+                best = edge
+        ux, uy = directions[best]
+        axes = np.array([[ux, uy], [-uy, ux]])
+    projections = hull @ axes.T
+    lows = projections.min(axis=0)
+    highs = projections.max(axis=0)
+    if highs[1] - lows[1] > highs[0] - lows[0]:
+        axes = np.array([axes[1], -axes[0]])
+        lows, highs = np.array([lows[1], -highs[0]]), np.array([highs[1], -lows[0]])
+    return axes, lows, highs
+
+
+# the boxes of Vector3D.fit_box for consecutive groups of the rows of points, counts[i] rows each (none can be
+# empty), as arrays: the (M, 3, 3) axes of the boxes, one per row, and the (M, 3) lowest and highest projections
+# of the points of each group on them
+def oriented_boxes(points, counts):
+    points = np.asarray(points, dtype=float)
+    counts = np.asarray(counts)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    owners = np.repeat(np.arange(len(counts)), counts)
+
+    means = np.add.reduceat(points, starts) / counts[:, np.newaxis]
+    centered = points - means[owners]
+    covariances = np.add.reduceat(centered[:, :, np.newaxis] * centered[:, np.newaxis, :], starts)
+    _, axes = symmetric_eigen(covariances / counts[:, np.newaxis, np.newaxis])
+
+    projections = np.einsum('nij,nj->ni', axes[owners], points)
+    lows = np.minimum.reduceat(projections, starts)
+    highs = np.maximum.reduceat(projections, starts)
+    return axes, lows, highs
+
+
+# eigenvalues and unit eigenvectors of a stack of symmetric matrices, (M, 2, 2) or (M, 3, 3), all of them in one
+# call. Returns the (M, d) eigenvalues from largest to smallest and the (M, d, d) eigenvectors, one per row in the
+# same order. The 2x2 case is solved in closed form from the rotation angle that diagonalizes the matrix, the 3x3
+# one with the batched np.linalg.eigh
+def symmetric_eigen(matrices):
+    matrices = np.asarray(matrices, dtype=float)
+    if matrices.shape[-2:] == (2, 2):
+        a = matrices[:, 0, 0]
+        b = (matrices[:, 0, 1] + matrices[:, 1, 0]) / 2
+        c = matrices[:, 1, 1]
+        mean = (a + c) / 2
+        radius = np.hypot((a - c) / 2, b)
+        theta = np.arctan2(2 * b, a - c) / 2
+        cos, sin = np.cos(theta), np.sin(theta)
+        values = np.stack((mean + radius, mean - radius), axis=1)
+        vectors = np.stack((np.stack((cos, sin), axis=1), np.stack((-sin, cos), axis=1)), axis=1)
+        return values, vectors
+    values, vectors = np.linalg.eigh(matrices)
+    # eigh sorts the eigenvalues up and returns the eigenvectors as columns
+    return values[:, ::-1], np.swapaxes(vectors, 1, 2)[:, ::-1]
+
+
 class Line2D:
     def __init__(self, point, direction):
         self.point = point
@@ -132,32 +276,32 @@ class Vector2D:
 
     @classmethod
     def mean(cls, vectors):
-        v = Vector2D(0, 0)
-        for vector in vectors:
-            v = v + vector
-        return v & (1 / len(vectors))
+        return Vector2D(*point_array(vectors, 2).mean(axis=0).tolist())
 
     @classmethod
     def covariance_matrix(cls, vectors):
-        cm = Matrix2x2(0, 0, 0, 0)
-        m = Vector2D.mean(vectors)
-        for vector in vectors:
-            cm = cm + ((vector - m) ** (vector - m))
-        return cm & (1 / len(vectors))
+        return Matrix2x2(*covariance_array(point_array(vectors, 2)).ravel().tolist())
 
+    # box around the sample. The 'pca' mode takes the axes of the covariance of the points, the 'minimum' mode
+    # finds the smallest area box from the convex hull of the sample
     @classmethod
-    def fit_box(cls, sample):
-        cov_mat = Vector2D.covariance_matrix(sample)
+    def fit_box(cls, sample, mode='pca'):
+        points = point_array(sample, 2)
+        if mode == 'minimum':
+            axes, lows, highs = minimum_area_rectangle(convex_hull(points))
+            return Vector2D.box_corners(Vector2D(*axes[0].tolist()), Vector2D(*axes[1].tolist()), lows, highs)
+        cov_mat = Matrix2x2(*covariance_array(points).ravel().tolist())
         _, eigenvector0, eigenvector1 = cov_mat.eigenvectors()
-        l = [math.inf, -math.inf, math.inf, -math.inf]
-        for vector in sample:
-            dot_prod_0 = eigenvector0 * vector
-            dot_prod_1 = eigenvector1 * vector
-            l[0] = min(l[0], dot_prod_0)
-            l[1] = max(l[1], dot_prod_0)
-            l[2] = min(l[2], dot_prod_1)
-            l[3] = max(l[3], dot_prod_1)
+        projections = points @ np.array([eigenvector0.components(), eigenvector1.components()]).T
+        lows = projections.min(axis=0)
+        highs = projections.max(axis=0)
+        return Vector2D.box_corners(eigenvector0, eigenvector1, lows, highs)
 
+    # corners and center of the box along the two axes, from the lowest and highest projections of the points on
+    # each of them
+    @classmethod
+    def box_corners(cls, eigenvector0, eigenvector1, lows, highs):
+        l = [lows[0], highs[0], lows[1], highs[1]]
         a = (l[0] + l[1]) / 2
         b = (l[2] + l[3]) / 2
 
@@ -230,7 +374,7 @@ class Vector3D:
         return Vector3D(x1 - x2, y1 - y2, z1 - z2)
 
     def __neg__(self):
-        x, y, z = self.xyz
+        x, y, z = self.components()
         return Vector3D(-x, -y, -z)
 
     def length(self):
@@ -279,35 +423,28 @@ class Vector3D:
 
     @classmethod
     def mean(cls, vectors):
-        v = Vector3D(0, 0, 0)
-        for vector in vectors:
-            v = v + vector
-        return v & (1 / len(vectors))
+        return Vector3D(*point_array(vectors, 3).mean(axis=0).tolist())
 
     @classmethod
     def covariance_matrix(cls, vectors):
-        cm = Matrix3x3(0, 0, 0, 0, 0, 0, 0, 0, 0)
-        m = Vector3D.mean(vectors)
-        for vector in vectors:
-            cm = cm + ((vector - m) ** (vector - m))
-        return cm & (1 / len(vectors))
+        return Matrix3x3(*covariance_array(point_array(vectors, 3)).ravel().tolist())
 
     @classmethod
     def fit_box(cls, sample):
-        cov_mat = Vector3D.covariance_matrix(sample)
+        points = point_array(sample, 3)
+        cov_mat = Matrix3x3(*covariance_array(points).ravel().tolist())
         _, eigenvector0, eigenvector1, eigenvector2 = cov_mat.eigenvectors()
-        l = [math.inf, -math.inf, math.inf, -math.inf, math.inf, -math.inf]
-        for vector in sample:
-            dot_prod_0 = eigenvector0 * vector
-            dot_prod_1 = eigenvector1 * vector
-            dot_prod_2 = eigenvector2 * vector
-            l[0] = min(l[0], dot_prod_0)
-            l[1] = max(l[1], dot_prod_0)
-            l[2] = min(l[2], dot_prod_1)
-            l[3] = max(l[3], dot_prod_1)
-            l[4] = min(l[4], dot_prod_2)
-            l[5] = max(l[5], dot_prod_2)
-
+        axes = np.array([eigenvector0.components(), eigenvector1.components(), eigenvector2.components()])
+        projections = points @ axes.T
+        lows = projections.min(axis=0)
+        highs = projections.max(axis=0)
+        return Vector3D.box_corners(eigenvector0, eigenvector1, eigenvector2, lows, highs)
+
+    # corners and center of the box along the three axes, from the lowest and highest projections of the points
+    # on each of them
+    @classmethod
+    def box_corners(cls, eigenvector0, eigenvector1, eigenvector2, lows, highs):
+        l = [lows[0], highs[0], lows[1], highs[1], lows[2], highs[2]]
         a = (l[0] + l[1]) / 2
         b = (l[2] + l[3]) / 2
         c = (l[4] + l[5]) / 2
@@ -330,6 +467,17 @@ class Vector3D:
 
         return ip0, ip1, ip2, ip3, ip4, ip5, ip6, ip7, box_center
 
+    # fit_box for many samples at once, e.g. the vertices of every object of a scene. The covariances are summed
+    # per sample and all of them are diagonalized in a single call. Returns one fit_box result per sample
+    @classmethod
+    def fit_boxes(cls, samples):
+        samples = [point_array(sample, 3) for sample in samples]
+        if not samples:
+            return []
+        axes, lows, highs = oriented_boxes(np.concatenate(samples), [len(sample) for sample in samples])
+        return [Vector3D.box_corners(*[Vector3D(*axis) for axis in axes[index].tolist()], lows[index], highs[index])
+                for index in range(len(samples))]
+
     def plot_as_point(self, ax, color='b'):
         ax.scatter([self.x], [self.y], color=color)
 
@@ -337,9 +485,214 @@ class Vector3D:
         return self.x == other.x and self.y == other.y and self.z == other.z
 
     def __repr__(self):
-        x, y, z = self.xyz
+        x, y, z = self.components()
         return f'({x}, {y}, {z})'
 
+class Vector3DView(Vector3D):
+    # a Vector3D whose components live in a row of a Vector3DArray, without copying them: changing one changes the
+    # other. normal_row is the matching row of the normals of the array, if it has any
+    def __init__(self, row, normal_row=None):
+        self.row = row
+        self.normal_row = normal_row
+
+    @property
+    def x(self):
+        return float(self.row[0])
+
+    @x.setter
+    def x(self, value):
+        self.row[0] = value
+
+    @property
+    def y(self):
+        return float(self.row[1])
+
+    @y.setter
+    def y(self, value):
+        self.row[1] = value
+
+    @property
+    def z(self):
+        return float(self.row[2])
+
+    @z.setter
+    def z(self, value):
+        self.row[2] = value
+
+    @property
+    def normal(self):
+        if self.normal_row is None:
+            return (None, None, None)
+        return tuple(self.normal_row.tolist())
+
+
+class Vector3DArray:
+    # N 3D vectors in an (N, 3) NumPy array, with the same operators as Vector3D applied to all of them at once:
+    # + and - with another array of the same length or a single Vector3D, & to scale (by a scalar or one scalar per
+    # vector), * for the dot products and ** for the outer products. Indexing with an int returns a Vector3DView of
+    # the row, slices and masks return arrays. normals, (N, 3), are the vertex normals of the vectors when they have
+    # any; the results of the operators have none, like the ones of Vector3D
+    def __init__(self, array, normals=None):
+        self.array = np.asarray(array, dtype=float).reshape(-1, 3)
+        self.normals = None if normals is None else np.asarray(normals, dtype=float).reshape(-1, 3)
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        vectors = list(vectors)
+        normals = [vector.normal for vector in vectors]
+        if any(component is None for normal in normals for component in normal):
+            normals = None
+        return cls([vector.components() for vector in vectors], normals)
+
+    def to_vectors(self):
+        if self.normals is None:
+            return [Vector3D(*row) for row in self.array.tolist()]
+        return [Vector3D(*row, *normal) for row, normal in zip(self.array.tolist(), self.normals.tolist())]
+
+    @staticmethod
+    def operand(other):
+        if isinstance(other, Vector3DArray):
+            return other.array
+        if isinstance(other, Vector3D):
+            return np.array(other.components(), dtype=float)
+        return np.asarray(other, dtype=float)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        normals = self.normals
+        if isinstance(index, numbers.Integral):
+            return Vector3DView(self.array[index], None if normals is None else normals[index])
+        return Vector3DArray(self.array[index], None if normals is None else normals[index])
+
+    def __iter__(self):
+        for index in range(len(self.array)):
+            yield self[index]
+
+    def components(self):
+        return self.array[:, 0], self.array[:, 1], self.array[:, 2]
+
+    def rotate(self, dir1, dir2, dir3):
+        base = np.array([dir1.components(), dir2.components(), dir3.components()], dtype=float)
+        return Vector3DArray((self.array @ base.T) / np.linalg.norm(base, axis=1))
+
+    def __add__(self, other):
+        return Vector3DArray(self.array + self.operand(other))
+
+    def __sub__(self, other):
+        return Vector3DArray(self.array - self.operand(other))
+
+    def __neg__(self):
+        return Vector3DArray(-self.array)
+
+    def length(self):
+        return np.linalg.norm(self.array, axis=1)
+
+    # Multiplies every vector with a scalar, or each one with its own scalar
+    def __and__(self, scalar):
+        scalar = np.asarray(scalar, dtype=float)
+        if scalar.ndim == 1:
+            scalar = scalar[:, np.newaxis]
+        return Vector3DArray(self.array * scalar)
+
+    def dot_prod(self, other):
+        return self * other
+
+    # dot products with the vectors of other, or with a single vector. Returns an (N,) array
+    def __mul__(self, other):
+        return self.array @ self.operand(other) if isinstance(other, Vector3D) else \
+            np.einsum('ij,ij->i', self.array, self.operand(other))
+
+    # outer products, as an (N, 3, 3) array
+    def __pow__(self, other):
+        other = np.broadcast_to(self.operand(other), self.array.shape)
+        return self.array[:, :, np.newaxis] * other[:, np.newaxis, :]
+
+    def cross_prod(self, other):
+        return Vector3DArray(np.cross(self.array, self.operand(other)))
+
+    def norm(self):
+        return Vector3DArray(self.array / self.length()[:, np.newaxis])
+
+    def __eq__(self, other):
+        return isinstance(other, Vector3DArray) and np.array_equal(self.array, other.array)
+
+    def __repr__(self):
+        return f'Vector3DArray <{len(self.array)} vectors>'
+
+
+class PointAccumulator:
+    # running mean and covariance of a stream of 2D or 3D points (Welford, with the pairwise update of Chan et al.
+    # for whole chunks), so samples that don't fit in memory can be fed chunk by chunk from a generator.
+    # Accumulators filled by different workers are combined with merge. fit_box needs a second pass over the
+    # points, to find how far they reach along the axes of the covariance
+    def __init__(self, dimension=3):
+        self.dimension = dimension
+        self.count = 0
+        self.mean = np.zeros(dimension)
+        # sum of the outer products of the distances to the mean
+        self.m2 = np.zeros((dimension, dimension))
+
+    def add(self, points):
+        points = point_array(points, self.dimension)
+        if len(points) == 0:
+            return self
+        chunk = PointAccumulator(self.dimension)
+        chunk.count = len(points)
+        chunk.mean = points.mean(axis=0)
+        centered = points - chunk.mean
+        chunk.m2 = centered.T @ centered
+        return self.merge(chunk)
+
+    def update(self, chunks):
+        for chunk in chunks:
+            self.add(chunk)
+        return self
+
+    def merge(self, other):
+        count = self.count + other.count
+        if other.count == 0 or count == 0:
+            return self
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self.m2 = self.m2 + other.m2 + np.outer(delta, delta) * (self.count * other.count / count)
+        self.count = count
+        return self
+
+    # the covariance is undefined without points, so fail before dividing by zero
+    def covariance(self):
+        if self.count == 0:
+            raise ValueError('cannot compute the covariance of an empty accumulator')
+        return self.m2 / self.count
+
+    def covariance_matrix(self):
+        matrix = Matrix2x2 if self.dimension == 2 else Matrix3x3
+        return matrix(*self.covariance().ravel().tolist())
+
+    def axes(self):
+        return self.covariance_matrix().eigenvectors()[1:]
+
+    # lowest and highest projections of the points of the chunks on the axes. The results of several workers are
+    # combined with np.minimum and np.maximum
+    def extents(self, chunks):
+        axes = np.array([axis.components() for axis in self.axes()])
+        lows = np.full(self.dimension, math.inf)
+        highs = np.full(self.dimension, -math.inf)
+        for chunk in chunks:
+            projections = point_array(chunk, self.dimension) @ axes.T
+            if len(projections):
+                lows = np.minimum(lows, projections.min(axis=0))
+                highs = np.maximum(highs, projections.max(axis=0))
+        return lows, highs
+
+    # same as the fit_box of Vector2D or Vector3D, for the points of the chunks
+    def fit_box(self, chunks):
+        lows, highs = self.extents(chunks)
+        vector = Vector2D if self.dimension == 2 else Vector3D
+        return vector.box_corners(*self.axes(), lows, highs)
+
+
 class Matrix3x3:
     def __init__(self, c00, c01, c02, c10, c11, c12, c20, c21, c22):
         self.r0 = Vector3D(c00, c01, c02)
@@ -363,15 +716,68 @@ class Matrix3x3:
     def __eq__(self, other):
         return self.r0 == other.r0 and self.r1 == other.r1 and self.r2 == other.r2
 
+    # eigenvalues from largest to smallest and their eigenvectors. The matrix is taken as symmetric, as the
+    # covariance matrices it is used for
     def eigenvectors(self):
-        import numpy as np
-        from numpy import linalg
         np_mat = np.array([[*self.r0.components()], [*self.r1.components()], [*self.r2.components()]])
-        w, v = linalg.eig(np_mat)
-        ev0 = Vector3D(*v[0])
-        ev1 = Vector3D(*v[1])
-        ev2 = Vector3D(*v[2])
-        return (w[0], w[1], w[2]), ev0, ev1, ev2
+        w, v = symmetric_eigen(np_mat[np.newaxis])
+        ev0 = Vector3D(*v[0, 0].tolist())
+        ev1 = Vector3D(*v[0, 1].tolist())
+        ev2 = Vector3D(*v[0, 2].tolist())
+        return tuple(w[0].tolist()), ev0, ev1, ev2
+
+class Matrix4x4:
+    # homogeneous transform held in a 4x4 NumPy array. * composes it with another Matrix4x4 (self applied last) or
+    # transforms a Vector3D as a point; apply transforms an (N, 3) array of points at once
+    def __init__(self, array=None):
+        self.array = np.identity(4) if array is None else np.array(array, dtype=float).reshape(4, 4)
+
+    @classmethod
+    def identity(cls):
+        return cls()
+
+    @classmethod
+    def translation(cls, vector):
+        matrix = cls()
+        matrix.array[:3, 3] = vector.components()
+        return matrix
+
+    @classmethod
+    def from_matrix3x3(cls, matrix):
+        array = np.identity(4)
+        array[:3, :3] = [matrix.r0.components(), matrix.r1.components(), matrix.r2.components()]
+        return cls(array)
+
+    def rotation(self):
+        return Matrix3x3(*self.array[:3, :3].ravel().tolist())
+
+    def __mul__(self, other):
+        if isinstance(other, Matrix4x4):
+            return Matrix4x4(self.array @ other.array)
+        return Vector3D(*self.apply(np.array([other.components()], dtype=float))[0].tolist())
+
+    def __eq__(self, other):
+        return np.array_equal(self.array, other.array)
+
+    def transpose(self):
+        return Matrix4x4(self.array.T)
+
+    def inverse(self):
+        return Matrix4x4(np.linalg.inv(self.array))
+
+    # transforms the points of an (N, 3) array. Returns the (N, 4) homogeneous coordinates, before the divide
+    def apply_homogeneous(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        return points @ self.array[:, :3].T + self.array[:, 3]
+
+    # transforms the points of an (N, 3) array, dividing by w
+    def apply(self, points):
+        homogeneous = self.apply_homogeneous(points)
+        return homogeneous[:, :3] / homogeneous[:, 3:]
+
+    def __repr__(self):
+        return '\n'.join('|' + ' '.join(str(value) for value in row) + '|' for row in self.array.tolist())
+
 
 class Plane3D:
     def __init__(self, distance, dir1, dir2):
@@ -388,10 +794,10 @@ class Line3D:
     def __init__(self, p1, p2):
         self.p1 = p1
         self.p2 = p2
-        self.direction = p2.sub(p1)
+        self.direction = p2 - p1
 
     def get_coord_for_param(self, t):
-        return self.direction.scalar_prod(t).add(self.p1)
+        return (self.direction & t) + self.p1
 
 
 class Triangle3D:
@@ -402,11 +808,12 @@ class Triangle3D:
         v1 = p2 - p1
         v2 = p3 - p1
         self.normal = v1.cross_prod(v2)
+        # the plane of the triangle is normal * p + offset = 0
+        self.offset = -(self.normal * p1)
 
     def intersection_point(self, line):
-        xp, yp, zp = self.p1.components()
         a, b, c = self.normal.components()
-        d = -a * xp - b * yp - c * zp
+        d = self.offset
         x1, y1, z1 = line.p1.components()
         v1, v2, v3 = line.direction.components()
         denominator = a * v1 + b * v2 + c * v3
@@ -423,15 +830,15 @@ class Triangle3D:
         p1 = self.p1
         p2 = self.p2
         p3 = self.p3
+        point = Vector3D(x, y, z)
 
-        # check if the intersection point is inside the triangle
-        side_1 = (x - p2.x()) * (p1.y() - p2.y()) - (p1.x() - p2.x()) * (y - p2.y())
-        side_2 = (x - p3.x()) * (p2.y() - p3.y()) - (p2.x() - p3.x()) * (y - p3.y())
-        side_3 = (x - p1.x()) * (p3.y() - p1.y()) - (p3.x() - p1.x()) * (y - p1.y())
-        if (side_1 < 0.0) == (side_2 < 0.0) == (side_3 < 0.0):
-            return Vector3D(x, y, z)
+        # check if the intersection point is inside the triangle: it has to be on the inner side of the three edges.
+        # The sides are measured along the normal, so it works whatever the orientation of the triangle
+        for p, q in ((p1, p2), (p2, p3), (p3, p1)):
+            if (q - p).cross_prod(point - p) * self.normal < 0.0:
+                return None
 
-        return None
+        return point
 
     def project(self, plt, frustum, light=Vector3D(0, 0, 1)):
         dir1 = frustum.dir1
@@ -507,6 +914,53 @@ class Triangle3D:
         return f'Triangle [ {self.p1}, {self.p2}, {self.p3} ] '
 
 
+class TriangleArray:
+    # N triangles in an (N, 3, 3) NumPy array of their corners. p1, p2 and p3 are Vector3DArray views of the
+    # corners, normal and offset describe the planes like in Triangle3D
+    def __init__(self, array):
+        self.array = np.asarray(array, dtype=float).reshape(-1, 3, 3)
+        self.p1 = Vector3DArray(self.array[:, 0])
+        self.p2 = Vector3DArray(self.array[:, 1])
+        self.p3 = Vector3DArray(self.array[:, 2])
+        self.normal = (self.p2 - self.p1).cross_prod(self.p3 - self.p1)
+        self.offset = -(self.normal * self.p1)
+
+    @classmethod
+    def from_triangles(cls, triangles):
+        return cls([[triangle.p1.components(), triangle.p2.components(), triangle.p3.components()]
+                    for triangle in triangles])
+
+    def to_triangles(self):
+        return [Triangle3D(*[Vector3D(*corner) for corner in triangle]) for triangle in self.array.tolist()]
+
+    def __len__(self):
+        return len(self.array)
+
+    # a Triangle3D whose corners are views of the array
+    def __getitem__(self, index):
+        if isinstance(index, numbers.Integral):
+            return Triangle3D(self.p1[index], self.p2[index], self.p3[index])
+        return TriangleArray(self.array[index])
+
+    # same as Triangle3D.intersection_point for all the triangles and one line. Returns the intersection points
+    # and a mask of the triangles the line goes through (the points of the others are undefined)
+    def intersection_point(self, line):
+        direction = np.array(line.direction.components(), dtype=float)
+        origin = np.array(line.p1.components(), dtype=float)
+        denominator = self.normal * line.direction
+        with np.errstate(divide='ignore', invalid='ignore'):
+            alpha = -(self.normal * line.p1 + self.offset) / denominator
+        points = Vector3DArray(origin + alpha[:, np.newaxis] * direction)
+
+        hit = denominator != 0
+        for p, q in ((self.p1, self.p2), (self.p2, self.p3), (self.p3, self.p1)):
+            hit &= (q - p).cross_prod(points - p) * self.normal >= 0.0
+        return points, hit
+
+    def __repr__(self):
+        return f'TriangleArray <{len(self.array)} triangles>'
+
+
 class Matrix2x2:
     def __init__(self, c00, c01, c10, c11):
         self.r0 = Vector2D(c00, c01)
@@ -533,18 +987,18 @@ class Matrix2x2:
         b = c00 + c11
         c = c00 * c11 - c10 * c01
         square_root = math.sqrt( b * b - 4 * c )
-        lambda_1 = (-b + square_root) / 2
-        lambda_2 = (-b - square_root) / 2
+        lambda_1 = (b + square_root) / 2
+        lambda_2 = (b - square_root) / 2
         return (lambda_1, lambda_2)
 
+    # eigenvalues from largest to smallest and their eigenvectors. The matrix is taken as symmetric, as the
+    # covariance matrices it is used for
     def eigenvectors(self):
-        import numpy as np
-        from numpy import linalg
         np_mat = np.array([[*self.r0.components()], [*self.r1.components()]])
-        w, v = linalg.eig(np_mat)
-        ev0 = Vector2D(*v[0])
-        ev1 = Vector2D(*v[1])
-        return (w[0], w[1]), ev0, ev1
+        w, v = symmetric_eigen(np_mat[np.newaxis])
+        ev0 = Vector2D(*v[0, 0].tolist())
+        ev1 = Vector2D(*v[0, 1].tolist())
+        return tuple(w[0].tolist()), ev0, ev1
 
     def __repr__(self):
         return f"|{self.r0.x} {self.r0.y}|\n|{self.r1.x} {self.r1.y}|"
@@ -553,13 +1007,13 @@ def draw_vector_2d(vector, plt, color):
     plt.plot([0, vector.x], [0, vector.y], color=color)
 
 
-def render_2d_vector_sample():
+def render_2d_vector_sample(mode='pca'):
     from matplotlib import pyplot as plt
     plt.axes().set_aspect('equal')
     sample = Vector2D.sample(-1000, 1000, -1000, 1000, 100)
     mean = Vector2D.mean(sample)
 
-    ip0, ip1, ip2, ip3, center = Vector2D.fit_box(sample)
+    ip0, ip1, ip2, ip3, center = Vector2D.fit_box(sample, mode)
 
     s0 = Segment2D(ip0, ip1)
     s1 = Segment2D(ip1, ip2)
@@ -631,6 +1085,8 @@ def main(argv):
 
     if use_case == 'render-2d-vector-sample-best-fit-box':
         render_2d_vector_sample()
+    elif use_case == 'render-2d-vector-sample-minimum-box':
+        render_2d_vector_sample('minimum')
     elif use_case == 'render-3d-vector-sample-best-fit-box':
         render_3d_vector_sample()
     else:
@@ -641,6 +1097,7 @@ def print_usage():
     print("linalg -u [use case name]")
     print("List of use case names:")
     print(" * render-2d-vector-sample-best-fit-box")
+    print(" * render-2d-vector-sample-minimum-box")
     print(" * render-3d-vector-sample-best-fit-box")
 
 if __name__ == '__main__':
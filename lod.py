@@ -0,0 +1,161 @@
+#
+# lod.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import heapq
+import numpy as np
+
+# fraction of the triangles of an object kept by each coarser level of detail
+LOD_RATIOS = (0.5, 0.25, 0.125)
+
+
+# fundamental error quadrics (Garland & Heckbert) of the vertices: for every plane of a face around a vertex, the
+# squared distance to it as a 4x4 matrix, summed. Open borders also get the plane through the border edge
+# perpendicular to its face, so they are kept in place instead of shrinking
+def vertex_quadrics(positions, faces):
+    quadrics = np.zeros((len(positions), 4, 4))
+    if len(faces) == 0:
+        return quadrics
+    points = positions[faces]
+    normals = np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    valid = lengths > 0
+    normals = normals[valid] / lengths[valid, np.newaxis]
+    planes = np.hstack((normals, -np.einsum('ij,ij->i', normals, points[valid, 0])[:, np.newaxis]))
+    face_quadrics = planes[:, :, np.newaxis] * planes[:, np.newaxis, :]
+    for corner in range(3):
+        np.add.at(quadrics, faces[valid, corner], face_quadrics)
+
+    # border edges are the ones used by a single face
+    edges = np.stack((faces[valid], np.roll(faces[valid], -1, axis=1)), axis=2).reshape(-1, 2)
+    face_normals = np.repeat(normals, 3, axis=0)
+    keys = np.sort(edges, axis=1)
+    _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    border = counts[inverse.ravel()] == 1
+    if np.any(border):
+        edges = edges[border]
+        directions = positions[edges[:, 1]] - positions[edges[:, 0]]
+        border_normals = np.cross(directions, face_normals[border])
+        lengths = np.linalg.norm(border_normals, axis=1)
+        valid = lengths > 0
+        border_normals = border_normals[valid] / lengths[valid, np.newaxis]
+        edges = edges[valid]
+        planes = np.hstack((border_normals, -np.einsum('ij,ij->i', border_normals,
+                                                        positions[edges[:, 0]])[:, np.newaxis]))
+        border_quadrics = planes[:, :, np.newaxis] * planes[:, np.newaxis, :]
+        for end in range(2):
+            np.add.at(quadrics, edges[:, end], border_quadrics)
+    return quadrics
+
+
+class Simplifier:
+    # quadric error edge collapse over the faces of one object. The collapses keep one of the two vertices of the
+    # edge (the one with the least error), so every level of detail is just a new set of faces over the same
+    # positions. Collapses that would flip a face or pinch the surface are skipped
+    def __init__(self, positions, faces):
+        self.vertices, local_faces = np.unique(np.asarray(faces).ravel(), return_inverse=True)
+        self.points = np.asarray(positions, dtype=float)[self.vertices]
+        self.faces = local_faces.reshape(-1, 3).tolist()
+        self.alive = [True] * len(self.faces)
+        self.live_count = len(self.faces)
+        self.quadrics = vertex_quadrics(self.points, local_faces.reshape(-1, 3))
+        self.homogeneous = np.hstack((self.points, np.ones((len(self.points), 1))))
+        self.vertex_faces = [set() for _ in range(len(self.points))]
+        for index, face in enumerate(self.faces):
+            for vertex in face:
+                self.vertex_faces[vertex].add(index)
+        # bumped whenever the quadric of a vertex changes, so older heap entries of its edges are ignored
+        self.stamps = [0] * len(self.points)
+        self.heap = []
+        self.error = 0.0
+        for a, b in {tuple(sorted((face[corner], face[corner - 1]))) for face in self.faces for corner in range(3)}:
+            self.push(a, b)
+
+    def push(self, a, b):
+        quadric = self.quadrics[a] + self.quadrics[b]
+        cost_a = self.homogeneous[a] @ quadric @ self.homogeneous[a]
+        cost_b = self.homogeneous[b] @ quadric @ self.homogeneous[b]
+        keep, remove, cost = (a, b, cost_a) if cost_a <= cost_b else (b, a, cost_b)
+        heapq.heappush(self.heap, (max(cost, 0.0), keep, remove, self.stamps[keep], self.stamps[remove]))
+
+    def neighbours(self, vertex):
+        return {other for index in self.vertex_faces[vertex] for other in self.faces[index]} - {vertex}
+
+    # True when moving remove onto keep leaves the surface manifold, doesn't turn any face around and doesn't
+    # remove a whole piece of it (e.g. a loose quad)
+    def can_collapse(self, keep, remove):
+        shared = self.vertex_faces[keep] & self.vertex_faces[remove]
+        if not shared or (shared == self.vertex_faces[keep] and shared == self.vertex_faces[remove]):
+            return False
+        thirds = {vertex for index in shared for vertex in self.faces[index]} - {keep, remove}
+        if self.neighbours(keep) & self.neighbours(remove) != thirds:
+            return False
+        for index in self.vertex_faces[remove] - shared:
+            face = self.faces[index]
+            p0, p1, p2 = self.points[face]
+            moved = self.points[[keep if vertex == remove else vertex for vertex in face]]
+            before = np.cross(p1 - p0, p2 - p0)
+            after = np.cross(moved[1] - moved[0], moved[2] - moved[0])
+            if np.dot(before, after) <= 0:
+                return False
+        return True
+
+    def collapse(self, keep, remove):
+        for index in list(self.vertex_faces[remove]):
+            face = self.faces[index]
+            if keep in face:
+                self.alive[index] = False
+                self.live_count -= 1
+                for vertex in face:
+                    self.vertex_faces[vertex].discard(index)
+            else:
+                face[face.index(remove)] = keep
+                self.vertex_faces[keep].add(index)
+        self.vertex_faces[remove] = set()
+        self.quadrics[keep] += self.quadrics[remove]
+        self.stamps[keep] += 1
+        self.stamps[remove] += 1
+        for other in self.neighbours(keep):
+            self.push(keep, other)
+
+    # collapses edges, cheapest first, until at most target faces are left or nothing else can be collapsed
+    def reduce(self, target):
+        while self.live_count > target and self.heap:
+            cost, keep, remove, keep_stamp, remove_stamp = heapq.heappop(self.heap)
+            if keep_stamp != self.stamps[keep] or remove_stamp != self.stamps[remove]:
+                continue
+            if not self.can_collapse(keep, remove):
+                continue
+            self.collapse(keep, remove)
+            self.error = max(self.error, cost)
+
+    # the faces left, as indices into the positions the simplifier was built from
+    def current_faces(self):
+        faces = np.array([face for face, alive in zip(self.faces, self.alive) if alive], dtype=np.int64)
+        return self.vertices[faces].reshape(-1, 3)
+
+
+# simplified versions of the objects of a mesh, one per ratio. Returns the faces of all the levels, object by object
+# and coarser last, the number of faces of each level of each object, and their error: the square root of the
+# largest quadric error of the collapses made to reach them, which bounds how far the surface moved away from any
+# of the planes of the original faces around the vertices that were kept
+def lod_arrays(positions, faces, object_sizes, ratios=LOD_RATIOS):
+    positions = np.asarray(positions)
+    faces = np.asarray(faces)
+    levels = []
+    sizes = np.zeros((len(object_sizes), len(ratios)), dtype=np.int64)
+    errors = np.zeros((len(object_sizes), len(ratios)))
+    start = 0
+    for number, size in enumerate(np.asarray(object_sizes).tolist()):
+        simplifier = Simplifier(positions, faces[start:start + size])
+        for level, ratio in enumerate(ratios):
+            simplifier.reduce(int(size * ratio))
+            level_faces = simplifier.current_faces()
+            levels.append(level_faces)
+            sizes[number, level] = len(level_faces)
+            errors[number, level] = np.sqrt(simplifier.error)
+        start += size
+    lod_faces = np.vstack(levels).astype(np.int32) if levels else np.empty((0, 3), dtype=np.int32)
+    return {'lod_faces': lod_faces, 'lod_sizes': sizes, 'lod_errors': errors}
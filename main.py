@@ -5,6 +5,8 @@
 #
 
 import render
+from render_loop import RenderLoop
+from frame_cache import FrameCache
 import tkinter as tki
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
@@ -44,47 +46,42 @@ def createScene(file_name):
     light = render.Vector3D(1.0, 0.0, 0.0)
     frustum = render.Frustum(6, 6, camera_dist, -100.0, 80, 80, plt2, light)
     scene = render.Scene3D(file_name, plt2, frustum, light)
-    scene.parse_file()
     scene.camera_distance = initial_camera_dist
     return scene
 
+
+# the file is read by the render loop, which draws each part of it as soon as it is loaded. The levels of detail
+# let it draw coarser frames while a slider moves
+def loadScene(scene):
+    loop.set_scene(scene, loader=scene.stream_file(lod=True))
+
 scene = createScene("sphere2.obj")
 
+# the renders run on a background worker, the callbacks only record the newest slider values. While a slider is
+# dragged the frames use coarser levels of detail to stay within 50 ms, and are refined once it stops. Poses seen
+# before are drawn from a 64 MB frame cache, which is also filled with the next 3 slider steps to each side while
+# the GUI is idle
+loop = RenderLoop(scene, on_frame=lambda frame: c2.draw(), budget=0.05, idle_time=0.25,
+                  frame_cache=FrameCache(budget_mb=64), speculation=3)
+loadScene(scene)
+
+
 def on_distance_changed(value):
     global camera_dist
     camera_dist = float(value)
-    plt2.clear()
-    plt2.plot([-box_size, box_size, box_size, -box_size, -box_size],
-              [-box_size, -box_size, box_size, box_size, -box_size], color='w')
-    scene.set_camera_distance(camera_dist)
-    c2.draw()
+    loop.request(distance=camera_dist)
 
 
 def on_angle_changed(value):
-    camera_ang = float(value)
-    plt2.clear()
-    plt2.plot([-box_size, box_size, box_size, -box_size, -box_size],
-              [-box_size, -box_size, box_size, box_size, -box_size], color='w')
-    scene.set_angle(camera_ang)
-    c2.draw()
+    loop.request(angle=float(value))
 
 
 def on_elevation_changed(value):
-    camera_elev = float(value)
-    plt2.clear()
-    plt2.plot([-box_size, box_size, box_size, -box_size, -box_size],
-              [-box_size, -box_size, box_size, box_size, -box_size], color='w')
-    scene.set_elevation(camera_elev)
-    c2.draw()
+    loop.request(elevation=float(value))
 
 
 def on_azimuth_changed(value):
-    camera_az = float(value)
-    plt2.clear()
-    plt2.plot([-box_size, box_size, box_size, -box_size, -box_size],
-              [-box_size, -box_size, box_size, box_size, -box_size], color='w')
-    scene.set_azimuth(camera_az)
-    c2.draw()
+    loop.request(azimuth=float(value))
 
 def on_object_changed(event):
     global scene
@@ -108,24 +105,13 @@ def on_object_changed(event):
     plt2.clear()
     plt2.plot([-box_size, box_size, box_size, -box_size, -box_size],
               [-box_size, -box_size, box_size, box_size, -box_size], color='w')
-    scene.project_fast()
-    c2.draw()
+    loadScene(scene)
 
 def on_light_azimuth_changed(value):
-    scene.set_light(float(value), light_elevation_var.get())
-    plt2.clear()
-    plt2.plot([-box_size, box_size, box_size, -box_size, -box_size],
-              [-box_size, -box_size, box_size, box_size, -box_size], color='w')
-    scene.project_fast()
-    c2.draw()
+    loop.request(light=(float(value), light_elevation_var.get()))
 
 def on_light_elevation_changed(value):
-    scene.set_light(light_azimuth_var.get(), float(value))
-    plt2.clear()
-    plt2.plot([-box_size, box_size, box_size, -box_size, -box_size],
-              [-box_size, -box_size, box_size, box_size, -box_size], color='w')
-    scene.project_fast()
-    c2.draw()
+    loop.request(light=(light_azimuth_var.get(), float(value)))
 
 def build_object_frame():
     object_label_frame = tki.LabelFrame(top1, text="  Object  ")
@@ -196,6 +182,7 @@ def build_light_frame():
 
 
 def on_closing():
+    loop.stop()
     root.quit()
     root.destroy()
 
@@ -209,6 +196,6 @@ root.withdraw()
 
 plt2.plot([-box_size, box_size, box_size, -box_size, -box_size], [-box_size, -box_size, box_size, box_size, -box_size],
           color='w')
-scene.project_fast()
+loop.start(root)
 
 tki.mainloop()
@@ -0,0 +1,105 @@
+#
+# mesh_cache.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import hashlib
+import json
+import os
+import numpy as np
+
+CACHE_DIRECTORY_NAME = '.mesh_cache'
+# bumped whenever the layout of the cached arrays changes, so older caches are rebuilt
+CACHE_VERSION = 4
+ARRAY_NAMES = ('positions', 'normals', 'faces', 'object_sizes')
+# only there when the levels of detail of the mesh were built
+LOD_ARRAY_NAMES = ('lod_faces', 'lod_sizes', 'lod_errors')
+
+
+def content_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# the cache of an OBJ file lives in a .mesh_cache directory next to it, unless another directory is given
+def cache_path(path, cache_directory=None):
+    path = os.path.abspath(path)
+    if cache_directory is None:
+        cache_directory = os.path.join(os.path.dirname(path), CACHE_DIRECTORY_NAME)
+    path_hash = hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_directory, f'{os.path.basename(path)}.{path_hash}')
+
+
+def file_key(path):
+    stat = os.stat(path)
+    return {'version': CACHE_VERSION, 'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+
+# returns the cached arrays of the OBJ file as read-only memory maps, or None when there is no valid cache for it.
+# When size or mtime changed but the content hash didn't (e.g. the file was touched), the cache is still valid and
+# its key is refreshed
+def load(path, cache_directory=None):
+    directory = cache_path(path, cache_directory)
+    try:
+        with open(os.path.join(directory, 'key.json')) as file:
+            cached_key = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    key = file_key(path)
+    if cached_key.get('version') != CACHE_VERSION:
+        return None
+    if any(cached_key.get(name) != key[name] for name in ('path', 'size', 'mtime')):
+        if cached_key.get('hash') != content_hash(path):
+            return None
+        key['hash'] = cached_key['hash']
+        write_key(directory, key)
+
+    try:
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in ARRAY_NAMES}
+        if all(os.path.exists(os.path.join(directory, f'{name}.npy')) for name in LOD_ARRAY_NAMES):
+            arrays.update({name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+                           for name in LOD_ARRAY_NAMES})
+        return arrays
+    except (OSError, ValueError):
+        return None
+
+
+def save(path, arrays, cache_directory=None):
+    directory = cache_path(path, cache_directory)
+    os.makedirs(directory, exist_ok=True)
+    key = file_key(path)
+    key['hash'] = content_hash(path)
+    # the key is written last, so an interrupted save leaves no valid cache behind
+    key_file = os.path.join(directory, 'key.json')
+    if os.path.exists(key_file):
+        os.remove(key_file)
+    for name in ARRAY_NAMES:
+        write_array(directory, name, arrays[name])
+    for name in LOD_ARRAY_NAMES:
+        file_name = os.path.join(directory, f'{name}.npy')
+        if name in arrays:
+            write_array(directory, name, arrays[name])
+        elif os.path.exists(file_name):
+            os.remove(file_name)
+    write_key(directory, key)
+
+
+# the array is written to a temporary file that then replaces the old one, instead of overwriting it: scenes that
+# loaded the cache before keep their memory maps of the old file, which would otherwise change (or shrink) under them
+def write_array(directory, name, array):
+    temporary = os.path.join(directory, f'{name}.npy.tmp')
+    with open(temporary, 'wb') as file:
+        np.save(file, np.ascontiguousarray(array))
+    os.replace(temporary, os.path.join(directory, f'{name}.npy'))
+
+
+def write_key(directory, key):
+    temporary = os.path.join(directory, 'key.json.tmp')
+    with open(temporary, 'w') as file:
+        json.dump(key, file)
+    os.replace(temporary, os.path.join(directory, 'key.json'))
@@ -0,0 +1,233 @@
+#
+# obb_tree.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import math
+import numpy as np
+from intersect import TriangleData
+from intersect import intersect_rays
+from linalg import oriented_boxes
+
+# slack added to the half sizes of the boxes, so the points they were fitted to are inside them after rounding
+EPSILON = 1e-9
+
+
+# the center, axes (one per row) and half sizes of boxes given as returned by Vector3D.fit_box, 8 corners and the
+# center, e.g. the box of a Face3D. Flat boxes get the missing axes from the cross product of the others
+def box_arrays(boxes):
+    centers, axes, half_sizes = [], [], []
+    for box in boxes:
+        corners = np.array([corner.components() for corner in box[:8]], dtype=float)
+        edges = np.array([corners[4] - corners[0], corners[2] - corners[0], corners[1] - corners[0]])
+        lengths = np.linalg.norm(edges, axis=1)
+        box_axes = np.eye(3)
+        flat = lengths <= 0
+        box_axes[~flat] = edges[~flat] / lengths[~flat, np.newaxis]
+        if np.count_nonzero(flat) == 1:
+            index = int(np.argmax(flat))
+            box_axes[index] = np.cross(box_axes[index - 2], box_axes[index - 1])
+        elif np.count_nonzero(flat) == 2:
+            index = int(np.argmin(flat))
+            other = np.eye(3)[np.argmin(np.abs(box_axes[index]))]
+            box_axes[index - 2] = np.cross(box_axes[index], other)
+            box_axes[index - 2] /= np.linalg.norm(box_axes[index - 2])
+            box_axes[index - 1] = np.cross(box_axes[index], box_axes[index - 2])
+        centers.append(box[8].components())
+        axes.append(box_axes)
+        half_sizes.append(lengths / 2)
+    return (np.array(centers, dtype=float).reshape(-1, 3), np.array(axes).reshape(-1, 3, 3),
+            np.array(half_sizes).reshape(-1, 3))
+
+
+# radius of boxes (axes (..., 3, 3) and half sizes (..., 3)) projected on the axes (..., K, 3)
+def projected_radius(axes, box_axes, half_sizes):
+    return (np.abs(np.einsum('...kd,...jd->...kj', axes, box_axes)) * half_sizes[..., np.newaxis, :]).sum(axis=-1)
+
+
+class OBBTree:
+    # oriented bounding box tree over the triangles of a mesh, given as an (N, 3, 3) array, or over a point
+    # sample, (N, 3). Every node is the box of Vector3D.fit_box around the points of its primitives, and is split in
+    # two at the median of their centers along its longest side until at most leaf_size primitives are left. The
+    # tree is built a level at a time, fitting the boxes of all the nodes of the level in one call. The nodes are
+    # stored in flat arrays in breadth first order: center, axes (one per row), half sizes, the left and right
+    # child (-1 for leaves) and the primitives of a leaf, indices[start:start + count]. triangles is the
+    # TriangleData used by the ray tests, computed here when not given
+    def __init__(self, primitives, triangles=None, leaf_size=8):
+        self.primitives = np.asarray(primitives, dtype=float)
+        self.has_triangles = self.primitives.ndim == 3
+        if self.has_triangles and triangles is None:
+            triangles = TriangleData(self.primitives)
+        self.triangles = triangles
+        self.leaf_size = leaf_size
+        self.indices = np.arange(len(self.primitives))
+
+        points = self.primitives.reshape(len(self.primitives), -1, 3)
+        centroids = points.mean(axis=1)
+        centers, axes, half_sizes, lefts, rights, starts, counts = [], [], [], [], [], [], []
+        level = [(0, len(self.primitives))] if len(self.primitives) else []
+        while level:
+            first = len(centers)
+            node_points = np.concatenate([points[self.indices[start:end]].reshape(-1, 3) for start, end in level])
+            level_axes, lows, highs = oriented_boxes(node_points, [(end - start) * points.shape[1]
+                                                                   for start, end in level])
+            extents = highs - lows
+            centers.extend(np.einsum('nij,ni->nj', level_axes, (lows + highs) / 2))
+            axes.extend(level_axes)
+            half_sizes.extend(extents / 2 + EPSILON * (1.0 + np.abs(np.hstack((lows, highs))).max(axis=1,
+                                                                                                 keepdims=True)))
+            next_level = []
+            for node, (start, end) in enumerate(level):
+                lefts.append(-1)
+                rights.append(-1)
+                starts.append(start)
+                counts.append(end - start)
+                if end - start <= leaf_size:
+                    continue
+                # median split of the centers of the primitives along the longest side of the box
+                primitives = self.indices[start:end]
+                side = level_axes[node, int(np.argmax(extents[node]))]
+                half = (end - start) // 2
+                order = np.argpartition(centroids[primitives] @ side, half)
+                self.indices[start:end] = primitives[order]
+                child = first + len(level) + len(next_level)
+                lefts[-1], rights[-1], counts[-1] = child, child + 1, 0
+                next_level.extend(((start, start + half), (start + half, end)))
+            level = next_level
+
+        self.centers = np.array(centers, dtype=float).reshape(-1, 3)
+        self.axes = np.array(axes, dtype=float).reshape(-1, 3, 3)
+        self.half_sizes = np.array(half_sizes, dtype=float).reshape(-1, 3)
+        self.left = np.array(lefts, dtype=int)
+        self.right = np.array(rights, dtype=int)
+        self.start = np.array(starts, dtype=int)
+        self.count = np.array(counts, dtype=int)
+
+    def __len__(self):
+        return len(self.centers)
+
+    # nearest triangle hit by each ray closer than max_t, in units of its direction. origins is one point shared
+    # by all the rays or an (R, 3) array, directions is (R, 3). Returns the distance of the hit (inf for none), the
+    # index of the triangle (-1) and its barycentric coordinates u, v, like intersect.intersect_rays
+    def intersect_rays(self, origins, directions, max_t=math.inf):
+        if not self.has_triangles:
+            raise ValueError('rays can only be traced against a tree of triangles')
+        origins = np.asarray(origins, dtype=float)
+        directions = np.asarray(directions, dtype=float).reshape(-1, 3)
+        ray_count = len(directions)
+        best_t = np.full(ray_count, float(max_t))
+        best_ids = np.full(ray_count, -1)
+        best_u = np.zeros(ray_count)
+        best_v = np.zeros(ray_count)
+
+        shared_origin = origins.ndim == 1
+        ray_origins = np.broadcast_to(origins, directions.shape)
+        stack = [(0, np.arange(ray_count))] if len(self.centers) and ray_count else []
+        while stack:
+            node, rays = stack.pop()
+            entry = self.box_distance(node, ray_origins[rays], directions[rays])
+            rays = rays[entry < best_t[rays]]
+            if len(rays) == 0:
+                continue
+            if self.left[node] >= 0:
+                stack.append((self.right[node], rays))
+                stack.append((self.left[node], rays))
+                continue
+
+            start = self.start[node]
+            t, ids, u, v = intersect_rays(origins if shared_origin else origins[rays], directions[rays],
+                                          self.triangles, self.indices[start:start + self.count[node]])
+            closer = t < best_t[rays]
+            hit_rays = rays[closer]
+            best_t[hit_rays] = t[closer]
+            best_ids[hit_rays] = ids[closer]
+            best_u[hit_rays] = u[closer]
+            best_v[hit_rays] = v[closer]
+        best_t[best_ids < 0] = math.inf
+        return best_t, best_ids, best_u, best_v
+
+    # first triangle crossed by each segment from starts to ends, both (S, 3). Returns where along the segment it
+    # is, from 0 to 1 (inf for none), and the index of the triangle (-1)
+    def intersect_segments(self, starts, ends):
+        starts = np.asarray(starts, dtype=float).reshape(-1, 3)
+        t, ids, _, _ = self.intersect_rays(starts, np.asarray(ends, dtype=float).reshape(-1, 3) - starts, 1.0)
+        return t, ids
+
+    # slab test of the box of a node against many rays, in the frame of the box. Returns the distance where each
+    # ray enters the box, or inf if it misses it
+    def box_distance(self, node, origins, directions):
+        axes = self.axes[node]
+        local_origins = (origins - self.centers[node]) @ axes.T
+        local_directions = directions @ axes.T
+        half_size = self.half_sizes[node]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inverse = 1.0 / local_directions
+            t0 = (-half_size - local_origins) * inverse
+            t1 = (half_size - local_origins) * inverse
+        # fmin/fmax skip the nans of rays that are parallel to a slab and start on its border
+        t_near = np.maximum(np.fmax.reduce(np.fmin(t0, t1), axis=1), 0.0)
+        t_far = np.fmin.reduce(np.fmax(t0, t1), axis=1)
+        return np.where(t_far >= t_near, t_near, math.inf)
+
+    # the primitives that overlap each of the query boxes, given by their (Q, 3) centers, (Q, 3, 3) axes (one per
+    # row) and (Q, 3) half sizes, e.g. from box_arrays. Triangles are tested exactly with the separating axis
+    # theorem, points have to be inside. Returns two arrays of the same length: the query box and the primitive of
+    # every overlapping pair
+    def overlap_boxes(self, centers, axes, half_sizes):
+        centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        axes = np.asarray(axes, dtype=float).reshape(-1, 3, 3)
+        half_sizes = np.asarray(half_sizes, dtype=float).reshape(-1, 3)
+        queries, primitives = [], []
+        stack = [(0, np.arange(len(centers)))] if len(self.centers) and len(centers) else []
+        while stack:
+            node, boxes = stack.pop()
+            boxes = boxes[self.overlap_node(node, centers[boxes], axes[boxes], half_sizes[boxes])]
+            if len(boxes) == 0:
+                continue
+            if self.left[node] >= 0:
+                stack.append((self.right[node], boxes))
+                stack.append((self.left[node], boxes))
+                continue
+
+            start = self.start[node]
+            leaf = self.indices[start:start + self.count[node]]
+            if self.has_triangles:
+                overlap = self.overlap_triangles(self.primitives[leaf], centers[boxes], axes[boxes], half_sizes[boxes])
+            else:
+                local = np.einsum('qpd,qjd->qpj', self.primitives[leaf][np.newaxis] - centers[boxes, np.newaxis],
+                                  axes[boxes])
+                overlap = np.all(np.abs(local) <= half_sizes[boxes, np.newaxis], axis=2)
+            box_index, leaf_index = np.nonzero(overlap)
+            queries.append(boxes[box_index])
+            primitives.append(leaf[leaf_index])
+        if not queries:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        return np.concatenate(queries), np.concatenate(primitives)
+
+    # separating axis test of the box of a node against many boxes: the axes of both boxes and their cross products
+    def overlap_node(self, node, centers, axes, half_sizes):
+        node_axes = np.broadcast_to(self.axes[node], axes.shape)
+        crosses = np.cross(node_axes[:, :, np.newaxis], axes[:, np.newaxis]).reshape(-1, 9, 3)
+        test_axes = np.concatenate((node_axes, axes, crosses), axis=1)
+        distances = np.abs(np.einsum('qkd,qd->qk', test_axes, centers - self.centers[node]))
+        radii = projected_radius(test_axes, node_axes, np.broadcast_to(self.half_sizes[node], half_sizes.shape)) + \
+            projected_radius(test_axes, axes, half_sizes)
+        return np.all(distances <= radii + EPSILON, axis=1)
+
+    # separating axis test of triangles (T, 3, 3) against boxes: the axes of the box, the normal of the triangle
+    # and the cross products of its edges with the axes of the box. Returns a (Q, T) overlap mask
+    @staticmethod
+    def overlap_triangles(triangles, centers, axes, half_sizes):
+        edges = np.roll(triangles, -1, axis=1) - triangles
+        normals = np.cross(edges[:, 0], edges[:, 1])
+        crosses = np.cross(edges[np.newaxis, :, :, np.newaxis], axes[:, np.newaxis, np.newaxis])
+        test_axes = np.concatenate((np.broadcast_to(axes[:, np.newaxis], (len(axes), len(triangles), 3, 3)),
+                                    np.broadcast_to(normals[np.newaxis, :, np.newaxis],
+                                                    (len(axes), len(triangles), 1, 3)),
+                                    crosses.reshape(len(axes), len(triangles), 9, 3)), axis=2)
+        corners = triangles[np.newaxis] - centers[:, np.newaxis, np.newaxis]
+        projections = np.einsum('qtkd,qtcd->qtkc', test_axes, corners)
+        radii = projected_radius(test_axes, axes[:, np.newaxis], half_sizes[:, np.newaxis])
+        separated = (projections.min(axis=3) > radii + EPSILON) | (projections.max(axis=3) < -radii - EPSILON)
+        return ~np.any(separated, axis=2)
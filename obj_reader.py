@@ -0,0 +1,174 @@
+#
+# obj_reader.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import itertools
+import numpy as np
+
+
+# an array that grows by doubling its capacity, so rows can be appended chunk by chunk without copying the whole
+# content every time
+class GrowableArray:
+    def __init__(self, columns, dtype=float, capacity=1024):
+        self.buffer = np.empty((capacity, columns), dtype=dtype)
+        self.size = 0
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=self.buffer.dtype).reshape(-1, self.buffer.shape[1])
+        needed = self.size + len(rows)
+        if needed > len(self.buffer):
+            capacity = max(needed, 2 * len(self.buffer))
+            buffer = np.empty((capacity, self.buffer.shape[1]), dtype=self.buffer.dtype)
+            buffer[:self.size] = self.buffer[:self.size]
+            self.buffer = buffer
+        self.buffer[self.size:needed] = rows
+        self.size = needed
+
+    def __len__(self):
+        return self.size
+
+    def view(self):
+        return self.buffer[:self.size]
+
+
+class ObjGroup:
+    # faces holds, for the three corners of every triangle, the index of its position and of its normal (-1 when
+    # the corner has no normal) in the arrays of the reader
+    def __init__(self, name, faces, normal_faces):
+        self.name = name
+        self.faces = faces
+        self.normal_faces = normal_faces
+
+    def __len__(self):
+        return len(self.faces)
+
+    def __repr__(self):
+        return f'ObjGroup <{self.name}, {len(self.faces)} triangles>'
+
+
+class ObjReader:
+    # reads an OBJ file in chunks of lines, appending v and vn records to growable arrays. groups() yields each
+    # 'o'/'g' group as soon as its last face has been read, so a scene can be shown while the rest of the file is
+    # still loading. Polygons are split into triangle fans, other records (vt, usemtl, s, ...) are skipped
+    def __init__(self, file_name, chunk_size=65536):
+        self.file_name = file_name
+        self.chunk_size = chunk_size
+        self.positions = GrowableArray(3)
+        self.normals = GrowableArray(3)
+
+    def groups(self):
+        name = None
+        faces = GrowableArray(3, dtype=np.int64)
+        normal_faces = GrowableArray(3, dtype=np.int64)
+        with open(self.file_name, encoding='utf-8', errors='replace') as file:
+            while True:
+                chunk = list(itertools.islice(file, self.chunk_size))
+                if not chunk:
+                    break
+                positions, normals, face_rows, normal_rows = [], [], [], []
+                for line in chunk:
+                    record = line.split()
+                    if not record:
+                        continue
+                    kind = record[0]
+                    if kind == 'v':
+                        positions.append(record[1:4])
+                    elif kind == 'vn':
+                        normals.append(record[1:4])
+                    elif kind == 'f':
+                        # indices can be relative to the vertices read so far, count them before adding this face
+                        self.flush(positions, normals)
+                        self.read_face(record[1:], face_rows, normal_rows)
+                    elif kind in ('o', 'g'):
+                        self.flush(positions, normals)
+                        faces.extend(face_rows)
+                        normal_faces.extend(normal_rows)
+                        face_rows, normal_rows = [], []
+                        if len(faces) > 0:
+                            yield ObjGroup(name, faces.view(), normal_faces.view())
+                            faces = GrowableArray(3, dtype=np.int64)
+                            normal_faces = GrowableArray(3, dtype=np.int64)
+                        name = ' '.join(record[1:])
+                self.flush(positions, normals)
+                faces.extend(face_rows)
+                normal_faces.extend(normal_rows)
+        if len(faces) > 0:
+            yield ObjGroup(name, faces.view(), normal_faces.view())
+
+    # moves the parsed rows of the current chunk to the arrays of the reader
+    def flush(self, positions, normals):
+        if positions:
+            self.positions.extend(np.array(positions, dtype=float))
+            positions.clear()
+        if normals:
+            self.normals.extend(np.array(normals, dtype=float))
+            normals.clear()
+
+    def read_face(self, corners, face_rows, normal_rows):
+        position_indices = []
+        normal_indices = []
+        for corner in corners:
+            indices = corner.split('/')
+            position_indices.append(self.index(indices[0], len(self.positions)))
+            if len(indices) > 2 and indices[2]:
+                normal_indices.append(self.index(indices[2], len(self.normals)))
+            else:
+                normal_indices.append(-1)
+        for second in range(1, len(corners) - 1):
+            face_rows.append((position_indices[0], position_indices[second], position_indices[second + 1]))
+            normal_rows.append((normal_indices[0], normal_indices[second], normal_indices[second + 1]))
+
+    # OBJ indices start at 1, negative ones count back from the last vertex read
+    @staticmethod
+    def index(value, count):
+        index = int(value)
+        return index - 1 if index > 0 else count + index
+
+
+# the arrays of a scene for the groups read so far: the vertices of the file, shared by all the triangles that use
+# them, the faces as int32 indices into them, and the number of faces of each group. The normals of the vertices
+# are the ones of vertex_normals
+def mesh_arrays(reader, groups):
+    positions = reader.positions.view().copy()
+    object_sizes = np.array([len(group) for group in groups], dtype=np.int64)
+    if len(groups) == 0:
+        return {'positions': positions, 'normals': np.zeros_like(positions), 'faces': np.empty((0, 3), dtype=np.int32),
+                'object_sizes': object_sizes}
+    faces = np.vstack([group.faces for group in groups])
+    normal_faces = np.vstack([group.normal_faces for group in groups])
+
+    sums = np.zeros_like(positions)
+    face_sums = np.zeros_like(positions)
+    add_normals(sums, face_sums, reader, faces, normal_faces)
+    normals = vertex_normals(sums, face_sums)
+    return {'positions': positions, 'normals': normals, 'faces': faces.astype(np.int32), 'object_sizes': object_sizes}
+
+
+# adds, for the vertices of the faces, the normals their corners have in the file to sums and the normals of the
+# faces, weighted by their area, to face_sums. Returns the vertices of the faces
+def add_normals(sums, face_sums, reader, faces, normal_faces):
+    faces = np.asarray(faces)
+    corners = faces.ravel()
+    corner_normals = np.asarray(normal_faces).ravel()
+    with_normal = corner_normals >= 0
+    np.add.at(sums, corners[with_normal], reader.normals.view()[corner_normals[with_normal]])
+    points = reader.positions.view()[faces]
+    face_normals = np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0])
+    for corner in range(3):
+        np.add.at(face_sums, faces[:, corner], face_normals)
+    return np.unique(corners)
+
+
+# unit normals of vertices: the average of the normals of their corners in the file or, when the file gives them
+# none, the area weighted average of the normals of their faces. Vertices of no face get a zero normal
+def vertex_normals(sums, face_sums):
+    normals = np.zeros_like(sums)
+    lengths = np.linalg.norm(sums, axis=1)
+    face_lengths = np.linalg.norm(face_sums, axis=1)
+    has_normal = lengths > 0
+    from_faces = ~has_normal & (face_lengths > 0)
+    normals[has_normal] = sums[has_normal] / lengths[has_normal, np.newaxis]
+    normals[from_faces] = face_sums[from_faces] / face_lengths[from_faces, np.newaxis]
+    return normals
@@ -0,0 +1,154 @@
+#
+# raster.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import numpy as np
+
+# largest number of pixels covered by the bounding boxes of a batch of triangles in Rasterizer.draw
+BATCH_PIXELS = 1 << 18
+# triangles whose bounding box, rounded up to powers of two, covers more pixels than this are drawn on their own
+LARGE_TRIANGLE_PIXELS = 1 << 10
+
+
+class Rasterizer:
+    def __init__(self, frustum, background=(1.0, 1.0, 1.0)):
+        self.frustum = frustum
+        self.background = background
+        # depth holds 1 / (vanishing point - z) for the nearest triangle seen by each pixel. That value is linear
+        # in screen space, so it can be interpolated with the barycentric weights. 0 means nothing was drawn
+        self.depth = np.zeros((frustum.y_res, frustum.x_res))
+        self.color = np.empty((frustum.y_res, frustum.x_res, 3))
+        # id of the triangle drawn on each pixel, -1 for none
+        self.triangles = np.empty((frustum.y_res, frustum.x_res), dtype=int)
+        self.clear()
+
+        # pixel centers, same as Frustum.get_point_at
+        self.pixel_x = frustum.pixel_size_x * np.arange(frustum.x_res) - frustum.half_width + frustum.half_pixel_x
+        self.pixel_y = -frustum.pixel_size_y * np.arange(frustum.y_res) + frustum.half_height - frustum.half_pixel_y
+
+    def clear(self):
+        self.depth.fill(0.0)
+        self.color[:, :] = self.background
+        self.triangles.fill(-1)
+
+    # column ranges of the pixels whose centers fall between x0 and x1, for arrays of bounds
+    def columns(self, x0, x1):
+        frustum = self.frustum
+        first = np.ceil((x0 + frustum.half_width - frustum.half_pixel_x) / frustum.pixel_size_x)
+        last = np.floor((x1 + frustum.half_width - frustum.half_pixel_x) / frustum.pixel_size_x)
+        return np.maximum(first, 0).astype(int), np.minimum(last + 1, frustum.x_res).astype(int)
+
+    # row ranges of the pixels whose centers fall between y0 and y1 (rows grow downwards)
+    def rows(self, y0, y1):
+        frustum = self.frustum
+        first = np.ceil((frustum.half_height - frustum.half_pixel_y - y1) / frustum.pixel_size_y)
+        last = np.floor((frustum.half_height - frustum.half_pixel_y - y0) / frustum.pixel_size_y)
+        return np.maximum(first, 0).astype(int), np.minimum(last + 1, frustum.y_res).astype(int)
+
+    # points is an (M, 3, 3) array of triangles as returned by Frustum.transform_indexed, colors is (M, 3).
+    # The triangles can come in any order, the depth buffer keeps the nearest one for every pixel. ids are the ids
+    # written to the triangles buffer, the positions in points by default.
+    # Small triangles are rasterized in batches of the same bounding box size, rounded up to powers of two, so a
+    # batch is one set of array operations over a (triangles, height, width) block of pixels of at most BATCH_PIXELS.
+    # The ones larger than LARGE_TRIANGLE_PIXELS are drawn one at a time, over their exact bounding box: the padding
+    # of a batch would cost them more than the loop. Of the triangles at the same depth on a pixel, the first one
+    # drawn is kept: the large ones go first, and in a batch the ones earlier in points
+    def draw(self, points, colors, ids=None):
+        ids = np.arange(len(points)) if ids is None else np.asarray(ids)
+        vanishing_point = self.frustum.front + 10.0
+        inverse_depths = 1.0 / (vanishing_point - points[:, :, 2])
+        lows = points[:, :, :2].min(axis=1)
+        highs = points[:, :, :2].max(axis=1)
+        areas = ((points[:, 1, 0] - points[:, 0, 0]) * (points[:, 2, 1] - points[:, 0, 1]) -
+                 (points[:, 1, 1] - points[:, 0, 1]) * (points[:, 2, 0] - points[:, 0, 0]))
+        col0, col1 = self.columns(lows[:, 0], highs[:, 0])
+        row0, row1 = self.rows(lows[:, 1], highs[:, 1])
+        drawn = (areas != 0) & (col0 < col1) & (row0 < row1)
+
+        widths = np.ones(len(points), dtype=int) << np.ceil(np.log2(np.maximum(col1 - col0, 1))).astype(int)
+        heights = np.ones(len(points), dtype=int) << np.ceil(np.log2(np.maximum(row1 - row0, 1))).astype(int)
+        # large triangles are drawn one by one, their pixels outweigh the loop
+        large = drawn & (widths * heights > LARGE_TRIANGLE_PIXELS)
+        for index in np.flatnonzero(large).tolist():
+            self.draw_triangle(points[index, :, :2], inverse_depths[index], areas[index], col0[index], col1[index],
+                               row0[index], row1[index], colors[index], ids[index])
+        drawn &= ~large
+        sizes = np.stack((heights, widths), axis=1)[drawn]
+        indices = np.flatnonzero(drawn)
+        for height, width in np.unique(sizes, axis=0).tolist():
+            members = indices[(sizes[:, 0] == height) & (sizes[:, 1] == width)]
+            batch = max(BATCH_PIXELS // (height * width), 1)
+            for start in range(0, len(members), batch):
+                chunk = members[start:start + batch]
+                self.draw_batch(points[chunk, :, :2], inverse_depths[chunk], areas[chunk], col0[chunk], col1[chunk],
+                                row0[chunk], row1[chunk], height, width, chunk, colors, ids)
+
+        return self.color
+
+    # rasterizes one triangle over its bounding box
+    def draw_triangle(self, points, inverse_depths, area, col0, col1, row0, row1, color, triangle_id):
+        (x1, y1), (x2, y2), (x3, y3) = points
+        xs = self.pixel_x[np.newaxis, col0:col1]
+        ys = self.pixel_y[row0:row1, np.newaxis]
+
+        # edge functions over the bounding box of the triangle. A pixel is inside when the three barycentric weights
+        # have the same sign as the area of the triangle
+        w1 = ((x3 - x2) * (ys - y2) - (y3 - y2) * (xs - x2)) / area
+        w2 = ((x1 - x3) * (ys - y3) - (y1 - y3) * (xs - x3)) / area
+        w3 = 1.0 - w1 - w2
+        inside = (w1 >= 0) & (w2 >= 0) & (w3 >= 0)
+
+        z1, z2, z3 = inverse_depths
+        depth = w1 * z1 + w2 * z2 + w3 * z3
+        depth_tile = self.depth[row0:row1, col0:col1]
+        visible = inside & (depth > depth_tile)
+        depth_tile[visible] = depth[visible]
+        self.color[row0:row1, col0:col1][visible] = color
+        self.triangles[row0:row1, col0:col1][visible] = triangle_id
+
+    # rasterizes triangles whose bounding boxes, in pixels, fit in height x width. positions are the positions of
+    # the triangles in the points given to draw
+    def draw_batch(self, points, inverse_depths, areas, col0, col1, row0, row1, height, width, positions, colors,
+                   ids):
+        frustum = self.frustum
+        cols = col0[:, np.newaxis] + np.arange(width)
+        rows = row0[:, np.newaxis] + np.arange(height)
+        in_box = (rows < row1[:, np.newaxis])[:, :, np.newaxis] & (cols < col1[:, np.newaxis])[:, np.newaxis, :]
+        xs = self.pixel_x[np.minimum(cols, frustum.x_res - 1)][:, np.newaxis, :]
+        ys = self.pixel_y[np.minimum(rows, frustum.y_res - 1)][:, :, np.newaxis]
+
+        x1, y1, x2, y2, x3, y3 = [points[:, corner, axis][:, np.newaxis, np.newaxis]
+                                  for corner in range(3) for axis in range(2)]
+        areas = areas[:, np.newaxis, np.newaxis]
+        # edge functions over the bounding box of each triangle. A pixel is inside when the three barycentric
+        # weights have the same sign as the area of the triangle
+        w1 = ((x3 - x2) * (ys - y2) - (y3 - y2) * (xs - x2)) / areas
+        w2 = ((x1 - x3) * (ys - y3) - (y1 - y3) * (xs - x3)) / areas
+        w3 = 1.0 - w1 - w2
+        triangle, row, col = np.nonzero(in_box & (w1 >= 0) & (w2 >= 0) & (w3 >= 0))
+        if len(triangle) == 0:
+            return
+
+        z1, z2, z3 = [inverse_depths[:, corner][triangle] for corner in range(3)]
+        w = (w1[triangle, row, col], w2[triangle, row, col], w3[triangle, row, col])
+        depth = w[0] * z1 + w[1] * z2 + w[2] * z3
+        pixels = rows[triangle, row] * frustum.x_res + cols[triangle, col]
+        position = positions[triangle]
+
+        # the nearest candidate of each pixel, the first one in points on ties
+        if len(positions) > 1:
+            nearest = np.lexsort((position, -depth, pixels))
+            pixels, depth, position = pixels[nearest], depth[nearest], position[nearest]
+            first = np.ones(len(pixels), dtype=bool)
+            first[1:] = pixels[1:] != pixels[:-1]
+            pixels, depth, position = pixels[first], depth[first], position[first]
+
+        depth_buffer = self.depth.reshape(-1)
+        current = depth_buffer[pixels]
+        visible = depth > current
+        pixels, position = pixels[visible], position[visible]
+        depth_buffer[pixels] = depth[visible]
+        self.color.reshape(-1, 3)[pixels] = colors[position]
+        self.triangles.reshape(-1)[pixels] = ids[position]
@@ -3,19 +3,52 @@
 #
 # Created by Mariano Arselan at 01-12-20
 #
-import pywavefront
+import mesh_cache
 import random
+import time
+import numpy as np
 from matplotlib import pyplot
 from matplotlib.patches import Polygon
-from util import quick_sort
+from matplotlib.collections import PolyCollection
+from matplotlib.image import AxesImage
+from util import DepthSorter
+from raster import Rasterizer
+from bvh import BVH
+from obb_tree import OBBTree
+from obb_tree import box_arrays
+from intersect import TriangleData
+from tiles import TileRenderer
+from obj_reader import ObjReader
+from obj_reader import mesh_arrays
+from obj_reader import add_normals
+from obj_reader import vertex_normals
+from obj_reader import GrowableArray
+from lod import lod_arrays
 from linalg import rotation_matrix_axis_x
 from linalg import rotation_matrix_axis_y
 from linalg import rotation_matrix_axis_z
 from linalg import Vector3D
+from linalg import Matrix4x4
 from linalg import Triangle3D
 from linalg import Line3D
 import math
 
+# the per face arrays of the render paths for the triangles of mesh, (N, 3, 3): the data of the ray tests, the unit
+# normals of the shading stage and the bounding spheres of the culling stage
+def face_arrays(mesh):
+    triangle_data = TriangleData(mesh)
+    lengths = np.linalg.norm(triangle_data.normal, axis=1)
+    normals = triangle_data.normal / np.where(lengths > 0, lengths, 1.0)[:, np.newaxis]
+    centers = mesh.mean(axis=1)
+    radii = np.linalg.norm(mesh - centers[:, np.newaxis], axis=2).max(axis=1)
+    return triangle_data, normals, centers, radii
+
+
+# largest depth error, as a fraction of the diameter of the scene, the painter's algorithm accepts between two
+# triangles before sorting them again
+DEPTH_TOLERANCE = 0.01
+
+
 class Frustum:
     def __init__(self, width, height, front, rear, x_res, y_res, plt, light, azimuth=0.0, elevation=0.0, angle=0.0):
         self.width = width
@@ -39,19 +72,38 @@ class Frustum:
         self.half_pixel_y = self.pixel_size_y / 2
         self.half_width = width / 2
         self.half_height = height / 2
+        self.light_direction = np.array(light.norm().components())
+        # same angles as set_light
+        self.light_angles = (math.atan2(self.light_direction[2], self.light_direction[0]),
+                             math.asin(max(-1.0, min(1.0, self.light_direction[1]))))
 
         self.update_base()
 
     def get_point_at(self, pixel_x, pixel_y):
         return self.pixel_size_x * pixel_x - self.half_width + self.half_pixel_x, -self.pixel_size_y * pixel_y + self.half_height - self.half_pixel_y
 
+    # rebuilds the camera matrices, called whenever a camera parameter changes. The rotations are composed once,
+    # the base of the camera is made of the columns of the result and the view matrix is its transpose. The
+    # projection keeps the camera Z and puts (vanishing point - z) / vc_distance in w, so dividing x and y by w
+    # projects them onto the front plane
     def update_base(self):
-        x_rotation_matrix = rotation_matrix_axis_x(elevation=self.elevation)
-        y_rotation_matrix = rotation_matrix_axis_y(azimuth=self.azimuth)
-        z_rotation_matrix = rotation_matrix_axis_z(angle=self.angle)
-        self.dir1 = z_rotation_matrix * (y_rotation_matrix * (x_rotation_matrix * Vector3D(1, 0, 0)))
-        self.dir2 = z_rotation_matrix * (y_rotation_matrix * (x_rotation_matrix * Vector3D(0, 1, 0)))
-        self.dir3 = z_rotation_matrix * (y_rotation_matrix * (x_rotation_matrix * Vector3D(0, 0, 1)))
+        rotation = (Matrix4x4.from_matrix3x3(rotation_matrix_axis_z(angle=self.angle)) *
+                    Matrix4x4.from_matrix3x3(rotation_matrix_axis_y(azimuth=self.azimuth)) *
+                    Matrix4x4.from_matrix3x3(rotation_matrix_axis_x(elevation=self.elevation)))
+        self.dir1, self.dir2, self.dir3 = [Vector3D(*column) for column in rotation.array[:3, :3].T.tolist()]
+        self.view_matrix = rotation.transpose()
+        # rows of the base of the camera: the unit dir1, dir2 and dir3
+        self.base = self.view_matrix.array[:3, :3]
+
+        vc_distance = 10.0
+        projection = Matrix4x4()
+        projection.array[3] = (0.0, 0.0, -1.0 / vc_distance, (self.front + vc_distance) / vc_distance)
+        self.view_projection = projection * self.view_matrix
+
+    # position of the vanishing point, where all the rays of the camera start, in world space
+    @property
+    def eye(self):
+        return self.base[2] * (self.front + 10.0)
 
     def set_azimuth(self, azimuth):
         self.azimuth = azimuth
@@ -74,57 +126,27 @@ class Frustum:
         y = math.sin(elevation)
         z = math.cos(elevation) * math.sin(azimuth)
         self.light = Vector3D(x, y, z)
+        self.light_direction = np.array(self.light.norm().components())
+        self.light_angles = (azimuth, elevation)
 
 
     def transform(self, triangle):
-        dir1 = self.dir1
-        dir2 = self.dir2
-        dir3 = self.dir3
-
-        p1 = triangle.p1
-        p2 = triangle.p2
-        p3 = triangle.p3
-
-        # project Z coords onto current base
-        zp1 = p1.dot_prod(dir3) / dir3.length()
-        zp2 = p2.dot_prod(dir3) / dir3.length()
-        zp3 = p3.dot_prod(dir3) / dir3.length()
+        # X, Y and Z coords of the points in the current base and the W that projects them
+        points = self.view_projection.apply_homogeneous([triangle.p1.components(), triangle.p2.components(),
+                                                         triangle.p3.components()])
+        zp = points[:, 2]
 
         # check if Z coords of the three points are inside the frustum
-        if self.front <= zp1 or self.front <= zp2 or self.front <= zp3:
+        if np.any(self.front <= zp) or np.any(zp <= self.rear):
             return None
-        if zp1 <= self.rear or zp2 <= self.rear or zp2 <= self.rear:
-            return None
-
-        # project X coords onto current base
-        xp1 = p1.dot_prod(dir1) / dir1.length()
-        xp2 = p2.dot_prod(dir1) / dir1.length()
-        xp3 = p3.dot_prod(dir1) / dir1.length()
-
-        # project Y coords onto current base
-        yp1 = p1.dot_prod(dir2) / dir2.length()
-        yp2 = p2.dot_prod(dir2) / dir2.length()
-        yp3 = p3.dot_prod(dir2) / dir2.length()
-
-        vc_distance = 10.0
-        vanishing_point = self.front + vc_distance
 
         # project the new triangle onto the front plane of the frustum
-        vp1_dist = abs(vanishing_point - zp1)
-        xp1 = xp1 * vc_distance / vp1_dist
-        yp1 = yp1 * vc_distance / vp1_dist
-
-        vp2_dist = abs(vanishing_point - zp2)
-        xp2 = xp2 * vc_distance / vp2_dist
-        yp2 = yp2 * vc_distance / vp2_dist
+        xp = points[:, 0] / np.abs(points[:, 3])
+        yp = points[:, 1] / np.abs(points[:, 3])
 
-        vp3_dist = abs(vanishing_point - zp3)
-        xp3 = xp3 * vc_distance / vp3_dist
-        yp3 = yp3 * vc_distance / vp3_dist
-
-        projected_point_1 = Vector3D(xp1, yp1, zp1)
-        projected_point_2 = Vector3D(xp2, yp2, zp2)
-        projected_point_3 = Vector3D(xp3, yp3, zp3)
+        projected_point_1 = Vector3D(xp[0], yp[0], zp[0])
+        projected_point_2 = Vector3D(xp[1], yp[1], zp[1])
+        projected_point_3 = Vector3D(xp[2], yp[2], zp[2])
         projected_triangle = Triangle3D(projected_point_1, projected_point_2, projected_point_3)
         projected_triangle_norm = projected_triangle.normal.norm()
         projected_dot_prod = Vector3D(0, 0, 1).dot_prod(projected_triangle_norm)
@@ -133,6 +155,99 @@ class Frustum:
 
         return projected_triangle
 
+    # transforms a whole mesh at once. vertices is an (N, 3, 3) array holding the three points of every triangle.
+    # Returns the indices of the triangles that survived the frustum and backface tests together with their
+    # projected points as an (M, 3, 3) array (x, y projected onto the front plane, z in camera space)
+    def transform_mesh(self, vertices):
+        vertices = np.asarray(vertices, dtype=float)
+        return self.transform_indexed(vertices.reshape(-1, 3), np.arange(3 * len(vertices)).reshape(-1, 3))
+
+    # same as transform_mesh for an indexed mesh: positions is a (V, 3) array of unique vertices and faces an (N, 3)
+    # array of indices into it. The camera transform and the perspective divide run once per vertex, and the
+    # triangles gather their points from the result
+    def transform_indexed(self, positions, faces):
+        # X, Y and Z coords of every vertex in the current base, and the W that projects them, with one product by
+        # the cached view projection matrix
+        homogeneous = self.view_projection.apply_homogeneous(positions)
+        points = homogeneous[:, :3]
+        zp = points[:, 2]
+
+        # check if Z coords of the three points are inside the frustum
+        inside = np.all(((zp < self.front) & (zp > self.rear))[faces], axis=1)
+
+        # project the vertices onto the front plane of the frustum
+        scale = 1.0 / np.abs(homogeneous[:, 3])
+        points[:, 0] *= scale
+        points[:, 1] *= scale
+        points = points[faces[inside]]
+
+        # keep only the triangles facing the camera (Z component of the projected normal)
+        v1 = points[:, 1, :2] - points[:, 0, :2]
+        v2 = points[:, 2, :2] - points[:, 0, :2]
+        facing = v1[:, 0] * v2[:, 1] - v1[:, 1] * v2[:, 0] > 0
+
+        indices = np.flatnonzero(inside)[facing]
+        return indices, points[facing]
+
+    # signed distances from points, (..., 3), to the planes of the view cone: the pyramid that goes from the
+    # vanishing point through the border of the front plane, cut by the near and rear planes. Returns them as
+    # (6, ...), positive on the outer side
+    def plane_distances(self, points):
+        vc_distance = 10.0
+        depth = self.front + vc_distance
+
+        x, y, z = np.moveaxis(np.asarray(points, dtype=float) @ self.base.T, -1, 0)
+        sides_x = self.half_width * (depth - z)
+        sides_y = self.half_height * (depth - z)
+        width_norm = np.hypot(vc_distance, self.half_width)
+        height_norm = np.hypot(vc_distance, self.half_height)
+        return np.stack((z - self.front, self.rear - z,
+                         (x * vc_distance - sides_x) / width_norm, (-x * vc_distance - sides_x) / width_norm,
+                         (y * vc_distance - sides_y) / height_norm, (-y * vc_distance - sides_y) / height_norm))
+
+    # classifies bounding spheres against the view cone. Returns two masks, the spheres entirely outside it and the
+    # ones entirely inside it
+    def classify_spheres(self, centers, radii):
+        distances = self.plane_distances(np.asarray(centers).reshape(-1, 3))
+        outside = np.any(distances >= radii, axis=0)
+        inside = np.all(distances < -radii, axis=0)
+        return outside, inside
+
+    # same as classify_spheres for boxes given by their (K, 8, 3) corners. A box is outside when all its corners are
+    # on the outer side of the same plane. Boxes near an edge of the cone can be outside of it without that, they
+    # are kept
+    def classify_boxes(self, corners):
+        distances = self.plane_distances(np.asarray(corners).reshape(-1, 8, 3))
+        outside = np.any(np.all(distances >= 0, axis=2), axis=0)
+        inside = np.all(distances < 0, axis=(0, 2))
+        return outside, inside
+
+    # cheap culling stage that runs in world space before any projection. centers and radii are the bounding spheres
+    # of the faces, normals their unit normals and points one vertex of each. faces are the indices of the faces to
+    # test (all by default), and the view cone test is skipped for those where in_view is True, e.g. because their
+    # object is known to be inside it. Returns the indices of the faces that may be visible and how many faces each
+    # test removed
+    def cull(self, centers, radii, normals, points, faces=None, in_view=None):
+        if faces is None:
+            faces = np.arange(len(normals))
+        if in_view is None:
+            in_view = np.zeros(len(faces), dtype=bool)
+        eye = self.eye
+
+        # back faces: the camera is behind the plane of the face
+        front_facing = np.einsum('ij,ij->i', normals[faces], eye - points[faces]) > 0
+        candidates = faces[front_facing]
+        in_view = in_view[front_facing]
+
+        # view cone, only for the faces that may cross it
+        tested = candidates[~in_view]
+        outside, _ = self.classify_spheres(centers[tested], radii[tested])
+        visible = np.concatenate((candidates[in_view], tested[~outside]))
+
+        stats = {'triangles': len(faces), 'backface': len(faces) - len(candidates),
+                 'frustum': int(np.count_nonzero(outside))}
+        return np.sort(visible), stats
+
     def project_triangle(self, transformed_triangle, original_triangle):
         dir1 = self.dir1
         dir2 = self.dir2
@@ -161,10 +276,37 @@ class Frustum:
 
 
 class Face3D:
-    def __init__(self, triangles=None):
+    # indices are the positions of the triangles of this object in the mesh of its scene
+    def __init__(self, triangles=None, indices=None):
         if triangles is None:
             triangles = []
+        if indices is None:
+            indices = np.empty(0, dtype=int)
         self.triangles = triangles
+        self.indices = indices
+        self.center = np.zeros(3)
+        self.radius = 0.0
+        self.box = None
+        # the faces of each level of detail, the full object first, and how far each level can be from it
+        self.levels = [indices]
+        self.errors = [0.0]
+
+    # computes the bounding volumes of the object from the points of its triangles: a sphere around the center of
+    # its axis aligned box and the oriented box of Vector3D.fit_box (8 corners and its center). box is given when it
+    # was already fitted together with the ones of the other objects
+    def update_bounds(self, points, box=None):
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        if len(points) == 0:
+            return
+        self.center = (points.min(axis=0) + points.max(axis=0)) / 2
+        self.radius = float(np.linalg.norm(points - self.center, axis=1).max())
+        self.box = box if box is not None else Vector3D.fit_box(points)
+
+    # the 8 corners of the oriented box, (8, 3). The center of the object when it has none
+    def box_corners(self):
+        if self.box is None:
+            return np.tile(self.center, (8, 1))
+        return np.array([corner.components() for corner in self.box[:8]], dtype=float)
 
     def add(self, triangle):
         self.triangles.append(triangle)
@@ -183,11 +325,40 @@ class Face3D:
 class Scene3D:
     def __init__(self, file_name, plt, frustum, light):
         self.file_name = file_name
-        self.triangles = []
+        self.positions = np.empty((0, 3))
+        self.normals = np.empty((0, 3))
+        self.faces = np.empty((0, 3), dtype=np.int32)
+        self.triangle_list = []
+        self.mesh = np.empty((0, 3, 3))
+        self.triangle_data = TriangleData(self.mesh)
+        self.face_normals = np.empty((0, 3))
+        self.face_centers = np.empty((0, 3))
+        self.face_radii = np.empty(0)
         self.objects = []
+        self.object_centers = np.empty((0, 3))
+        self.object_radii = np.empty(0)
+        self.object_corners = np.empty((0, 8, 3))
+        # the object of each face of the file
+        self.face_objects = np.empty(0, dtype=int)
+        # largest error, in pixels of the frustum, allowed for the level of detail drawn for each object
+        self.lod_threshold = 1.0
         self.plt = plt
         self.frustum = frustum
         self.light = light
+        self.sorter = DepthSorter()
+        self.collection = None
+        self.rasterizer = None
+        self.image = None
+        self.bvh = None
+        self.spatial_index = None
+        self.tile_renderer = None
+        # how many triangles the culling stage removed in the last frame, per test
+        self.cull_stats = {}
+        # what the last frame showed, so it can be shaded again when only the light changes: the sorted triangles
+        # of the polygons, or the triangle seen by each pixel (-1 for none) of the framebuffer
+        self.frame_target = None
+        self.frame_triangles = None
+        self.content_hash = None
 
     def set_azimuth(self, azimuth):
         self.frustum.set_azimuth(azimuth)
@@ -205,79 +376,403 @@ class Scene3D:
         self.frustum.set_distance(camera_distance)
         self.project_fast()
 
+    # only the light changed, so the last frame is shaded again instead of rendered
     def set_light(self, azimuth, elevation):
         self.frustum.set_light(azimuth, elevation)
+        self.reshade()
+
+    # culls the faces that can't be seen and transforms the rest. Returns the same as Frustum.transform_indexed.
+    # Objects are tested first as a whole: the triangles of the ones outside the view cone are never touched, and
+    # the ones entirely inside it skip the per triangle view cone test. Their bounding spheres are tested first, and
+    # the oriented boxes, which fit long or flat objects much better, settle the ones the spheres cross the cone with
+    def transform(self):
+        outside, inside = self.frustum.classify_spheres(self.object_centers, self.object_radii)
+        crossing = np.flatnonzero(~outside & ~inside)
+        outside[crossing], inside[crossing] = self.frustum.classify_boxes(self.object_corners[crossing])
+        selected = [face.levels[level] for face, level in zip(self.objects, self.select_levels())]
+        kept = [indices for indices, culled in zip(selected, outside) if not culled]
+        faces = np.concatenate(kept) if kept else np.empty(0, dtype=int)
+        in_view = np.repeat(inside[~outside], [len(indices) for indices in kept])
+        candidates, self.cull_stats = self.frustum.cull(self.face_centers, self.face_radii, self.face_normals,
+                                                        self.triangle_data.p0, faces, in_view)
+        selected_count = sum(len(indices) for indices in selected)
+        self.cull_stats['lod'] = sum(len(face.indices) for face in self.objects) - selected_count
+        self.cull_stats['objects'] = int(np.count_nonzero(outside))
+        self.cull_stats['object_boxes'] = int(np.count_nonzero(outside[crossing]))
+        self.cull_stats['object_triangles'] = selected_count - len(faces)
+        indices, points = self.frustum.transform_indexed(self.positions, self.faces[candidates])
+        self.cull_stats['projection'] = len(candidates) - len(indices)
+        return candidates[indices], points
+
+    # the level of detail to draw for each object: the coarsest one whose error, seen from the camera at the nearest
+    # point of the bounding sphere of the object, stays under lod_threshold pixels
+    def select_levels(self):
+        frustum = self.frustum
+        vc_distance = 10.0
+        depths = frustum.front + vc_distance - self.object_centers @ frustum.base[2] - self.object_radii
 
-    def project_fast(self):
-        transformed_triangles = []
-        original_triangles = {}
-        for triangle in self.triangles:
-            transformed_triangle = self.frustum.transform(triangle)
-            if transformed_triangle is None:
+        levels = []
+        for face, depth in zip(self.objects, depths.tolist()):
+            if depth <= 0:
+                levels.append(0)
                 continue
-            transformed_triangles.append(transformed_triangle)
-            original_triangles[transformed_triangle] = triangle
-        quick_sort(transformed_triangles)
-        for transformed_triangle in transformed_triangles:
-            self.frustum.project_triangle(transformed_triangle, original_triangles[transformed_triangle])
+            pixel_errors = np.asarray(face.errors) * vc_distance / depth / frustum.pixel_size_x
+            levels.append(int(np.count_nonzero(pixel_errors <= self.lod_threshold)) - 1)
+        return levels
 
+    def project_fast(self):
+        self.submit(self.prepare_frame())
+
+    # the geometry work of project_fast, without touching the axes, so it can run away from the GUI thread.
+    # Returns the frame to pass to submit: the sorted projected triangles, their ids in the mesh and their colors.
+    # cancelled, when given, is asked between the stages whether the frame is still wanted, and None is returned as
+    # soon as it isn't
+    def prepare_frame(self, cancelled=None):
+        indices, points = self.transform()
+        if cancelled is not None and cancelled():
+            return None
+
+        # sort by the max Z of each projected triangle
+        order = self.sorter.order(indices, points[:, :, 2].max(axis=1))
+        triangles = indices[order]
+        if cancelled is not None and cancelled():
+            return None
+        return {'verts': points[order][:, :, :2], 'triangles': triangles, 'colors': self.shade(triangles)}
+
+    # the same frame colored again for the current light
+    def reshade_frame(self, frame):
+        return dict(frame, colors=self.shade(frame['triangles']))
+
+    # draws a frame returned by prepare_frame
+    def submit(self, frame):
+        self.draw_polygons(frame['verts'], frame['colors'])
+        self.frame_target = 'polygons'
+        self.frame_triangles = frame['triangles']
+
+    # renders the scene into the NumPy framebuffers of a Rasterizer at the resolution of the frustum.
+    # The depth buffer resolves visibility, so the triangles don't need to be sorted
+    def project_raster(self):
+        if self.rasterizer is None:
+            self.rasterizer = Rasterizer(self.frustum)
+        indices, points = self.transform()
+        self.rasterizer.clear()
+        color = self.rasterizer.draw(points, self.shade(indices), indices)
+        self.draw_image(color)
+        self.frame_target = 'image'
+        self.frame_triangles = self.rasterizer.triangles.copy()
+        return color
+
+    # calculates the light for the given triangles of the mesh from their cached normals. Returns one color per
+    # triangle
+    def shade(self, indices):
+        shadows = np.maximum(self.face_normals[indices] @ self.frustum.light_direction, 0)
+        colors = np.zeros((len(indices), 3))
+        colors[:, 2] = shadows
+        return colors
+
+    # shading stage on its own: when only the light moved, the last frame is colored again from the cached normals,
+    # reusing its transformed and sorted geometry. Returns the new colors of the polygons or of the framebuffer. With
+    # no frame to reuse, the scene is rendered with project_fast
+    def reshade(self):
+        if self.frame_target == 'polygons':
+            colors = self.shade(self.frame_triangles)
+            self.collection.set_facecolors(colors)
+            self.collection.set_edgecolors(colors)
+            return colors
+        if self.frame_target == 'image':
+            color = self.shade_pixels(self.frame_triangles)
+            self.draw_image(color)
+            return color
+        self.project_fast()
+        return self.collection.get_facecolors()[:, :3]
+
+    # colors a framebuffer holding the triangle seen by each pixel
+    def shade_pixels(self, pixel_triangles):
+        hit = pixel_triangles >= 0
+        color = np.ones(pixel_triangles.shape + (3,))
+        color[hit] = self.shade(pixel_triangles[hit])
+        return color
+
+    # shows a framebuffer on the axes, covering the front plane of the frustum. As with draw_polygons, the image
+    # artist is reused across frames
+    def draw_image(self, color):
+        if self.image is None:
+            frustum = self.frustum
+            extent = (-frustum.half_width, frustum.half_width, -frustum.half_height, frustum.half_height)
+            self.image = AxesImage(self.plt, extent=extent, interpolation='nearest')
+        self.image.set_data(color)
+        if self.image not in self.plt.images:
+            self.plt.add_image(self.image)
+            self.plt.autoscale_view()
+
+    # submits all the projected triangles of a frame as a single PolyCollection. The collection is reused across
+    # frames and only added again to the axes when it was removed (e.g. after plt.clear())
+    def draw_polygons(self, verts, colors):
+        if self.collection is None:
+            self.collection = PolyCollection([], closed=True)
+        self.collection.set_verts(verts)
+        self.collection.set_facecolors(colors)
+        self.collection.set_edgecolors(colors)
+        if self.collection not in self.plt.collections:
+            self.plt.add_collection(self.collection)
+            self.plt.autoscale_view()
+
+    # ray casts the scene, one ray per pixel of the frustum. The rays of the whole pixel grid are traced in world
+    # space as one packet against a BVH built once for the mesh, and the frustum tests run once per frame to select
+    # the triangles the rays can hit
     def project(self):
-        camera_distance = self.frustum.front
-        vanishing_point = camera_distance + 10.0
-        for pixel_y in range(0, self.frustum.y_res):
-            for pixel_x in range(0, self.frustum.x_res):
-                nearest_point = None
-                nearest_triangle = None
-                nearest_original_triangle = None
-                point_x, point_y = self.frustum.get_point_at(pixel_x, pixel_y)
-                print(f'({point_x},{point_y})')
-                # self.plt.plot([point_x], [point_y], ".r")
-                for triangle in self.triangles:
-                    transformed_triangle = self.frustum.transform(triangle)
-                    if transformed_triangle is None:
-                        continue
-                    line = Line3D(Vector3D(point_x, point_y, self.frustum.front), Vector3D(0, 0, vanishing_point))
-                    i_point = transformed_triangle.intersection_point(line)
-                    # print(i_point)
-                    if i_point is None:
-                        continue
-                    if nearest_point is None or nearest_point.z() < i_point.z():
-                        nearest_point = i_point
-                        nearest_triangle = transformed_triangle
-                        nearest_original_triangle = triangle
-
-                if nearest_triangle is not None:
-                    self.frustum.project(nearest_original_triangle, point_x, point_y)
-
-    def parse_file(self):
-        scene = pywavefront.Wavefront(self.file_name, strict=False, encoding="utf-8", collect_faces=True, parse=True,
-                                      create_materials=True, cache=False)
-        for name, material in scene.materials.items():
-            print(material.vertex_format)
-
-            v = material.vertices
-            vectors = []
-            if material.vertex_format == 'N3F_V3F':
-                for index in range(0, len(v), 6):
-                    vector = Vector3D(*v[index + 3:index + 6], *v[index:index + 3])
-                    vectors.append(vector)
-            else:
-                for index in range(0, len(v), 3):
-                    vector = Vector3D(*v[index:index + 3])
-                    vectors.append(vector)
-            self.triangles = []
-            for index in range(0, len(vectors), 3):
-                triangle = Triangle3D(*vectors[index:index + 3])
-                self.triangles.append(triangle)
-
-            index = 0
-            for mesh in scene.mesh_list:
-                face = Face3D()
-                for _ in mesh.faces:
-                    triangle = self.triangles[index]
-                    index += 1
-                    face.add(triangle)
-                self.objects.append(face)
+        if self.bvh is None:
+            self.bvh = BVH(self.mesh, self.triangle_data)
+        frustum = self.frustum
+        indices, _ = self.transform()
+        visible = np.zeros(len(self.mesh), dtype=bool)
+        visible[indices] = True
+
+        eye, directions = self.camera_rays()
+        _, triangles, _, _ = self.bvh.intersect_packet(eye, directions, visible)
+
+        self.frame_target = 'image'
+        self.frame_triangles = triangles.reshape(frustum.y_res, frustum.x_res)
+        color = self.shade_pixels(self.frame_triangles)
+        self.draw_image(color)
+        return color
+
+    # the depth sorter reuses the order of the last frame while it is off by less than DEPTH_TOLERANCE of the size
+    # of the scene, which small camera moves rarely exceed
+    def update_depth_tolerance(self):
+        if len(self.object_radii):
+            low = (self.object_centers - self.object_radii[:, np.newaxis]).min(axis=0)
+            high = (self.object_centers + self.object_radii[:, np.newaxis]).max(axis=0)
+            self.sorter.tolerance = DEPTH_TOLERANCE * float(np.linalg.norm(high - low))
+        self.sorter.reset()
+
+    # stops the workers of project_parallel and frees the shared memory of the mesh they render, e.g. before the
+    # mesh changes
+    def close_tile_renderer(self):
+        if self.tile_renderer is not None:
+            self.tile_renderer.close()
+            self.tile_renderer = None
+
+    # same image as project, with the pixel grid split in tiles that are ray cast by a pool of worker processes
+    def project_parallel(self, processes=None, tile_size=32):
+        if self.tile_renderer is None:
+            self.tile_renderer = TileRenderer(self, processes, tile_size)
+        color, triangles = self.tile_renderer.render()
+        self.draw_image(color)
+        self.frame_target = 'image'
+        self.frame_triangles = triangles
+        return color
+
+    # the rays of the pixel grid, row by row. They go from the vanishing point through the center of each pixel on
+    # the front plane. Returns the origin shared by all of them and their (y_res * x_res, 3) directions
+    def camera_rays(self):
+        frustum = self.frustum
+        base = frustum.base
+        vc_distance = 10.0
+
+        pixel_x = frustum.pixel_size_x * np.arange(frustum.x_res) - frustum.half_width + frustum.half_pixel_x
+        pixel_y = -frustum.pixel_size_y * np.arange(frustum.y_res) + frustum.half_height - frustum.half_pixel_y
+        point_x, point_y = np.meshgrid(pixel_x, pixel_y)
+        directions = (point_x.reshape(-1, 1) * base[0] + point_y.reshape(-1, 1) * base[1] - vc_distance * base[2])
+        return frustum.eye, directions
+
+    # Triangle3D objects are only built when they are asked for, the render paths work on the mesh arrays
+    @property
+    def triangles(self):
+        if self.triangle_list is None:
+            vectors = [Vector3D(*position, *normal) for position, normal in zip(self.positions.tolist(),
+                                                                               self.normals.tolist())]
+            self.triangle_list = [Triangle3D(*[vectors[index] for index in face]) for face in self.faces.tolist()]
+            for face in self.objects:
+                face.triangles = [self.triangle_list[index] for index in face.indices]
+        return self.triangle_list
+
+    # SHA-1 of the OBJ file, computed the first time it is asked for after loading it
+    @property
+    def mesh_hash(self):
+        if self.content_hash is None:
+            self.content_hash = mesh_cache.content_hash(self.file_name)
+        return self.content_hash
+
+    # OBB tree over the faces of the file, without the levels of detail, built the first time it is asked for
+    @property
+    def obb_tree(self):
+        if self.spatial_index is None:
+            self.spatial_index = OBBTree(self.mesh[:len(self.face_objects)], self.triangle_data)
+        return self.spatial_index
+
+    # the nearest face hit by each ray, e.g. the ones of camera_rays for the pixels under the mouse. Returns the
+    # distance of the hit in units of the direction (inf for none), the face and its object (-1 for none)
+    def pick(self, origins, directions):
+        t, triangles, _, _ = self.obb_tree.intersect_rays(origins, directions)
+        return t, triangles, np.where(triangles >= 0, self.face_objects[triangles], -1)
+
+    # collision test of boxes, as returned by Vector3D.fit_box (e.g. the box of a Face3D of another scene), against
+    # the faces of the scene. Returns the pairs of box and object where a face of the object overlaps the box
+    def overlapping_objects(self, boxes):
+        boxes, triangles = self.obb_tree.overlap_boxes(*box_arrays(boxes))
+        pairs = np.unique(np.stack((boxes, self.face_objects[triangles]), axis=1), axis=0)
+        return pairs[:, 0], pairs[:, 1]
+
+    # loads the mesh from the binary cache of the file, parsing the OBJ only when the cache is missing or stale.
+    # Building the levels of detail takes much longer than parsing, so they are only built when lod is True; a
+    # cache that has them always gives them
+    def parse_file(self, use_cache=True, lod=False):
+        arrays = mesh_cache.load(self.file_name) if use_cache else None
+        if arrays is None or (lod and 'lod_faces' not in arrays):
+            # copied out of the memory maps before the cache files are written again
+            arrays = self.read_file() if arrays is None else {name: np.array(value) for name, value in arrays.items()}
+            if lod:
+                arrays.update(lod_arrays(arrays['positions'], arrays['faces'], arrays['object_sizes']))
+            if use_cache:
+                mesh_cache.save(self.file_name, arrays)
+        self.load_arrays(arrays)
+
+    # parses the OBJ file. Returns the vertices, the faces as indices into them and the number of faces of each
+    # object
+    def read_file(self):
+        reader = ObjReader(self.file_name)
+        return mesh_arrays(reader, list(reader.groups()))
+
+    # parses the OBJ file group by group, adding each one to the scene as soon as it has been read, so the caller
+    # can render what is already loaded. Only the new group is processed each time: its vertices, faces and bounds
+    # are appended to growable arrays the scene takes views of. Yields the number of objects loaded so far, at most
+    # every interval seconds and once more when the file is done, so the caller doesn't reproject the scene for every
+    # small group. The levels of detail, when lod is True, are built and the cache is written once the whole file
+    # has been read. A valid cache is loaded at once, like parse_file does
+    def stream_file(self, use_cache=True, interval=0.1, lod=False):
+        arrays = mesh_cache.load(self.file_name) if use_cache else None
+        if arrays is not None and (not lod or 'lod_faces' in arrays):
+            self.load_arrays(arrays)
+            yield len(self.objects)
+            return
+
+        reader = ObjReader(self.file_name)
+        self.load_arrays(mesh_arrays(reader, []))
+        buffers = {'normal_sums': GrowableArray(3), 'face_normal_sums': GrowableArray(3), 'normals': GrowableArray(3),
+                   'faces': GrowableArray(3, dtype=np.int32), 'mesh': GrowableArray(9),
+                   'p0': GrowableArray(3), 'edge1': GrowableArray(3), 'edge2': GrowableArray(3),
+                   'normal': GrowableArray(3), 'offset': GrowableArray(1), 'face_normals': GrowableArray(3),
+                   'face_centers': GrowableArray(3), 'face_radii': GrowableArray(1),
+                   'face_objects': GrowableArray(1, dtype=int), 'object_centers': GrowableArray(3),
+                   'object_radii': GrowableArray(1), 'object_corners': GrowableArray(24)}
+        groups = []
+        shown = None
+        for group in reader.groups():
+            groups.append(group)
+            self.append_group(reader, group, buffers)
+            if shown is None or time.monotonic() - shown >= interval:
+                shown = time.monotonic()
+                yield len(self.objects)
+        arrays = mesh_arrays(reader, groups)
+        if lod:
+            arrays.update(lod_arrays(arrays['positions'], arrays['faces'], arrays['object_sizes']))
+        # the scene takes the arrays of the whole file, with the bounding boxes of parse_file
+        self.load_arrays(arrays)
+        if use_cache:
+            mesh_cache.save(self.file_name, arrays)
+        yield len(self.objects)
+
+    # adds the faces of a group just read by reader to the buffers of stream_file, and points the arrays of the
+    # scene to them
+    def append_group(self, reader, group, buffers):
+        positions = reader.positions.view()
+        first_vertex = len(buffers['normals'])
+        for name in ('normal_sums', 'face_normal_sums', 'normals'):
+            buffers[name].extend(np.zeros((len(positions) - first_vertex, 3)))
+        sums = buffers['normal_sums'].view()
+        face_sums = buffers['face_normal_sums'].view()
+        normals = buffers['normals'].view()
+        # vertices of earlier groups can get more normals from the faces of this one
+        touched = add_normals(sums, face_sums, reader, group.faces, group.normal_faces)
+        normals[touched] = vertex_normals(sums[touched], face_sums[touched])
+
+        faces = np.asarray(group.faces, dtype=np.int32)
+        mesh = positions[faces]
+        start = len(buffers['faces'])
+        triangle_data, face_normals, face_centers, face_radii = face_arrays(mesh)
+        buffers['faces'].extend(faces)
+        buffers['mesh'].extend(mesh.reshape(-1, 9))
+        for name in ('p0', 'edge1', 'edge2', 'normal', 'offset'):
+            buffers[name].extend(getattr(triangle_data, name))
+        buffers['face_normals'].extend(face_normals)
+        buffers['face_centers'].extend(face_centers)
+        buffers['face_radii'].extend(face_radii)
+        buffers['face_objects'].extend(np.full(len(faces), len(self.objects)))
+
+        face = Face3D(indices=np.arange(start, start + len(faces)))
+        face.update_bounds(positions[np.unique(faces)])
+        self.objects.append(face)
+        buffers['object_centers'].extend(face.center)
+        buffers['object_radii'].extend(face.radius)
+        buffers['object_corners'].extend(face.box_corners().reshape(1, 24))
+
+        self.positions = positions
+        self.normals = normals
+        self.faces = buffers['faces'].view()
+        self.mesh = buffers['mesh'].view().reshape(-1, 3, 3)
+        self.triangle_data = TriangleData.from_arrays({'p0': buffers['p0'].view(), 'edge1': buffers['edge1'].view(),
+                                                       'edge2': buffers['edge2'].view(),
+                                                       'normal': buffers['normal'].view(),
+                                                       'offset': buffers['offset'].view()[:, 0]})
+        self.face_normals = buffers['face_normals'].view()
+        self.face_centers = buffers['face_centers'].view()
+        self.face_radii = buffers['face_radii'].view()[:, 0]
+        self.face_objects = buffers['face_objects'].view()[:, 0]
+        self.object_centers = buffers['object_centers'].view()
+        self.object_radii = buffers['object_radii'].view()[:, 0]
+        self.object_corners = buffers['object_corners'].view().reshape(-1, 8, 3)
+        self.update_depth_tolerance()
+        self.triangle_list = None
+        self.content_hash = None
+        self.frame_target = None
+        self.bvh = None
+        self.spatial_index = None
+        self.close_tile_renderer()
+
+    # the faces of the levels of detail, when there are any, are appended to the ones of the file, so every render
+    # path can draw them like any other face of the mesh
+    def load_arrays(self, arrays):
+        self.positions = np.asarray(arrays['positions'])
+        self.normals = np.asarray(arrays['normals'])
+        self.faces = np.asarray(arrays['faces'])
+        self.triangle_list = None
+        self.content_hash = None
+
+        self.objects = []
+        start = 0
+        for size in np.asarray(arrays['object_sizes']).tolist():
+            end = min(start + size, len(self.faces))
+            self.objects.append(Face3D(indices=np.arange(start, end)))
+            start = end
+        self.face_objects = np.repeat(np.arange(len(self.objects)), [len(face.indices) for face in self.objects])
+
+        if 'lod_faces' in arrays:
+            start = len(self.faces)
+            self.faces = np.vstack((self.faces, np.asarray(arrays['lod_faces'])))
+            for face, sizes, errors in zip(self.objects, np.asarray(arrays['lod_sizes']).tolist(),
+                                           np.asarray(arrays['lod_errors']).tolist()):
+                for size, error in zip(sizes, errors):
+                    face.levels.append(np.arange(start, start + size))
+                    face.errors.append(error)
+                    start += size
+
+        self.mesh = self.positions[self.faces]
+        self.triangle_data, self.face_normals, self.face_centers, self.face_radii = face_arrays(self.mesh)
+        # bounding volumes of the objects for the hierarchical culling
+        samples = [self.positions[np.unique(self.faces[face.indices])] for face in self.objects]
+        boxes = Vector3D.fit_boxes([sample for sample in samples if len(sample)])
+        boxes.reverse()
+        for face, sample in zip(self.objects, samples):
+            face.update_bounds(sample, boxes.pop() if len(sample) else None)
+        self.object_centers = np.array([face.center for face in self.objects]).reshape(-1, 3)
+        self.object_radii = np.array([face.radius for face in self.objects])
+        self.object_corners = np.array([face.box_corners() for face in self.objects]).reshape(-1, 8, 3)
+        self.update_depth_tolerance()
+        self.frame_target = None
+        self.bvh = None
+        self.spatial_index = None
+        self.close_tile_renderer()
 
 if __name__ == '__main__':
     p1 = Vector3D(1, 1, 0)
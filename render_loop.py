@@ -0,0 +1,284 @@
+#
+# render_loop.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import threading
+import time
+
+CAMERA_SETTERS = {'azimuth': 'set_azimuth', 'elevation': 'set_elevation', 'angle': 'set_angle',
+                  'distance': 'set_distance'}
+CAMERA_ATTRIBUTES = {'azimuth': 'azimuth', 'elevation': 'elevation', 'angle': 'angle', 'distance': 'front'}
+
+
+class RenderLoop:
+    # renders the frames of a scene on a background thread, so the GUI never waits for the geometry work.
+    # request() only records the newest camera and light values: while the worker is busy the values a slider goes
+    # through are merged and only the latest ones are rendered, and a frame that is superseded by a newer one before
+    # the GUI picked it up is dropped. The GUI thread polls for finished frames with after() and draws them, which
+    # is the only part that touches matplotlib. The frustum and the sorter of the scene belong to the worker while
+    # the loop runs.
+    #
+    # While input keeps coming, frames are drawn with coarser levels of detail so they fit in budget seconds (None
+    # always draws full quality). refinement holds the LOD thresholds, in pixels and from coarse to fine, that can
+    # be used; the finest one whose measured frame time fits the budget is picked. Once there was no input for
+    # idle_time seconds, the last frame is refined one step at a time up to the lod_threshold of the scene.
+    #
+    # With a FrameCache, poses that were rendered before are taken from it instead of being rendered again. Once
+    # the last frame is at full quality and nothing else is pending, the loop also renders into the cache the poses
+    # speculation slider steps (of speculation_step) away on the axis that moved last, one frame at a time. A new
+    # request abandons the frame in progress at the next stage of Scene3D.prepare_frame
+    def __init__(self, scene, on_frame=None, interval=15, budget=None, idle_time=0.25, refinement=(8.0, 4.0, 2.0),
+                 frame_cache=None, speculation=0, speculation_step=0.01):
+        self.scene = scene
+        self.frame_cache = frame_cache
+        self.speculation = speculation
+        self.speculation_step = speculation_step
+        self.speculation_queue = []
+        # keys of the frames rendered ahead that were not asked for yet
+        self.speculated = set()
+        self.on_frame = on_frame
+        self.interval = interval
+        self.budget = budget
+        self.idle_time = idle_time
+        self.refinement = refinement
+        self.condition = threading.Condition()
+        self.pending = {}
+        # iterator that loads the scene in steps, e.g. Scene3D.stream_file, while the scene is still being loaded
+        self.loader = None
+        self.last_request = time.monotonic()
+        self.result = None
+        self.running = False
+        self.thread = None
+        self.widget = None
+        # average frame time of each quality step, rendering plus drawing
+        self.frame_times = {}
+        self.stats = {'requests': 0, 'rendered': 0, 'dropped': 0, 'shown': 0, 'refined': 0, 'speculated': 0,
+                      'speculative_hits': 0}
+
+    # starts the worker and polls for its frames every interval milliseconds on the event loop of widget
+    def start(self, widget):
+        self.widget = widget
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.widget.after(self.interval, self.poll)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # camera values are azimuth, elevation, angle and distance, light is an (azimuth, elevation) pair
+    def request(self, **state):
+        with self.condition:
+            self.pending.update(state)
+            self.last_request = time.monotonic()
+            self.stats['requests'] += 1
+            self.condition.notify()
+
+    # renders another scene from now on, e.g. after another file was loaded. Frames of the previous one that are
+    # still in flight are never shown. When the scene is still to be loaded, loader is an iterator that loads it in
+    # steps (e.g. Scene3D.stream_file): the worker advances it and renders what was loaded after each step, so the
+    # scene builds up on the screen. Frames of a scene being loaded are not cached
+    def set_scene(self, scene, loader=None, **state):
+        with self.condition:
+            self.scene = scene
+            self.loader = loader
+            self.pending = dict(state, full=True)
+            self.speculation_queue = []
+            self.last_request = time.monotonic()
+            self.result = None
+            self.stats['requests'] += 1
+            self.condition.notify()
+
+    # LOD thresholds of the quality steps, coarse to fine. The last one is full quality
+    def steps(self, scene):
+        if self.budget is None:
+            return [scene.lod_threshold]
+        return [threshold for threshold in self.refinement if threshold > scene.lod_threshold] + [scene.lod_threshold]
+
+    # the finest step whose frames are known to fit the budget, the coarsest one when none is known to
+    def interactive_step(self, steps):
+        if self.budget is None:
+            return len(steps) - 1
+        fitting = [step for step, threshold in enumerate(steps)
+                   if threshold in self.frame_times and self.frame_times[threshold] <= self.budget]
+        return fitting[-1] if fitting else 0
+
+    def run(self):
+        frame = None
+        step = 0
+        while True:
+            speculation = None
+            with self.condition:
+                while self.running and not self.pending and self.loader is None:
+                    steps = self.steps(self.scene)
+                    # refinement passes wait until the GUI took the previous frame, so each of them is shown
+                    if frame is None or self.result is not None:
+                        self.condition.wait()
+                        continue
+                    if step >= len(steps) - 1:
+                        if self.speculation_queue:
+                            speculation = self.speculation_queue.pop(0)
+                            break
+                        self.condition.wait()
+                        continue
+                    idle = time.monotonic() - self.last_request
+                    if idle >= self.idle_time:
+                        break
+                    self.condition.wait(self.idle_time - idle)
+                if not self.running:
+                    return
+                scene, state, loader = self.scene, self.pending, self.loader
+                self.pending = {}
+
+            if speculation is not None:
+                self.speculate(scene, *speculation)
+                continue
+
+            if loader is not None:
+                try:
+                    next(loader)
+                    # the geometry changed, so the last frame can't be reshaded
+                    state['full'] = True
+                except StopIteration:
+                    with self.condition:
+                        if self.loader is loader:
+                            self.loader = None
+                    if not state:
+                        continue
+
+            steps = self.steps(scene)
+            full = state.pop('full', False)
+            if full:
+                frame = None
+            reshading = frame is not None and set(state) == {'light'}
+            if not state and not full:
+                # no input for a while: one refinement pass
+                step += 1
+                self.stats['refined'] += 1
+            elif not reshading:
+                step = self.interactive_step(steps)
+                self.queue_speculation(scene, state, steps)
+            step = min(step, len(steps) - 1)
+
+            start = time.perf_counter()
+            frame = self.render(scene, state, frame, steps[step])
+            # reshaded and cached frames say nothing about the cost of the geometry
+            frame['time'] = None if reshading or frame['cached'] else time.perf_counter() - start
+            with self.condition:
+                if scene is not self.scene:
+                    continue
+                if self.result is not None:
+                    self.stats['dropped'] += 1
+                self.result = (scene, frame)
+                self.stats['rendered'] += 1
+
+    # the poses to render ahead after a move of the camera: speculation slider steps to each side of the new value
+    # of the axis that moved last, nearest first and in the direction of the move before the opposite one. They
+    # use the quality step of the frames drawn while dragging, the one the next lookups will ask for
+    def queue_speculation(self, scene, state, steps):
+        self.speculation_queue = []
+        axes = [name for name in state if name in CAMERA_ATTRIBUTES]
+        if self.frame_cache is None or not self.speculation or not axes:
+            return
+        axis = axes[-1]
+        previous = getattr(scene.frustum, CAMERA_ATTRIBUTES[axis])
+        direction = -1 if state[axis] < previous else 1
+        threshold = steps[self.interactive_step(steps)]
+        for distance in range(1, self.speculation + 1):
+            for sign in (direction, -direction):
+                self.speculation_queue.append((axis, state[axis] + sign * distance * self.speculation_step,
+                                               threshold))
+
+    # renders the camera moved to value on axis into the frame cache, then puts the camera back. The frame is
+    # abandoned as soon as a request comes in, so a slow speculative frame never delays a real one
+    def speculate(self, scene, axis, value, threshold):
+        frustum = scene.frustum
+        setter = getattr(frustum, CAMERA_SETTERS[axis])
+        current = getattr(frustum, CAMERA_ATTRIBUTES[axis])
+        setter(value)
+        key = self.frame_cache.key(scene, threshold)
+        if key not in self.frame_cache:
+            full_threshold = scene.lod_threshold
+            scene.lod_threshold = threshold
+            try:
+                frame = scene.prepare_frame(cancelled=self.has_pending)
+            finally:
+                scene.lod_threshold = full_threshold
+            if frame is not None:
+                self.frame_cache.put(key, frame)
+            if key in self.frame_cache:
+                self.speculated.intersection_update(self.frame_cache.frames)
+                self.speculated.add(key)
+                self.stats['speculated'] += 1
+        setter(current)
+
+    # whether a request is waiting for the worker
+    def has_pending(self):
+        with self.condition:
+            return bool(self.pending) or not self.running
+
+    # fraction of the speculative frames that were shown later
+    def speculation_hit_rate(self):
+        if self.stats['speculated'] == 0:
+            return 0.0
+        return self.stats['speculative_hits'] / self.stats['speculated']
+
+    # applies the state to the scene and renders it with the given LOD threshold. When only the light changed the
+    # previous frame is shaded again
+    def render(self, scene, state, frame, threshold):
+        frustum = scene.frustum
+        for name, value in state.items():
+            if name == 'light':
+                frustum.set_light(*value)
+            else:
+                getattr(frustum, CAMERA_SETTERS[name])(value)
+
+        key = None
+        if self.frame_cache is not None and self.loader is None:
+            key = self.frame_cache.key(scene, threshold)
+            cached = self.frame_cache.get(key)
+            if cached is not None:
+                if key in self.speculated:
+                    self.speculated.discard(key)
+                    self.stats['speculative_hits'] += 1
+                return dict(cached, threshold=threshold, cached=True)
+
+        if frame is not None and set(state) == {'light'}:
+            frame = scene.reshade_frame(frame)
+        else:
+            full_threshold = scene.lod_threshold
+            scene.lod_threshold = threshold
+            try:
+                frame = scene.prepare_frame()
+            finally:
+                scene.lod_threshold = full_threshold
+        if key is not None:
+            self.frame_cache.put(key, frame)
+        return dict(frame, threshold=threshold, cached=False)
+
+    def poll(self):
+        with self.condition:
+            result, self.result = self.result, None
+            running = self.running
+            self.condition.notify()
+        if result is not None:
+            scene, frame = result
+            start = time.perf_counter()
+            scene.submit(frame)
+            if self.on_frame is not None:
+                self.on_frame(frame)
+            if frame['time'] is not None:
+                frame_time = frame['time'] + time.perf_counter() - start
+                with self.condition:
+                    average = self.frame_times.get(frame['threshold'], frame_time)
+                    self.frame_times[frame['threshold']] = 0.7 * average + 0.3 * frame_time
+            self.stats['shown'] += 1
+        if running:
+            self.widget.after(self.interval, self.poll)
@@ -0,0 +1,39 @@
+#
+# test_bvh.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+from unittest import TestCase
+
+
+class TestBVH(TestCase):
+    def test_intersect_packet_matches_brute_force(self):
+        import numpy as np
+        from bvh import BVH
+        from intersect import TriangleData
+        from intersect import intersect_rays
+        from obj_reader import ObjReader
+        from obj_reader import mesh_arrays
+        reader = ObjReader('chair.obj')
+        arrays = mesh_arrays(reader, list(reader.groups()))
+        mesh = arrays['positions'][arrays['faces']]
+        triangles = TriangleData(mesh)
+        generator = np.random.default_rng(10)
+        low, high = mesh.reshape(-1, 3).min(axis=0), mesh.reshape(-1, 3).max(axis=0)
+        origins = generator.uniform(low - 1, high + 1, size=(400, 3))
+        directions = generator.uniform(low, high, size=(400, 3)) - origins
+        mask = generator.random(len(mesh)) < 0.7
+
+        for method in ('sah', 'median'):
+            bvh = BVH(mesh, triangles, method=method)
+            for ray_origins in (origins, origins[0]):
+                for triangle_mask in (None, mask):
+                    ids = None if triangle_mask is None else np.flatnonzero(triangle_mask)
+                    expected_t, expected_ids, _, _ = intersect_rays(ray_origins, directions, triangles, ids)
+                    t, hit_ids, u, v = bvh.intersect_packet(ray_origins, directions, triangle_mask)
+                    hit = expected_ids >= 0
+                    self.assertTrue(np.any(hit))
+                    self.assertTrue(np.array_equal(hit_ids >= 0, hit))
+                    self.assertTrue(np.allclose(t[hit], expected_t[hit]))
+                    self.assertTrue(np.all(np.isinf(t[~hit])))
@@ -0,0 +1,78 @@
+#
+# test_frame_cache.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+from unittest import TestCase
+
+
+def make_frame(triangles):
+    import numpy as np
+    return {'verts': np.zeros((triangles, 3, 2)), 'triangles': np.arange(triangles),
+            'colors': np.zeros((triangles, 3))}
+
+
+def make_scene(azimuth=0.0, elevation=0.0, angle=0.0, front=5.0, light_angles=(0.0, 0.0), mesh_hash='mesh'):
+    from types import SimpleNamespace
+    frustum = SimpleNamespace(azimuth=azimuth, elevation=elevation, angle=angle, front=front,
+                              light_angles=light_angles)
+    return SimpleNamespace(frustum=frustum, mesh_hash=mesh_hash)
+
+
+class TestFrameCache(TestCase):
+    def test_eviction_keeps_the_budget(self):
+        from frame_cache import FrameCache
+        from frame_cache import frame_size
+        frame = make_frame(1000)
+        size = frame_size(frame)
+        cache = FrameCache(budget_mb=3.5 * size / (1024 * 1024))
+        for key in range(3):
+            cache.put(key, frame)
+        self.assertEqual(len(cache), 3)
+        # 0 becomes the most recently used, so 1 is the oldest when 3 comes in
+        self.assertIsNotNone(cache.get(0))
+        cache.put(3, frame)
+        self.assertEqual(len(cache), 3)
+        self.assertNotIn(1, cache)
+        self.assertIn(0, cache)
+        self.assertLessEqual(cache.size, cache.budget)
+        self.assertEqual(cache.stats['evictions'], 1)
+        self.assertEqual(cache.stats['evicted_bytes'], size)
+
+        # putting a key again replaces its frame without counting it twice
+        cache.put(3, frame)
+        self.assertEqual(cache.size, 3 * size)
+        # frames larger than the whole budget are not stored
+        cache.put(4, make_frame(4000))
+        self.assertNotIn(4, cache)
+        self.assertEqual(len(cache), 3)
+
+    def test_hits_and_misses(self):
+        from frame_cache import FrameCache
+        cache = FrameCache()
+        self.assertEqual(cache.hit_rate(), 0.0)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', dict(make_frame(10), threshold=1.0))
+        frame = cache.get('a')
+        self.assertNotIn('threshold', frame)
+        # the caller can annotate the frame it got without changing the cached one
+        frame['cached'] = True
+        self.assertNotIn('cached', cache.get('a'))
+        self.assertEqual(cache.stats['hits'], 2)
+        self.assertEqual(cache.stats['misses'], 1)
+        self.assertAlmostEqual(cache.hit_rate(), 2 / 3)
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+    def test_keys_quantize_the_camera_and_light(self):
+        from frame_cache import FrameCache
+        cache = FrameCache(camera_step=0.01, light_step=0.1)
+        key = cache.key(make_scene(azimuth=0.5), 1.0)
+        self.assertEqual(cache.key(make_scene(azimuth=0.5 + 0.004), 1.0), key)
+        self.assertNotEqual(cache.key(make_scene(azimuth=0.5 + 0.006), 1.0), key)
+        self.assertEqual(cache.key(make_scene(azimuth=0.5, light_angles=(0.04, 0.0)), 1.0), key)
+        self.assertNotEqual(cache.key(make_scene(azimuth=0.5, light_angles=(0.06, 0.0)), 1.0), key)
+        self.assertNotEqual(cache.key(make_scene(azimuth=0.5, front=5.02), 1.0), key)
+        self.assertNotEqual(cache.key(make_scene(azimuth=0.5), 2.0), key)
+        self.assertNotEqual(cache.key(make_scene(azimuth=0.5, mesh_hash='other'), 1.0), key)
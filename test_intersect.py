@@ -0,0 +1,88 @@
+#
+# test_intersect.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+from unittest import TestCase
+
+
+# the hit of a ray with Triangle3D.intersection_point, which intersects the whole line: the distance along the
+# direction, or None when the line misses or the hit is behind the origin
+def scalar_hit(triangle, origin, direction):
+    from linalg import Line3D, Vector3D
+    point = triangle.intersection_point(Line3D(Vector3D(*origin), Vector3D(*[o + d for o, d in
+                                                                            zip(origin, direction)])))
+    if point is None:
+        return None
+    axis = max(range(3), key=lambda index: abs(direction[index]))
+    t = (point.components()[axis] - origin[axis]) / direction[axis]
+    return t if t > 0 else None
+
+
+class TestIntersectRays(TestCase):
+    def check(self, corners, origins, directions):
+        import math
+        import numpy as np
+        from intersect import TriangleData
+        from intersect import intersect_rays
+        from linalg import Triangle3D, Vector3D
+        triangles = [Triangle3D(*[Vector3D(*point) for point in triangle]) for triangle in corners.tolist()]
+        data = TriangleData(corners)
+        results = []
+        for shared_origin in (False, True):
+            ray_origins = origins[0] if shared_origin else origins
+            t, ids, u, v = intersect_rays(ray_origins, directions, data, chunk_size=7)
+            results.append(ids)
+            for ray, direction in enumerate(directions.tolist()):
+                origin = (origins[0] if shared_origin else origins[ray]).tolist()
+                hits = [(scalar_hit(triangle, origin, direction), index) for index, triangle in enumerate(triangles)]
+                hits = [hit for hit in hits if hit[0] is not None]
+                if not hits:
+                    self.assertEqual(ids[ray], -1)
+                    self.assertEqual(t[ray], math.inf)
+                    continue
+                expected_t, expected_id = min(hits)
+                self.assertAlmostEqual(t[ray], expected_t, delta=1e-9 * max(1.0, expected_t))
+                self.assertAlmostEqual(t[ray], scalar_hit(triangles[ids[ray]], origin, direction),
+                                       delta=1e-9 * max(1.0, expected_t))
+                # u and v give the same point as the distance
+                p0, p1, p2 = corners[ids[ray]]
+                point = p0 + u[ray] * (p1 - p0) + v[ray] * (p2 - p0)
+                self.assertTrue(np.allclose(point, np.asarray(origin) + t[ray] * np.asarray(direction)))
+        # the ids of the rays with their own origins
+        return results[0]
+
+    def test_random_rays_match_triangle3d(self):
+        import numpy as np
+        generator = np.random.default_rng(3)
+        corners = generator.uniform(-3, 3, (25, 1, 3)) + generator.uniform(-1, 1, (25, 3, 3))
+        origins = generator.uniform(-5, 5, (300, 3))
+        # aimed at points around the triangles, so some rays hit and some miss
+        targets = corners.mean(axis=1)[generator.integers(0, 25, 300)] + generator.uniform(-1, 1, (300, 3))
+        ids = self.check(corners, origins, targets - origins)
+        self.assertGreater(np.count_nonzero(ids >= 0), 30)
+        self.assertGreater(np.count_nonzero(ids < 0), 50)
+
+    def test_edges_vertices_and_parallel_rays(self):
+        import numpy as np
+        corners = np.array([[[0, 0, 0], [1, 0, 0], [0, 1, 0]],
+                            [[0, 0, 2], [0, 1, 2], [1, 0, 2]]], dtype=float)
+        origins = np.array([[0.5, 0, 1], [0, 0, 1], [0.5, 0.5, 1], [0.5, -1e-9, 1],
+                            [-1, 0.25, 0], [0.25, 0.25, 1], [0.25, 0.25, 1], [0.25, 0.25, -1]], dtype=float)
+        directions = np.array([[0, 0, -1], [0, 0, -1], [0, 0, -1], [0, 0, -1],
+                               [1, 0, 0], [1, 1, 0], [0, 0, 1], [0, 0, 1]], dtype=float)
+        ids = self.check(corners, origins, directions)
+        # on an edge, on a vertex and on the hypotenuse the triangle is hit, just outside it isn't. Rays in the
+        # plane of a triangle never hit it, and only the nearest of the two triangles is returned
+        self.assertEqual(ids.tolist(), [0, 0, 0, -1, -1, -1, 1, 0])
+
+    def test_parallel_rays_raise_no_warnings(self):
+        import warnings
+        import numpy as np
+        # the ray runs above the plane of the triangle, u and v of the hit go to opposite infinities
+        corners = np.array([[[-4, -1, -1], [-6, -1, -1], [-6, -1, 1]]], dtype=float)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            ids = self.check(corners, np.array([[-5, 0.3, 10]], dtype=float), np.array([[0, 0, -1]], dtype=float))
+        self.assertEqual(ids.tolist(), [-1])
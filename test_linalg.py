@@ -122,4 +122,181 @@ class TestVector2D(TestCase):
         self.assertAlmostEqual(cov_mat.r1.y, 62.56)
 
 
+class TestTriangle3D(TestCase):
+    def test_intersection_point(self):
+        from linalg import Vector3D
+        from linalg import Triangle3D
+        from linalg import Line3D
+        t = Triangle3D(Vector3D(0, 0, 0), Vector3D(2, 0, 0), Vector3D(0, 2, 1))
+        self.assertAlmostEqual(t.offset, 0)
 
+        i_point = t.intersection_point(Line3D(Vector3D(0.5, 0.5, 5), Vector3D(0.5, 0.5, 4)))
+        self.assertAlmostEqual(i_point.x, 0.5)
+        self.assertAlmostEqual(i_point.y, 0.5)
+        self.assertAlmostEqual(i_point.z, 0.25)
+        self.assertIsNone(t.intersection_point(Line3D(Vector3D(2, 2, 5), Vector3D(2, 2, 4))))
+        self.assertIsNone(t.intersection_point(Line3D(Vector3D(0, 0, 5), Vector3D(1, 0, 5))))
+
+    def test_intersection_point_reversed_triangle(self):
+        from linalg import Vector3D
+        from linalg import Triangle3D
+        from linalg import Line3D
+        t = Triangle3D(Vector3D(0, 0, 0), Vector3D(0, 2, 1), Vector3D(2, 0, 0))
+        self.assertIsNotNone(t.intersection_point(Line3D(Vector3D(0.5, 0.5, 5), Vector3D(0.5, 0.5, 4))))
+        self.assertIsNone(t.intersection_point(Line3D(Vector3D(-0.5, 0.5, 5), Vector3D(-0.5, 0.5, 4))))
+
+
+class TestMatrix4x4(TestCase):
+    def test_composition(self):
+        from linalg import Vector3D
+        from linalg import Matrix4x4
+        from linalg import rotation_matrix_axis_z
+        rotation = Matrix4x4.from_matrix3x3(rotation_matrix_axis_z(angle=1.5707963267948966))
+        translation = Matrix4x4.translation(Vector3D(1, 2, 3))
+        p = (translation * rotation) * Vector3D(1, 0, 0)
+        self.assertAlmostEqual(p.x, 1)
+        self.assertAlmostEqual(p.y, 3)
+        self.assertAlmostEqual(p.z, 3)
+        self.assertEqual(Matrix4x4.identity() * translation, translation)
+
+    def test_inverse(self):
+        from linalg import Vector3D
+        from linalg import Matrix4x4
+        from linalg import rotation_matrix_axis_y
+        m = Matrix4x4.translation(Vector3D(4, -1, 2)) * Matrix4x4.from_matrix3x3(rotation_matrix_axis_y(azimuth=0.3))
+        p = m.inverse() * (m * Vector3D(1, 2, 3))
+        self.assertAlmostEqual(p.x, 1)
+        self.assertAlmostEqual(p.y, 2)
+        self.assertAlmostEqual(p.z, 3)
+
+    def test_apply_divides_by_w(self):
+        from linalg import Matrix4x4
+        m = Matrix4x4()
+        m.array[3] = (0, 0, 1, 0)
+        points = m.apply([[2, 4, 2], [3, 3, 3]])
+        self.assertEqual(points.tolist(), [[1, 2, 1], [1, 1, 1]])
+
+
+class TestPointAccumulator(TestCase):
+    def test_chunks_and_merge_match_covariance_matrix(self):
+        import numpy as np
+        from linalg import Vector3D
+        from linalg import PointAccumulator
+        points = np.random.default_rng(3).normal(size=(1000, 3)) * (4, 2, 1) + (10, -5, 3)
+        cov_mat = Vector3D.covariance_matrix(points)
+        expected = [*cov_mat.r0.components(), *cov_mat.r1.components(), *cov_mat.r2.components()]
+
+        chunked = PointAccumulator().update(points[start:start + 128] for start in range(0, 1000, 128))
+        merged = PointAccumulator().add(points[:300]).merge(PointAccumulator().add(points[300:]))
+        for accumulator in (chunked, merged):
+            self.assertEqual(accumulator.count, 1000)
+            for value, expected_value in zip(accumulator.covariance().ravel(), expected):
+                self.assertAlmostEqual(value, expected_value)
+            for value, expected_value in zip(accumulator.mean, Vector3D.mean(points).components()):
+                self.assertAlmostEqual(value, expected_value)
+
+    def test_empty_accumulator_raises(self):
+        import numpy as np
+        from linalg import PointAccumulator
+        for accumulator in (PointAccumulator(), PointAccumulator().add(np.empty((0, 3)))):
+            self.assertEqual(accumulator.count, 0)
+            with self.assertRaises(ValueError):
+                accumulator.covariance()
+            with self.assertRaises(ValueError):
+                accumulator.axes()
+
+        accumulator = PointAccumulator().add(np.empty((0, 3))).add(np.array([[1.0, 2.0, 3.0], [3.0, 2.0, 1.0]]))
+        self.assertEqual(accumulator.count, 2)
+        self.assertAlmostEqual(accumulator.covariance()[0, 0], 1.0)
+
+    def test_fit_box_accepts_arrays(self):
+        import numpy as np
+        from linalg import Vector2D
+        sample = [Vector2D(1, 2), Vector2D(4, 3), Vector2D(2, 7), Vector2D(5, 5), Vector2D(3, 1)]
+        array = np.array([vector.components() for vector in sample])
+        for corner, array_corner in zip(Vector2D.fit_box(sample), Vector2D.fit_box(array)):
+            self.assertAlmostEqual(corner.x, array_corner.x)
+            self.assertAlmostEqual(corner.y, array_corner.y)
+
+
+class TestSymmetricEigen(TestCase):
+    def test_eigenpairs_are_sorted(self):
+        import numpy as np
+        from linalg import symmetric_eigen
+        generator = np.random.default_rng(4)
+        for dimension in (2, 3):
+            matrices = generator.normal(size=(500, dimension, dimension))
+            matrices = matrices + matrices.transpose(0, 2, 1)
+            values, vectors = symmetric_eigen(matrices)
+            self.assertTrue(np.all(np.diff(values, axis=1) <= 0))
+            self.assertTrue(np.allclose(np.einsum('mij,mkj->mki', matrices, vectors), values[:, :, np.newaxis] * vectors))
+            self.assertTrue(np.allclose(np.linalg.norm(vectors, axis=2), 1.0))
+
+    def test_matrix_eigenvectors(self):
+        from linalg import Matrix2x2, Matrix3x3, Vector2D, Vector3D
+        (w0, w1), ev0, ev1 = Matrix2x2(2, 1, 1, 2).eigenvectors()
+        self.assertAlmostEqual(w0, 3)
+        self.assertAlmostEqual(w1, 1)
+        self.assertAlmostEqual(abs(ev0 * Vector2D(1, 1)), 2 ** 0.5)
+        self.assertEqual(Matrix2x2(2, 1, 1, 2).eigenvalues(), (3, 1))
+        (w0, w1, w2), ev0, ev1, ev2 = Matrix3x3(1, 0, 0, 0, 5, 0, 0, 0, 3).eigenvectors()
+        self.assertEqual((w0, w1, w2), (5, 3, 1))
+        self.assertAlmostEqual(abs(ev0 * Vector3D(0, 1, 0)), 1)
+        self.assertAlmostEqual(abs(ev2 * Vector3D(1, 0, 0)), 1)
+
+    def test_fit_boxes_match_fit_box(self):
+        import numpy as np
+        from linalg import Vector3D
+        generator = np.random.default_rng(5)
+        samples = [generator.normal(size=(count, 3)) * (5, 2, 1) + generator.normal(size=3) * 10
+                   for count in (4, 50, 200)]
+        for sample, box in zip(samples, Vector3D.fit_boxes(samples)):
+            expected = Vector3D.fit_box(sample)
+            corners = sorted(tuple(np.round(corner.components(), 6)) for corner in box[:8])
+            expected_corners = sorted(tuple(np.round(corner.components(), 6)) for corner in expected[:8])
+            self.assertEqual(corners, expected_corners)
+            for a, b in zip(box[8].components(), expected[8].components()):
+                self.assertAlmostEqual(a, b)
+
+
+class TestMinimumAreaBox(TestCase):
+    def test_convex_hull(self):
+        import numpy as np
+        from linalg import convex_hull
+        square = [[0, 0], [2, 0], [2, 2], [0, 2]]
+        inside = np.random.default_rng(6).uniform(0.1, 1.9, size=(200, 2))
+        # points on the edges and repeated corners are not hull vertices
+        points = np.vstack((inside, square, square, [[1, 0], [2, 1]]))
+        self.assertEqual(convex_hull(points).tolist(), [[0, 0], [2, 0], [2, 2], [0, 2]])
+
+    def test_minimum_box_of_rotated_rectangle(self):
+        import math
+        import numpy as np
+        from linalg import Vector2D
+        angle = 0.4
+        rotation = np.array([[math.cos(angle), -math.sin(angle)], [math.sin(angle), math.cos(angle)]])
+        sample = np.random.default_rng(7).uniform((-4, -1), (4, 1), size=(500, 2))
+        sample = np.vstack((sample, [[-4, -1], [4, -1], [4, 1], [-4, 1]])) @ rotation.T + (3, 5)
+        ip0, ip1, ip2, ip3, center = Vector2D.fit_box(sample, mode='minimum')
+        self.assertAlmostEqual((ip1 - ip0).length() * (ip2 - ip1).length(), 16)
+        self.assertAlmostEqual(center.x, 3)
+        self.assertAlmostEqual(center.y, 5)
+        pca = Vector2D.fit_box(sample)
+        self.assertGreaterEqual((pca[1] - pca[0]).length() * (pca[2] - pca[1]).length(), 16 - 1e-9)
+
+    def test_minimum_box_of_large_hull(self):
+        import numpy as np
+        from linalg import convex_hull, minimum_area_rectangle
+        angles = np.linspace(0, 2 * np.pi, 20000, endpoint=False)
+        hull = convex_hull(np.stack((3 * np.cos(angles), np.sin(angles)), axis=1))
+        self.assertEqual(len(hull), 20000)
+        axes, lows, highs = minimum_area_rectangle(hull)
+        self.assertAlmostEqual(highs[0] - lows[0], 6, places=6)
+        self.assertAlmostEqual(highs[1] - lows[1], 2, places=6)
+        # every edge direction, measured by brute force on a sample of them, gives a box at least as large
+        edges = np.roll(hull, -1, axis=0) - hull
+        directions = edges[::97] / np.linalg.norm(edges[::97], axis=1)[:, np.newaxis]
+        along = hull @ directions.T
+        across = hull @ np.stack((-directions[:, 1], directions[:, 0]), axis=1).T
+        areas = np.ptp(along, axis=0) * np.ptp(across, axis=0)
+        self.assertLessEqual(np.prod(highs - lows), areas.min() + 1e-9)
@@ -0,0 +1,110 @@
+#
+# test_linalg_arrays.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import random
+from unittest import TestCase
+
+
+def random_vectors(count, seed):
+    from linalg import Vector3D
+    generator = random.Random(seed)
+    return [Vector3D(*[generator.uniform(-100, 100) for _ in range(3)]) for _ in range(count)]
+
+
+class TestVector3DArray(TestCase):
+    def assertVectorsAlmostEqual(self, array, vectors):
+        self.assertEqual(len(array), len(vectors))
+        for row, vector in zip(array.to_vectors(), vectors):
+            for a, b in zip(row.components(), vector.components()):
+                self.assertAlmostEqual(a, b, delta=1e-9 * max(1.0, abs(b)))
+
+    def test_conversion(self):
+        from linalg import Vector3DArray
+        vectors = random_vectors(20, 1)
+        array = Vector3DArray.from_vectors(vectors)
+        self.assertEqual(array.to_vectors(), vectors)
+        self.assertEqual(array[3], vectors[3])
+        self.assertEqual(len(array[2:5]), 3)
+
+    def test_view_shares_memory(self):
+        from linalg import Vector3DArray
+        array = Vector3DArray.from_vectors(random_vectors(5, 2))
+        view = array[1]
+        view.x = 7.0
+        self.assertEqual(array.array[1, 0], 7.0)
+        array.array[1, 2] = -3.0
+        self.assertEqual(view.z, -3.0)
+
+    def test_view_normals(self):
+        from linalg import Vector3D, Vector3DArray
+        array = Vector3DArray([[1, 2, 3], [4, 5, 6]])
+        self.assertEqual(array[0].normal, (None, None, None))
+        vectors = [Vector3D(1, 2, 3, 0, 0, 1), Vector3D(4, 5, 6, 1, 0, 0)]
+        array = Vector3DArray.from_vectors(vectors)
+        self.assertEqual(array[1].normal, (1.0, 0.0, 0.0))
+        self.assertEqual([view.normal for view in array[::-1]], [(1.0, 0.0, 0.0), (0.0, 0.0, 1.0)])
+        self.assertEqual([vector.normal for vector in array.to_vectors()], [vector.normal for vector in vectors])
+        array.normals[0] = (0, 1, 0)
+        self.assertEqual(array[0].normal, (0.0, 1.0, 0.0))
+
+    def test_operators_match_scalar_vectors(self):
+        from linalg import Vector3DArray
+        for seed in range(10):
+            vectors = random_vectors(30, seed)
+            others = random_vectors(30, seed + 100)
+            scalar = random.Random(seed).uniform(-10, 10)
+            a = Vector3DArray.from_vectors(vectors)
+            b = Vector3DArray.from_vectors(others)
+
+            self.assertVectorsAlmostEqual(a + b, [v + w for v, w in zip(vectors, others)])
+            self.assertVectorsAlmostEqual(a - b, [v - w for v, w in zip(vectors, others)])
+            self.assertVectorsAlmostEqual(a - others[0], [v - others[0] for v in vectors])
+            self.assertVectorsAlmostEqual(-a, [-v for v in vectors])
+            self.assertVectorsAlmostEqual(a & scalar, [v & scalar for v in vectors])
+            self.assertVectorsAlmostEqual(a.cross_prod(b), [v.cross_prod(w) for v, w in zip(vectors, others)])
+            self.assertVectorsAlmostEqual(a.norm(), [v.norm() for v in vectors])
+            self.assertVectorsAlmostEqual(a.rotate(*others[:3]), [v.rotate(*others[:3]) for v in vectors])
+
+            for dot, v, w in zip(a * b, vectors, others):
+                self.assertAlmostEqual(dot, v * w, delta=1e-9 * max(1.0, abs(v * w)))
+            for length, v in zip(a.length(), vectors):
+                self.assertAlmostEqual(length, v.length())
+            for outer, v, w in zip(a ** b, vectors, others):
+                matrix = v ** w
+                for row, expected in zip(outer.tolist(), (matrix.r0, matrix.r1, matrix.r2)):
+                    for value, expected_value in zip(row, expected.components()):
+                        self.assertAlmostEqual(value, expected_value, delta=1e-9 * max(1.0, abs(expected_value)))
+
+
+class TestTriangleArray(TestCase):
+    def test_intersection_point_matches_triangle3d(self):
+        from linalg import Line3D, Triangle3D, TriangleArray, Vector3D
+        generator = random.Random(5)
+        corners = random_vectors(60, 6)
+        triangles = [Triangle3D(*corners[index:index + 3]) for index in range(0, 60, 3)]
+        array = TriangleArray.from_triangles(triangles)
+        for _ in range(20):
+            line = Line3D(Vector3D(*[generator.uniform(-100, 100) for _ in range(3)]),
+                          Vector3D(*[generator.uniform(-100, 100) for _ in range(3)]))
+            points, hit = array.intersection_point(line)
+            for index, triangle in enumerate(triangles):
+                expected = triangle.intersection_point(line)
+                self.assertEqual(bool(hit[index]), expected is not None)
+                if expected is not None:
+                    for a, b in zip(points[index].components(), expected.components()):
+                        self.assertAlmostEqual(a, b, delta=1e-6)
+
+    def test_normals_and_views(self):
+        from linalg import TriangleArray
+        corners = random_vectors(30, 7)
+        array = TriangleArray([[vector.components() for vector in corners[index:index + 3]]
+                               for index in range(0, 30, 3)])
+        for index, triangle in enumerate(array.to_triangles()):
+            for a, b in zip(array.normal[index].components(), triangle.normal.components()):
+                self.assertAlmostEqual(a, b, delta=1e-6)
+            self.assertAlmostEqual(array.offset[index], triangle.offset, delta=1e-6)
+        array[0].p1.x = 1.5
+        self.assertEqual(array.array[0, 0, 0], 1.5)
@@ -0,0 +1,36 @@
+#
+# test_lod.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+from unittest import TestCase
+
+
+class TestLodArrays(TestCase):
+    def test_levels_shrink_and_errors_grow(self):
+        import numpy as np
+        from lod import lod_arrays
+        from obj_reader import ObjReader
+        from obj_reader import mesh_arrays
+        reader = ObjReader('sphere2.obj')
+        arrays = mesh_arrays(reader, list(reader.groups()))
+        levels = lod_arrays(arrays['positions'], arrays['faces'], arrays['object_sizes'])
+        self.assertEqual(levels['lod_sizes'].sum(), len(levels['lod_faces']))
+        for size, sizes, errors in zip(arrays['object_sizes'], levels['lod_sizes'], levels['lod_errors']):
+            self.assertTrue(np.all(np.diff(np.concatenate(([size], sizes))) < 0))
+            self.assertTrue(np.all(np.diff(np.concatenate(([0.0], errors))) >= 0))
+        # the levels only use vertices of the mesh
+        self.assertTrue(np.all(levels['lod_faces'] < len(arrays['positions'])))
+
+    def test_flat_grid_collapses_without_error(self):
+        import numpy as np
+        from lod import lod_arrays
+        x, y = np.meshgrid(np.arange(9.0), np.arange(9.0))
+        positions = np.stack((x.ravel(), y.ravel(), np.zeros(81)), axis=1)
+        corners = (np.arange(8)[:, np.newaxis] * 9 + np.arange(8)).ravel()
+        faces = np.vstack((np.stack((corners, corners + 1, corners + 10), axis=1),
+                           np.stack((corners, corners + 10, corners + 9), axis=1)))
+        levels = lod_arrays(positions, faces, [len(faces)])
+        self.assertTrue(np.all(np.diff(levels['lod_sizes'][0]) < 0))
+        self.assertTrue(np.allclose(levels['lod_errors'], 0.0))
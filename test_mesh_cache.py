@@ -0,0 +1,46 @@
+#
+# test_mesh_cache.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import os
+import tempfile
+from unittest import TestCase
+
+
+class TestMeshCache(TestCase):
+    def write(self, file_name, text):
+        with open(file_name, 'w') as file:
+            file.write(text)
+
+    def test_edited_file_refreshes_the_cache_and_keeps_old_maps(self):
+        import json
+        import numpy as np
+        import mesh_cache
+        from render import Scene3D
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_name = os.path.join(directory.name, 'mesh.obj')
+        self.write(file_name, 'v 0 0 0\nv 1 0 0\nv 0 1 0\nv 1 1 0\nv 2 2 0\nv 3 2 0\nf 1 2 3\nf 2 4 3\nf 4 5 6\n')
+        Scene3D(file_name, None, None, None).parse_file()
+        # the second scene maps the cache files written by the first one
+        old = Scene3D(file_name, None, None, None)
+        old.parse_file()
+        self.assertIsInstance(old.positions.base, np.memmap)
+        old_positions = np.array(old.positions)
+        old_faces = np.array(old.faces)
+
+        # fewer vertices, so the new files are smaller than the mapped ones
+        self.write(file_name, 'v 5 5 5\nv 6 5 5\nv 5 6 5\nf 1 2 3\n')
+        new = Scene3D(file_name, None, None, None)
+        new.parse_file()
+        self.assertEqual(new.positions.tolist(), [[5, 5, 5], [6, 5, 5], [5, 6, 5]])
+        with open(os.path.join(mesh_cache.cache_path(file_name), 'key.json')) as file:
+            key = json.load(file)
+        self.assertEqual(key['hash'], mesh_cache.content_hash(file_name))
+        self.assertEqual(key['size'], os.path.getsize(file_name))
+        self.assertEqual(mesh_cache.load(file_name)['positions'].tolist(), new.positions.tolist())
+
+        self.assertTrue(np.array_equal(old.positions, old_positions))
+        self.assertTrue(np.array_equal(old.faces, old_faces))
@@ -0,0 +1,98 @@
+#
+# test_obb_tree.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+from unittest import TestCase
+
+
+def chair_mesh():
+    from obj_reader import ObjReader
+    from obj_reader import mesh_arrays
+    reader = ObjReader('chair.obj')
+    arrays = mesh_arrays(reader, list(reader.groups()))
+    return arrays['positions'], arrays['positions'][arrays['faces']]
+
+
+def random_boxes(count, low, high, seed):
+    import numpy as np
+    from linalg import symmetric_eigen
+    generator = np.random.default_rng(seed)
+    matrices = generator.normal(size=(count, 3, 3))
+    _, axes = symmetric_eigen(matrices + matrices.transpose(0, 2, 1))
+    centers = generator.uniform(low, high, size=(count, 3))
+    half_sizes = generator.uniform(0.01, 0.3, size=(count, 3)) * (high - low).max()
+    return centers, axes, half_sizes
+
+
+class TestOBBTree(TestCase):
+    def test_boxes_hold_their_primitives(self):
+        import numpy as np
+        from obb_tree import OBBTree
+        _, mesh = chair_mesh()
+        tree = OBBTree(mesh, leaf_size=4)
+        self.assertEqual(sorted(tree.indices.tolist()), list(range(len(mesh))))
+        for node in range(len(tree)):
+            start, count = tree.start[node], tree.count[node]
+            if tree.left[node] >= 0:
+                continue
+            points = mesh[tree.indices[start:start + count]].reshape(-1, 3)
+            local = (points - tree.centers[node]) @ tree.axes[node].T
+            self.assertTrue(np.all(np.abs(local) <= tree.half_sizes[node]))
+
+    def test_rays_and_segments_match_brute_force(self):
+        import numpy as np
+        from intersect import TriangleData
+        from intersect import intersect_rays
+        from obb_tree import OBBTree
+        _, mesh = chair_mesh()
+        triangles = TriangleData(mesh)
+        tree = OBBTree(mesh, triangles)
+        generator = np.random.default_rng(8)
+        low, high = mesh.reshape(-1, 3).min(axis=0), mesh.reshape(-1, 3).max(axis=0)
+        origins = generator.uniform(low - 1, high + 1, size=(500, 3))
+        directions = generator.uniform(low, high, size=(500, 3)) - origins
+
+        t, ids, _, _ = tree.intersect_rays(origins, directions)
+        expected_t, expected_ids, _, _ = intersect_rays(origins, directions, triangles)
+        self.assertTrue(np.any(ids >= 0))
+        self.assertTrue(np.array_equal(ids >= 0, expected_ids >= 0))
+        self.assertTrue(np.allclose(t[ids >= 0], expected_t[ids >= 0]))
+
+        t, ids = tree.intersect_segments(origins, origins + directions / 2)
+        crossed = expected_t <= 0.5
+        self.assertTrue(np.array_equal(ids >= 0, crossed))
+        self.assertTrue(np.allclose(t[crossed], 2 * expected_t[crossed]))
+
+    def test_overlap_boxes_match_brute_force(self):
+        import numpy as np
+        from obb_tree import OBBTree
+        positions, mesh = chair_mesh()
+        low, high = positions.min(axis=0), positions.max(axis=0)
+        centers, axes, half_sizes = random_boxes(100, low, high, 9)
+
+        tree = OBBTree(mesh)
+        queries, primitives = tree.overlap_boxes(centers, axes, half_sizes)
+        found = np.zeros((100, len(mesh)), dtype=bool)
+        found[queries, primitives] = True
+        self.assertEqual(np.count_nonzero(found), len(queries))
+        self.assertTrue(np.array_equal(found, OBBTree.overlap_triangles(mesh, centers, axes, half_sizes)))
+
+        point_tree = OBBTree(positions)
+        queries, primitives = point_tree.overlap_boxes(centers, axes, half_sizes)
+        found = np.zeros((100, len(positions)), dtype=bool)
+        found[queries, primitives] = True
+        local = np.einsum('qpd,qjd->qpj', positions[np.newaxis] - centers[:, np.newaxis], axes)
+        self.assertTrue(np.array_equal(found, np.all(np.abs(local) <= half_sizes[:, np.newaxis], axis=2)))
+
+    def test_triangle_box_separation(self):
+        import numpy as np
+        from obb_tree import OBBTree
+        triangle = np.array([[[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]])
+        axes = np.eye(3)[np.newaxis]
+        half_sizes = np.full((1, 3), 0.2)
+        # beyond the hypotenuse only the cross product of the hypotenuse with the z axis separates them
+        self.assertFalse(OBBTree.overlap_triangles(triangle, np.array([[0.8, 0.8, 0.0]]), axes, half_sizes)[0, 0])
+        self.assertTrue(OBBTree.overlap_triangles(triangle, np.array([[0.6, 0.6, 0.0]]), axes, half_sizes)[0, 0])
+        self.assertFalse(OBBTree.overlap_triangles(triangle, np.array([[0.2, 0.2, 0.3]]), axes, half_sizes)[0, 0])
@@ -0,0 +1,81 @@
+#
+# test_obj_reader.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import os
+import tempfile
+from unittest import TestCase
+
+
+class TestObjReader(TestCase):
+    def read(self, text, chunk_size=65536):
+        from obj_reader import ObjReader
+        handle, file_name = tempfile.mkstemp(suffix='.obj')
+        with os.fdopen(handle, 'w') as file:
+            file.write(text)
+        self.addCleanup(os.remove, file_name)
+        reader = ObjReader(file_name, chunk_size)
+        return reader, list(reader.groups())
+
+    def test_index_forms(self):
+        reader, groups = self.read('v 0 0 0\nv 1 0 0\nv 0 1 0\nv 0 0 1\n'
+                                   'vt 0 0\nvn 0 0 1\nvn 1 0 0\n'
+                                   'f 1 2 3\n'
+                                   'f 1//1 2//1 4//2\n'
+                                   'f 2/1/2 3/1/1 4/1/2\n'
+                                   'f -4 -3 -1\n')
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0].faces.tolist(), [[0, 1, 2], [0, 1, 3], [1, 2, 3], [0, 1, 3]])
+        self.assertEqual(groups[0].normal_faces.tolist(), [[-1, -1, -1], [0, 0, 1], [1, 0, 1], [-1, -1, -1]])
+
+    def test_relative_indices_count_vertices_read_so_far(self):
+        reader, groups = self.read('v 0 0 0\nv 1 0 0\nv 0 1 0\nvn 0 0 1\nf -3//-1 -2//-1 -1//-1\n'
+                                   'v 5 0 0\nv 6 0 0\nv 5 1 0\nvn 0 0 -1\nf -3//-1 -2//-1 -1//-1\n')
+        self.assertEqual(groups[0].faces.tolist(), [[0, 1, 2], [3, 4, 5]])
+        self.assertEqual(groups[0].normal_faces.tolist(), [[0, 0, 0], [1, 1, 1]])
+
+    def test_polygons_are_fans(self):
+        reader, groups = self.read('v 0 0 0\nv 1 0 0\nv 2 1 0\nv 1 2 0\nv 0 1 0\nf 1 2 3 4 5\n')
+        self.assertEqual(groups[0].faces.tolist(), [[0, 1, 2], [0, 2, 3], [0, 3, 4]])
+
+    def test_groups_skip_empty_objects(self):
+        reader, groups = self.read('o empty\n'
+                                   'v 0 0 0\nv 1 0 0\nv 0 1 0\nv 1 1 0\n'
+                                   'o first\nf 1 2 3\n'
+                                   'g also empty\n'
+                                   'g second part\nf 2 4 3\nf 1 2 4\n'
+                                   'o last empty\n')
+        self.assertEqual([group.name for group in groups], ['first', 'second part'])
+        self.assertEqual([len(group) for group in groups], [1, 2])
+        self.assertEqual(groups[1].faces.tolist(), [[1, 3, 2], [0, 1, 3]])
+
+    def test_chunk_boundaries(self):
+        import numpy as np
+        text = ''.join(f'o part{index}\nv {index} 0 0\nv {index} 1 0\nv {index} 0 1\nvn 1 0 0\n'
+                       f'f -3//-1 -2//-1 -1//-1\n' for index in range(5))
+        _, expected = self.read(text)
+        for chunk_size in (1, 2, 3, 7):
+            reader, groups = self.read(text, chunk_size)
+            self.assertEqual(len(reader.positions), 15)
+            self.assertEqual([group.name for group in groups], [group.name for group in expected])
+            for group, expected_group in zip(groups, expected):
+                self.assertTrue(np.array_equal(group.faces, expected_group.faces))
+                self.assertTrue(np.array_equal(group.normal_faces, expected_group.normal_faces))
+
+    def test_mesh_arrays_normals(self):
+        import numpy as np
+        from obj_reader import mesh_arrays
+        # the third vertex has no normal in the file, the last one belongs to no face
+        reader, groups = self.read('v 0 0 0\nv 2 0 0\nv 2 2 2\nv 5 5 5\nvn 0 0 2\nvn 0 0 1\n'
+                                   'f 1//1 2//2 3\n')
+        arrays = mesh_arrays(reader, groups)
+        self.assertEqual(arrays['faces'].dtype, np.int32)
+        self.assertEqual(arrays['object_sizes'].tolist(), [1])
+        normals = arrays['normals']
+        self.assertTrue(np.allclose(normals[0], (0, 0, 1)))
+        self.assertTrue(np.allclose(normals[1], (0, 0, 1)))
+        face_normal = np.cross((2, 0, 0), (2, 2, 2))
+        self.assertTrue(np.allclose(normals[2], face_normal / np.linalg.norm(face_normal)))
+        self.assertTrue(np.allclose(normals[3], 0))
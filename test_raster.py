@@ -0,0 +1,106 @@
+#
+# test_raster.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+from unittest import TestCase
+
+
+def make_rasterizer(x_res=20, y_res=20):
+    import render
+    from raster import Rasterizer
+    light = render.Vector3D(0, 0, 1)
+    return Rasterizer(render.Frustum(6, 6, 5.0, -100.0, x_res, y_res, None, light))
+
+
+# the nearest triangle over each pixel center, the first one on ties, one pixel at a time
+def brute_force(rasterizer, points):
+    import numpy as np
+    xs, ys = np.meshgrid(rasterizer.pixel_x, rasterizer.pixel_y)
+    best = np.full(xs.shape, -1)
+    best_depth = np.zeros(xs.shape)
+    for index, ((x1, y1, z1), (x2, y2, z2), (x3, y3, z3)) in enumerate(points.tolist()):
+        area = (x2 - x1) * (y3 - y1) - (y2 - y1) * (x3 - x1)
+        if area == 0:
+            continue
+        w1 = ((x3 - x2) * (ys - y2) - (y3 - y2) * (xs - x2)) / area
+        w2 = ((x1 - x3) * (ys - y3) - (y1 - y3) * (xs - x3)) / area
+        w3 = 1.0 - w1 - w2
+        depth = w1 / (15.0 - z1) + w2 / (15.0 - z2) + w3 / (15.0 - z3)
+        visible = (w1 >= 0) & (w2 >= 0) & (w3 >= 0) & (depth > best_depth)
+        best[visible] = index
+        best_depth[visible] = depth[visible]
+    return best
+
+
+class TestRasterizer(TestCase):
+    def test_overlapping_triangles_resolve_by_depth(self):
+        import numpy as np
+        near = [[-2, -2, 1], [2, -2, 1], [0, 2, 1]]
+        far = [[-3, -1, -1], [3, -1, -1], [0, 3, -1]]
+        red, green = (1, 0, 0), (0, 1, 0)
+        # the near triangle is red, whatever the order they are drawn in
+        for points, colors, ids in (([near, far], [red, green], [7, 8]), ([far, near], [green, red], [8, 7])):
+            rasterizer = make_rasterizer()
+            color = rasterizer.draw(np.array(points, dtype=float), np.array(colors, dtype=float), np.array(ids))
+            # the center of the screen is covered by both
+            self.assertEqual(rasterizer.triangles[10, 10], 7)
+            self.assertTrue(np.array_equal(color[10, 10], (1, 0, 0)))
+            # the far triangle still shows where the near one doesn't cover it
+            self.assertEqual(rasterizer.triangles[2, 10], 8)
+            self.assertEqual(rasterizer.triangles[19, 0], -1)
+            self.assertTrue(np.array_equal(color[19, 0], (1, 1, 1)))
+
+    def test_shared_edges_leave_no_gaps(self):
+        import numpy as np
+        rasterizer = make_rasterizer()
+        # a quad between the pixel centers 1 and 18 of each axis, split along its diagonal, which runs through
+        # pixel centers
+        points = np.array([[[-2.7, -2.7, 0], [2.7, -2.7, 0], [2.7, 2.7, 0]],
+                           [[-2.7, -2.7, 0], [2.7, 2.7, 0], [-2.7, 2.7, 0]]])
+        rasterizer.draw(points, np.ones((2, 3)))
+        triangles = rasterizer.triangles
+        self.assertTrue(np.all(triangles[1:19, 1:19] >= 0))
+        self.assertEqual(np.count_nonzero(triangles >= 0), 18 * 18)
+        # below the diagonal (rows grow downwards) is the first triangle, above it the second one
+        rows, cols = np.indices(triangles.shape)
+        inside = (rows >= 1) & (rows <= 18) & (cols >= 1) & (cols <= 18)
+        self.assertTrue(np.all(triangles[inside & (rows + cols > 19)] == 0))
+        self.assertTrue(np.all(triangles[inside & (rows + cols < 19)] == 1))
+
+    def test_batches_match_brute_force(self):
+        import numpy as np
+        import raster
+        generator = np.random.default_rng(5)
+        corners = generator.uniform(-3.5, 3.5, (300, 1, 2)) + generator.uniform(-0.6, 0.6, (300, 3, 2))
+        # some large triangles, drawn on their own
+        corners[:10] = generator.uniform(-4, 4, (10, 3, 2))
+        points = np.concatenate((corners, generator.uniform(-20, 4, (300, 3, 1))), axis=2)
+        # a duplicate at the same depth: the first one is kept
+        points[20] = points[30]
+        colors = generator.uniform(0, 1, (300, 3))
+        expected = None
+        for large in (raster.LARGE_TRIANGLE_PIXELS, 0):
+            self.addCleanup(setattr, raster, 'LARGE_TRIANGLE_PIXELS', raster.LARGE_TRIANGLE_PIXELS)
+            raster.LARGE_TRIANGLE_PIXELS = large
+            rasterizer = make_rasterizer(40, 30)
+            color = rasterizer.draw(points, colors)
+            if expected is None:
+                expected = brute_force(rasterizer, points)
+                self.assertGreater(np.count_nonzero(expected >= 0), 900)
+                self.assertFalse(np.any(expected == 30))
+            self.assertTrue(np.array_equal(rasterizer.triangles, expected))
+            hit = expected >= 0
+            self.assertTrue(np.array_equal(color[hit], colors[expected[hit]]))
+
+    def test_later_draws_lose_ties(self):
+        import numpy as np
+        rasterizer = make_rasterizer()
+        triangle = np.array([[[-2, -2, 0], [2, -2, 0], [0, 2, 0]]], dtype=float)
+        rasterizer.draw(triangle, np.zeros((1, 3)), np.array([3]))
+        rasterizer.draw(triangle, np.ones((1, 3)), np.array([4]))
+        self.assertEqual(rasterizer.triangles[10, 10], 3)
+        rasterizer.clear()
+        self.assertTrue(np.all(rasterizer.triangles == -1))
+        self.assertTrue(np.all(rasterizer.depth == 0))
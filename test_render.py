@@ -0,0 +1,261 @@
+#
+# test_render.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+from unittest import TestCase
+
+
+def make_scene(file_name, x_res=40, y_res=30, azimuth=0.4, elevation=0.3, light=(0.3, 0.5, 0.8)):
+    from matplotlib.figure import Figure
+    import render
+    axes = Figure().add_subplot(111)
+    light = render.Vector3D(*light)
+    frustum = render.Frustum(6, 6, 5.0, -100.0, x_res, y_res, axes, light, azimuth=azimuth, elevation=elevation)
+    scene = render.Scene3D(file_name, axes, frustum, light)
+    scene.parse_file(use_cache=False)
+    return scene
+
+
+class TestScene3D(TestCase):
+    def test_stream_file_matches_parse_file(self):
+        import numpy as np
+        from render import Scene3D
+        expected = Scene3D('three_chests.obj', None, None, None)
+        expected.parse_file(use_cache=False)
+
+        scene = Scene3D('three_chests.obj', None, None, None)
+        loaded = []
+        for count in scene.stream_file(use_cache=False, interval=0.0):
+            loaded.append(count)
+            # what is loaded so far is the beginning of the whole mesh
+            faces = len(scene.faces)
+            self.assertEqual(len(scene.objects), count)
+            self.assertTrue(np.array_equal(scene.faces, expected.faces[:faces]))
+            self.assertTrue(np.allclose(scene.mesh, expected.mesh[:faces]))
+            self.assertTrue(np.allclose(scene.face_normals, expected.face_normals[:faces]))
+            self.assertTrue(np.allclose(scene.object_radii, expected.object_radii[:count]))
+            self.assertTrue(np.allclose(scene.object_corners, expected.object_corners[:count]))
+            self.assertTrue(np.allclose(scene.normals[np.unique(scene.faces)],
+                                        expected.normals[np.unique(scene.faces)]))
+        self.assertEqual(loaded, [1, 2, 3, 3])
+
+        self.assertTrue(np.allclose(scene.positions, expected.positions))
+        self.assertTrue(np.allclose(scene.normals, expected.normals))
+        self.assertTrue(np.array_equal(scene.faces, expected.faces))
+        self.assertTrue(np.array_equal(scene.face_objects, expected.face_objects))
+        for face, expected_face in zip(scene.objects, expected.objects):
+            self.assertTrue(np.array_equal(face.indices, expected_face.indices))
+            self.assertTrue(np.allclose([corner.components() for corner in face.box],
+                                        [corner.components() for corner in expected_face.box]))
+
+    def test_triangles_use_the_vertex_normals(self):
+        import numpy as np
+        from render import Scene3D
+        scene = Scene3D('face.obj', None, None, None)
+        scene.parse_file(use_cache=False)
+        triangle = scene.triangles[0]
+        for point, index in zip((triangle.p1, triangle.p2, triangle.p3), scene.faces[0].tolist()):
+            self.assertTrue(np.allclose((point.x, point.y, point.z), scene.positions[index]))
+            self.assertTrue(np.allclose(point.normal, scene.normals[index]))
+
+    def test_tiles_match_the_serial_renders(self):
+        import numpy as np
+        scene = make_scene('two_chests.obj')
+        self.addCleanup(scene.close_tile_renderer)
+        raster = scene.project_raster()
+        raster_triangles = scene.frame_triangles.copy()
+        ray = scene.project()
+        ray_triangles = scene.frame_triangles.copy()
+        # tiles that don't divide the frame evenly
+        tiled = scene.project_parallel(processes=2, tile_size=16)
+        self.assertGreater(np.count_nonzero(scene.frame_triangles >= 0), 100)
+        self.assertTrue(np.array_equal(tiled, raster))
+        self.assertTrue(np.array_equal(scene.frame_triangles, raster_triangles))
+        self.assertTrue(np.array_equal(tiled, ray))
+        self.assertTrue(np.array_equal(scene.frame_triangles, ray_triangles))
+
+        # the workers keep their mesh, only the camera changes
+        scene.frustum.set_azimuth(1.2)
+        tiled = scene.project_parallel()
+        self.assertTrue(np.array_equal(tiled, scene.project_raster()))
+
+
+class TestCulling(TestCase):
+    def make_frustum(self):
+        import render
+        return render.Frustum(6, 6, 5.0, -100.0, 40, 40, None, render.Vector3D(0, 0, 1))
+
+    def test_classify_spheres(self):
+        import numpy as np
+        frustum = self.make_frustum()
+        # the camera looks down -Z from the vanishing point at Z = 15, the front plane is at Z = 5
+        centers = np.array([[0, 0, 0], [100, 0, 0], [0, 0, 7], [0, 0, -101], [5, 0, -5], [0, 0, 4.5]], dtype=float)
+        radii = np.array([1.0, 1.0, 1.0, 0.5, 1.0, 1.0])
+        outside, inside = frustum.classify_spheres(centers, radii)
+        self.assertEqual(outside.tolist(), [False, True, True, True, False, False])
+        # the last two cross the side and the front planes
+        self.assertEqual(inside.tolist(), [True, False, False, False, False, False])
+
+        # the view cone turns with the camera: to each side of it, only the one that ends up in front is seen
+        sides = np.array([[8, 0, 0], [-8, 0, 0]], dtype=float)
+        self.assertEqual(frustum.classify_spheres(sides, np.ones(2))[0].tolist(), [True, True])
+        frustum.set_azimuth(np.pi / 2)
+        outside, inside = frustum.classify_spheres(sides, np.ones(2))
+        self.assertEqual(sorted(outside.tolist()), [False, True])
+        self.assertTrue(np.array_equal(inside, ~outside))
+
+    def test_cull_backfaces_and_view_cone(self):
+        import numpy as np
+        from render import face_arrays
+        frustum = self.make_frustum()
+        facing = [[-1, -1, 0], [1, -1, 0], [0, 1, 0]]
+        mesh = np.array([facing, facing[::-1], [[x + 50, y, z] for x, y, z in facing],
+                         [[x + 50, y, z] for x, y, z in facing[::-1]]], dtype=float)
+        triangle_data, normals, centers, radii = face_arrays(mesh)
+        visible, stats = frustum.cull(centers, radii, normals, triangle_data.p0)
+        self.assertEqual(visible.tolist(), [0])
+        self.assertEqual(stats, {'triangles': 4, 'backface': 2, 'frustum': 1})
+
+        # faces known to be in view skip the view cone test, but never the backface one
+        visible, stats = frustum.cull(centers, radii, normals, triangle_data.p0, np.array([1, 2, 3]),
+                                      np.array([True, True, False]))
+        self.assertEqual(visible.tolist(), [2])
+        self.assertEqual(stats, {'triangles': 3, 'backface': 2, 'frustum': 0})
+
+    def test_scene_cull_stats(self):
+        scene = make_scene('box.obj')
+        indices, points = scene.transform()
+        stats = scene.cull_stats
+        # a closed box shows at most three of its sides
+        self.assertGreaterEqual(stats['backface'], len(scene.faces) // 2)
+        self.assertEqual(stats['frustum'], 0)
+        self.assertEqual(len(indices), stats['triangles'] - stats['backface'] - stats['frustum'] -
+                         stats['projection'])
+        self.assertEqual(len(points), len(indices))
+
+    def test_objects_are_culled_by_sphere_and_box(self):
+        import os
+        import tempfile
+        import numpy as np
+        import render
+        # faces seen from the camera, which looks down -Z from Z = 15. At Z = 0 the view cone is 4.5 to each side
+        objects = {'inside': [[-1, -1, 0], [1, -1, 0], [0, 1, 0]],
+                   'outside': [[50, 0, 0], [51, 0, 0], [50, 1, 0]],
+                   # one face in view, the other one out of it
+                   'straddling': [[3, 0, 0], [4, 0, 0], [3, 1, 0], [6, 0, 0], [7, 0, 0], [6, 1, 0]]}
+        # a thin strip along the right side of the cone, just outside it: its sphere crosses the cone, its box doesn't
+        strip = []
+        for z in (-20.0, -10.0):
+            x = 0.3 * (15 - z) + 0.5
+            strip += [[x, 0, z], [x + 0.3 * 10, 0, z - 10], [x, 0.1, z]]
+        objects['strip'] = strip
+        handle, file_name = tempfile.mkstemp(suffix='.obj')
+        self.addCleanup(os.remove, file_name)
+        with os.fdopen(handle, 'w') as file:
+            count = 0
+            for name, points in objects.items():
+                file.write(f'o {name}\n')
+                for point in points:
+                    file.write('v {} {} {}\n'.format(*point))
+                for first in range(count + 1, count + len(points), 3):
+                    file.write(f'f {first} {first + 1} {first + 2}\n')
+                count += len(points)
+
+        light = render.Vector3D(0, 0, 1)
+        frustum = render.Frustum(6, 6, 5.0, -100.0, 40, 40, None, light)
+        scene = render.Scene3D(file_name, None, frustum, light)
+        scene.parse_file(use_cache=False)
+        outside, inside = frustum.classify_spheres(scene.object_centers, scene.object_radii)
+        self.assertEqual(outside.tolist(), [False, True, False, False])
+        self.assertEqual(inside.tolist(), [True, False, False, False])
+        outside, inside = frustum.classify_boxes(scene.object_corners)
+        self.assertEqual(outside.tolist(), [False, True, False, True])
+        self.assertEqual(inside.tolist(), [True, False, False, False])
+
+        indices, _ = scene.transform()
+        self.assertEqual(indices.tolist(), [0, 2])
+        stats = scene.cull_stats
+        self.assertEqual((stats['objects'], stats['object_boxes'], stats['object_triangles']), (2, 1, 3))
+        # only the faces of the straddling object go through the per face view cone test
+        self.assertEqual((stats['triangles'], stats['frustum'], stats['backface']), (3, 1, 0))
+
+    def test_reshade_matches_a_full_render(self):
+        import numpy as np
+        scene = make_scene('chair.obj')
+        # no frame yet: the scene is rendered
+        colors = scene.reshade()
+        self.assertEqual(scene.frame_target, 'polygons')
+        self.assertEqual(len(colors), len(scene.frame_triangles))
+
+        scene.project_fast()
+        scene.set_light(1.2, -0.4)
+        colors = scene.collection.get_facecolors()[:, :3]
+        frame = scene.prepare_frame()
+        self.assertTrue(np.array_equal(scene.frame_triangles, frame['triangles']))
+        self.assertTrue(np.allclose(colors, frame['colors']))
+        self.assertTrue(np.allclose(scene.reshade_frame(frame)['colors'], frame['colors']))
+
+        for project in (scene.project_raster, scene.project):
+            project()
+            scene.set_light(2.0, 0.7)
+            reshaded = scene.image.get_array()
+            self.assertTrue(np.array_equal(reshaded, project()))
+            self.assertTrue(np.any(reshaded[:, :, 2] > 0))
+            scene.set_light(0.0, 0.0)
+
+
+class TestSpatialQueries(TestCase):
+    # three cubes of side 2 centered on X = -5, 0 and 5, one object each
+    def make_cubes(self):
+        import os
+        import tempfile
+        from render import Scene3D
+        handle, file_name = tempfile.mkstemp(suffix='.obj')
+        self.addCleanup(os.remove, file_name)
+        faces = [(5, 3, 1), (3, 8, 4), (7, 6, 8), (2, 8, 6), (1, 4, 2), (5, 2, 6), (5, 7, 3), (3, 7, 8), (7, 5, 6),
+                 (2, 4, 8), (1, 3, 4), (5, 1, 2)]
+        with os.fdopen(handle, 'w') as file:
+            for cube, x in enumerate((-5, 0, 5)):
+                file.write(f'o cube{cube}\n')
+                for dx in (1, -1):
+                    for dy in (1, -1):
+                        for dz in (-1, 1):
+                            file.write(f'v {x + dx} {dy} {dz}\n')
+                for face in faces:
+                    file.write('f {} {} {}\n'.format(*[8 * cube + index for index in face]))
+        scene = Scene3D(file_name, None, None, None)
+        scene.parse_file(use_cache=False)
+        return scene
+
+    def cube_points(self, center, half_sizes):
+        import itertools
+        import numpy as np
+        from linalg import Vector3D
+        return [Vector3D(*(np.asarray(center) + np.asarray(signs) * half_sizes).tolist())
+                for signs in itertools.product((-1, 1), repeat=3)]
+
+    def test_pick(self):
+        import math
+        import numpy as np
+        scene = self.make_cubes()
+        origins = np.array([[-5, 0.3, 10], [0.2, -0.5, 10], [5, 0, 10], [2.5, 0, 10], [-10, 0.2, 0.1]], dtype=float)
+        directions = np.array([[0, 0, -1], [0, 0, -2], [0, 0, -1], [0, 0, -1], [1, 0, 0]], dtype=float)
+        t, triangles, objects = scene.pick(origins, directions)
+        self.assertEqual(objects.tolist(), [0, 1, 2, -1, 0])
+        self.assertTrue(np.allclose(t[[0, 1, 2, 4]], [9, 4.5, 9, 4]))
+        self.assertEqual(t[3], math.inf)
+        self.assertEqual(triangles[3], -1)
+        self.assertTrue(np.array_equal(scene.face_objects[triangles[[0, 1, 2, 4]]], objects[[0, 1, 2, 4]]))
+
+    def test_overlapping_objects(self):
+        from linalg import Vector3D
+        scene = self.make_cubes()
+        boxes = [Vector3D.fit_box(self.cube_points((5.9, 0.9, 0.9), 0.15)),
+                 # inside the middle cube, away from its faces
+                 Vector3D.fit_box(self.cube_points((0, 0, 0), 0.2)),
+                 Vector3D.fit_box(self.cube_points((-2.5, 0, 0), (2.6, 0.2, 0.2))),
+                 Vector3D.fit_box(self.cube_points((2.5, 0, 3), (1, 1, 1)))]
+        boxes_hit, objects = scene.overlapping_objects(boxes)
+        self.assertEqual(list(zip(boxes_hit.tolist(), objects.tolist())), [(0, 2), (2, 0), (2, 1)])
@@ -0,0 +1,279 @@
+#
+# test_render_loop.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import threading
+import time
+from unittest import TestCase
+
+
+class FakeFrustum:
+    def __init__(self):
+        self.azimuth = 0.0
+        self.elevation = 0.0
+        self.angle = 0.0
+        self.front = 5.0
+        self.light_angles = (0.0, 0.0)
+
+    def set_azimuth(self, azimuth):
+        self.azimuth = azimuth
+
+    def set_elevation(self, elevation):
+        self.elevation = elevation
+
+    def set_angle(self, angle):
+        self.angle = angle
+
+    def set_distance(self, distance):
+        self.front = distance
+
+    def set_light(self, azimuth, elevation):
+        self.light_angles = (azimuth, elevation)
+
+
+class FakeScene:
+    # records the poses it renders and the frames it is given to draw. While gate is set, prepare_frame waits for
+    # it to be released, so a test can queue requests while the worker is busy
+    def __init__(self, mesh_hash='mesh'):
+        self.frustum = FakeFrustum()
+        self.lod_threshold = 1.0
+        self.mesh_hash = mesh_hash
+        self.rendered = []
+        self.submitted = []
+        self.gate = None
+        self.busy = threading.Event()
+
+    def prepare_frame(self, cancelled=None):
+        import numpy as np
+        self.rendered.append((self.frustum.azimuth, self.lod_threshold))
+        self.busy.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if cancelled is not None and cancelled():
+            return None
+        return {'verts': np.array([self.frustum.azimuth, self.lod_threshold])}
+
+    def reshade_frame(self, frame):
+        return dict(frame)
+
+    def submit(self, frame):
+        self.submitted.append((float(frame['verts'][0]), float(frame['verts'][1])))
+
+
+class FakeWidget:
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, interval, callback):
+        self.callbacks.append((interval, callback))
+
+
+def wait_until(predicate, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > end:
+            raise AssertionError('timed out')
+        time.sleep(0.002)
+
+
+class TestRenderLoop(TestCase):
+    def start(self, loop):
+        widget = FakeWidget()
+        loop.start(widget)
+        self.addCleanup(loop.stop)
+        return widget
+
+    def test_superseded_requests_are_dropped(self):
+        from render_loop import RenderLoop
+        scene = FakeScene()
+        scene.gate = threading.Event()
+        loop = RenderLoop(scene)
+        self.start(loop)
+
+        loop.request(azimuth=1.0)
+        self.assertTrue(scene.busy.wait(5))
+        # merged while the worker renders the first frame, only the latest one is rendered
+        loop.request(azimuth=2.0)
+        loop.request(azimuth=3.0)
+        scene.gate.set()
+        wait_until(lambda: loop.stats['rendered'] == 2)
+
+        # the first frame was never picked up, so it is replaced by the newest one
+        loop.poll()
+        self.assertEqual(scene.rendered, [(1.0, 1.0), (3.0, 1.0)])
+        self.assertEqual(scene.submitted, [(3.0, 1.0)])
+        self.assertEqual(loop.stats['requests'], 3)
+        self.assertEqual(loop.stats['dropped'], 1)
+        self.assertEqual(loop.stats['shown'], 1)
+        # nothing new to show
+        loop.poll()
+        self.assertEqual(len(scene.submitted), 1)
+
+    def test_poll_reschedules_until_stopped(self):
+        from render_loop import RenderLoop
+        loop = RenderLoop(FakeScene(), interval=7)
+        widget = self.start(loop)
+        self.assertEqual(widget.callbacks, [(7, loop.poll)])
+        loop.poll()
+        self.assertEqual(len(widget.callbacks), 2)
+        loop.stop()
+        loop.poll()
+        self.assertEqual(len(widget.callbacks), 2)
+
+    def test_set_scene_drops_frames_of_the_previous_scene(self):
+        from render_loop import RenderLoop
+        old = FakeScene()
+        old.gate = threading.Event()
+        loop = RenderLoop(old)
+        self.start(loop)
+
+        loop.request(azimuth=1.0)
+        self.assertTrue(old.busy.wait(5))
+        new = FakeScene()
+        loop.set_scene(new, azimuth=5.0)
+        old.gate.set()
+        wait_until(lambda: loop.stats['rendered'] == 1)
+
+        loop.poll()
+        self.assertEqual(old.submitted, [])
+        self.assertEqual(new.rendered, [(5.0, 1.0)])
+        self.assertEqual(new.submitted, [(5.0, 1.0)])
+        self.assertEqual(loop.stats['dropped'], 0)
+
+    def test_light_only_requests_reshade(self):
+        from render_loop import RenderLoop
+        scene = FakeScene()
+        loop = RenderLoop(scene)
+        self.start(loop)
+        loop.request(azimuth=1.0)
+        wait_until(lambda: loop.stats['rendered'] == 1)
+        loop.poll()
+        loop.request(light=(0.5, 0.25))
+        wait_until(lambda: loop.stats['rendered'] == 2)
+        loop.poll()
+        self.assertEqual(scene.rendered, [(1.0, 1.0)])
+        self.assertEqual(scene.frustum.light_angles, (0.5, 0.25))
+        self.assertEqual(len(scene.submitted), 2)
+
+    def test_steps_pick_the_finest_threshold_in_budget(self):
+        from render_loop import RenderLoop
+        scene = FakeScene()
+        loop = RenderLoop(scene, budget=0.05, refinement=(8.0, 4.0, 2.0, 0.5))
+        # thresholds finer than the one of the scene are never used
+        steps = loop.steps(scene)
+        self.assertEqual(steps, [8.0, 4.0, 2.0, 1.0])
+        # nothing measured yet: the coarsest step
+        self.assertEqual(loop.interactive_step(steps), 0)
+        loop.frame_times = {8.0: 0.01, 4.0: 0.04, 2.0: 0.08}
+        self.assertEqual(loop.interactive_step(steps), 1)
+        loop.frame_times[1.0] = 0.05
+        self.assertEqual(loop.interactive_step(steps), 3)
+        loop.frame_times = {8.0: 0.06}
+        self.assertEqual(loop.interactive_step(steps), 0)
+
+        full = RenderLoop(scene)
+        self.assertEqual(full.steps(scene), [1.0])
+        self.assertEqual(full.interactive_step(full.steps(scene)), 0)
+
+    def test_idle_refinement_runs_coarse_to_fine(self):
+        from render_loop import RenderLoop
+        scene = FakeScene()
+        loop = RenderLoop(scene, budget=0.05, idle_time=0.01)
+        loop.frame_times = {8.0: 0.01, 4.0: 0.1}
+        self.start(loop)
+        loop.request(azimuth=1.0)
+        # each refinement pass waits for the previous frame to be shown
+        while not scene.submitted or scene.submitted[-1][1] > 1.0:
+            wait_until(lambda: loop.result is not None)
+            loop.poll()
+        self.assertEqual([threshold for _, threshold in scene.submitted], [8.0, 4.0, 2.0, 1.0])
+        self.assertEqual(loop.stats['refined'], 3)
+        # refined frames are timed, and update the measure of their step
+        self.assertLess(loop.frame_times[4.0], 0.1)
+        self.assertIn(1.0, loop.frame_times)
+        # at full quality the worker waits for input
+        time.sleep(0.05)
+        self.assertIsNone(loop.result)
+        self.assertEqual(len(scene.rendered), 4)
+
+    def test_speculated_frames_are_served_from_the_cache(self):
+        from frame_cache import FrameCache
+        from render_loop import RenderLoop
+        scene = FakeScene()
+        cache = FrameCache()
+        loop = RenderLoop(scene, frame_cache=cache, speculation=1, speculation_step=0.01)
+        self.start(loop)
+        loop.request(azimuth=1.0)
+        wait_until(lambda: loop.result is not None)
+        # speculation starts once the frame was shown: the next pose in the direction of the move first
+        loop.poll()
+        wait_until(lambda: loop.stats['speculated'] == 2)
+        self.assertEqual([azimuth for azimuth, _ in scene.rendered], [1.0, 1.01, 0.99])
+        self.assertEqual(scene.frustum.azimuth, 1.0)
+
+        loop.request(azimuth=1.01)
+        wait_until(lambda: loop.result is not None)
+        loop.poll()
+        self.assertEqual(len(scene.rendered), 3)
+        self.assertEqual(scene.submitted[-1], (1.01, 1.0))
+        self.assertEqual(loop.stats['speculative_hits'], 1)
+        self.assertEqual(cache.stats['hits'], 1)
+        self.assertEqual(loop.speculation_hit_rate(), 0.5)
+
+    def test_requests_abandon_speculation(self):
+        from frame_cache import FrameCache
+        from render_loop import RenderLoop
+        scene = FakeScene()
+        cache = FrameCache()
+        loop = RenderLoop(scene, frame_cache=cache, speculation=1, speculation_step=0.01)
+        self.start(loop)
+        loop.request(azimuth=1.0)
+        wait_until(lambda: loop.result is not None)
+        scene.gate = threading.Event()
+        scene.busy.clear()
+        loop.poll()
+        # the worker is in the middle of the speculative frame of 1.01 when the request comes in
+        self.assertTrue(scene.busy.wait(5))
+        self.assertEqual(scene.rendered[-1], (1.01, 1.0))
+        loop.request(azimuth=2.0)
+        scene.gate.set()
+        wait_until(lambda: loop.result is not None)
+        loop.poll()
+        self.assertEqual(scene.submitted[-1], (2.0, 1.0))
+        self.assertEqual(scene.rendered[2], (2.0, 1.0))
+        loop.stop()
+        abandoned = FakeScene()
+        abandoned.frustum.set_azimuth(1.01)
+        self.assertNotIn(cache.key(abandoned, 1.0), cache)
+        self.assertNotIn(cache.key(abandoned, 1.0), loop.speculated)
+
+    def test_loader_renders_each_step(self):
+        from frame_cache import FrameCache
+        from render_loop import RenderLoop
+        old = FakeScene()
+        loop = RenderLoop(old, frame_cache=FrameCache())
+        self.start(loop)
+        scene = FakeScene()
+        steps = []
+
+        # each step of the loader turns the camera, so the frames tell which step they show
+        def loader():
+            for azimuth in (1.0, 2.0, 3.0):
+                steps.append(azimuth)
+                scene.frustum.set_azimuth(azimuth)
+                yield azimuth
+                # the frame of the step was shown before the next one is loaded
+                wait_until(lambda: scene.submitted and scene.submitted[-1][0] == azimuth)
+
+        loop.set_scene(scene, loader=loader())
+        while len(scene.submitted) < 3:
+            wait_until(lambda: loop.result is not None)
+            loop.poll()
+        wait_until(lambda: loop.loader is None)
+        self.assertEqual(steps, [1.0, 2.0, 3.0])
+        self.assertEqual(scene.rendered, [(1.0, 1.0), (2.0, 1.0), (3.0, 1.0)])
+        self.assertEqual([azimuth for azimuth, _ in scene.submitted], [1.0, 2.0, 3.0])
+        # frames of a scene being loaded are not cached
+        self.assertEqual(len(loop.frame_cache), 0)
@@ -0,0 +1,43 @@
+#
+# test_util.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+from unittest import TestCase
+
+
+class TestDepthSorter(TestCase):
+    def test_reused_orders_stay_within_tolerance(self):
+        import numpy as np
+        from util import DepthSorter
+        generator = np.random.default_rng(11)
+        xs = generator.uniform(-3, 3, 2000)
+        zs = generator.uniform(-3, 3, 2000)
+        ids = np.arange(2000)
+        sorter = DepthSorter(tolerance=0.05)
+        for frame in range(40):
+            keys = xs * np.sin(0.002 * frame) + zs * np.cos(0.002 * frame)
+            order = sorter.order(ids, keys)
+            self.assertEqual(sorted(order.tolist()), ids.tolist())
+            # no element comes after one that is deeper by more than the tolerance
+            ordered = keys[order]
+            self.assertLessEqual((np.maximum.accumulate(ordered) - ordered).max(), sorter.tolerance)
+        self.assertGreater(sorter.stats['reused'], 0)
+        self.assertGreater(sorter.stats['repaired'], 0)
+
+    def test_exact_sorter_never_reuses_an_unsorted_order(self):
+        import numpy as np
+        from util import DepthSorter
+        sorter = DepthSorter()
+        sorter.order(np.arange(3), np.array([0.0, 1.0, 2.0]))
+        order = sorter.order(np.arange(3), np.array([0.0, 1.0, 0.999]))
+        self.assertEqual(order.tolist(), [0, 2, 1])
+        self.assertEqual(sorter.stats['reused'], 0)
+
+    def test_scene_sorter_has_a_tolerance(self):
+        import render
+        scene = render.Scene3D('sphere2.obj', None, None, None)
+        scene.parse_file()
+        self.assertGreater(scene.sorter.tolerance, 0.0)
+        self.assertLess(scene.sorter.tolerance, scene.object_radii.max())
@@ -0,0 +1,138 @@
+#
+# tiles.py
+#
+# Created by Mariano Arselan at 18-10-26
+#
+
+import weakref
+import numpy as np
+from multiprocessing import Pool
+from multiprocessing import shared_memory
+from bvh import BVH
+from intersect import TriangleData
+
+
+# copies a set of named arrays into shared memory blocks. specs describes them so other processes can attach
+class SharedArrays:
+    def __init__(self, arrays):
+        self.blocks = []
+        self.arrays = {}
+        self.specs = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared[...] = array
+            self.blocks.append(block)
+            self.arrays[name] = shared
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self):
+        self.arrays = {}
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    @staticmethod
+    def attach(specs):
+        blocks = []
+        arrays = {}
+        for name, (block_name, shape, dtype) in specs.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        return arrays, blocks
+
+
+# state of each worker process, set once by attach_worker
+worker = {}
+
+
+def attach_worker(specs):
+    arrays, blocks = SharedArrays.attach(specs)
+    worker['blocks'] = blocks
+    worker['arrays'] = arrays
+    worker['bvh'] = BVH.from_arrays(arrays, TriangleData.from_arrays(arrays))
+
+
+# ray casts one tile of the pixel grid and writes it straight into the shared framebuffer
+def render_tile(task):
+    row0, row1, col0, col1, eye, base, vc_distance = task
+    arrays = worker['arrays']
+    point_x, point_y = np.meshgrid(arrays['pixel_x'][col0:col1], arrays['pixel_y'][row0:row1])
+    directions = point_x.reshape(-1, 1) * base[0] + point_y.reshape(-1, 1) * base[1] - vc_distance * base[2]
+    _, triangles, _, _ = worker['bvh'].intersect_packet(eye, directions, arrays['visible'])
+
+    hit = triangles >= 0
+    color = np.ones((len(triangles), 3))
+    color[hit] = arrays['colors'][triangles[hit]]
+    arrays['framebuffer'][row0:row1, col0:col1] = color.reshape(row1 - row0, col1 - col0, 3)
+    arrays['triangle_ids'][row0:row1, col0:col1] = triangles.reshape(row1 - row0, col1 - col0)
+    return row0, col0
+
+
+class TileRenderer:
+    # ray casts a scene by splitting the pixel grid of its frustum into tiles that a pool of processes renders in
+    # parallel. The mesh, its BVH and the framebuffer live in shared memory, the workers attach to them once when
+    # they start, and only the camera and the tile bounds travel with each task. The visible triangles and their
+    # colors change every frame, they are written to shared arrays before the tiles are dispatched
+    def __init__(self, scene, processes=None, tile_size=32):
+        frustum = scene.frustum
+        if scene.bvh is None:
+            scene.bvh = BVH(scene.mesh, scene.triangle_data)
+        self.scene = scene
+        self.tile_size = tile_size
+        self.resolution = (frustum.x_res, frustum.y_res)
+
+        arrays = {**scene.triangle_data.arrays(), **scene.bvh.arrays()}
+        arrays['visible'] = np.zeros(len(scene.mesh), dtype=bool)
+        arrays['colors'] = np.zeros((len(scene.mesh), 3))
+        arrays['framebuffer'] = np.ones((frustum.y_res, frustum.x_res, 3))
+        arrays['triangle_ids'] = np.full((frustum.y_res, frustum.x_res), -1)
+        arrays['pixel_x'] = frustum.pixel_size_x * np.arange(frustum.x_res) - frustum.half_width + frustum.half_pixel_x
+        arrays['pixel_y'] = -frustum.pixel_size_y * np.arange(frustum.y_res) + frustum.half_height - frustum.half_pixel_y
+        self.shared = SharedArrays(arrays)
+        self.pool = Pool(processes, initializer=attach_worker, initargs=(self.shared.specs,))
+        self.finalizer = weakref.finalize(self, TileRenderer.release, self.pool, self.shared)
+
+    @staticmethod
+    def release(pool, shared):
+        pool.terminate()
+        pool.join()
+        shared.close()
+
+    def close(self):
+        self.finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def tiles(self):
+        x_res, y_res = self.resolution
+        size = self.tile_size
+        return [(row, min(row + size, y_res), col, min(col + size, x_res))
+                for row in range(0, y_res, size) for col in range(0, x_res, size)]
+
+    # renders the current view of the scene. indices are the triangles that survived Scene3D.transform, when the
+    # caller already ran it for this view. Returns the assembled (y_res, x_res, 3) image and the id of the triangle
+    # seen by each pixel (-1 for none)
+    def render(self, indices=None):
+        scene = self.scene
+        frustum = scene.frustum
+        if indices is None:
+            indices, _ = scene.transform()
+        visible = self.shared['visible']
+        visible[:] = False
+        visible[indices] = True
+        self.shared['colors'][indices] = scene.shade(indices)
+
+        tasks = [(*tile, frustum.eye, frustum.base, 10.0) for tile in self.tiles()]
+        self.pool.map(render_tile, tasks)
+        return self.shared['framebuffer'].copy(), self.shared['triangle_ids'].copy()
@@ -5,6 +5,8 @@
 #
 
 import random
+import time
+import numpy as np
 
 def array_is_in_order(arr):
     for i in range(0, len(arr)-1):
@@ -47,7 +49,134 @@ def quick_sort(arr):
     quick_sort_partition(arr, 0, len(arr)-1)
 
 
+# maps the keys onto unsigned integers of the given number of bits, keeping their order
+def quantize_depths(keys, bits=16):
+    keys = np.asarray(keys, dtype=float)
+    dtype = np.uint16 if bits <= 16 else np.uint32
+    if len(keys) == 0:
+        return np.empty(0, dtype=dtype)
+    low = keys.min()
+    span = keys.max() - low
+    if span == 0:
+        return np.zeros(len(keys), dtype=dtype)
+    return ((keys - low) * ((2 ** bits - 1) / span)).astype(dtype)
+
+def argsort_order(keys):
+    return np.argsort(keys, kind='stable')
+
+# LSD radix sort on the quantized keys, one stable pass per byte. Keys that quantize to the same value keep their
+# relative order
+def radix_order(keys, bits=16):
+    quantized = quantize_depths(keys, bits)
+    order = np.arange(len(quantized))
+    for shift in range(0, bits, 8):
+        digits = ((quantized[order] >> shift) & 0xff).astype(np.uint8)
+        order = order[np.argsort(digits, kind='stable')]
+    return order
+
+# returns the positions of the keys in ascending order, computing one key per element instead of comparing elements
+def depth_order(keys, method='argsort', bits=16):
+    if method == 'argsort':
+        return argsort_order(keys)
+    if method == 'radix':
+        return radix_order(keys, bits)
+    raise ValueError(f'unknown depth sort method: {method}')
+
+class DepthSorter:
+    # ids identify the elements across frames (e.g. the index of a triangle in the mesh). The previous frame's order
+    # is reused as is when no element in it comes after one whose key is larger by more than tolerance (in key
+    # units), so no two elements are ever drawn out of order by more than that. Otherwise,
+    # with the argsort method, it is repaired with an adaptive stable sort, which is close to linear on the almost
+    # sorted orders produced by small camera moves. The radix method always sorts from scratch
+    def __init__(self, method='argsort', tolerance=0.0, bits=16):
+        self.method = method
+        self.tolerance = tolerance
+        self.bits = bits
+        self.previous = None
+        self.stats = {'reused': 0, 'repaired': 0, 'sorted': 0}
+
+    def reset(self):
+        self.previous = None
+
+    # the current elements in the order they had in the previous frame. Elements that were not there are appended
+    def previous_order(self, ids):
+        size = max(ids.max(), self.previous.max()) + 1
+        positions = np.full(size, -1)
+        positions[ids] = np.arange(len(ids))
+        order = positions[self.previous]
+        order = order[order >= 0]
+        seen = np.zeros(len(ids), dtype=bool)
+        seen[order] = True
+        return np.concatenate((order, np.flatnonzero(~seen)))
+
+    def order(self, ids, keys):
+        ids = np.asarray(ids)
+        keys = np.asarray(keys)
+        order = None
+        if self.previous is not None and len(self.previous) > 0 and len(ids) > 0:
+            candidate = self.previous_order(ids)
+            candidate_keys = keys[candidate]
+            if (np.maximum.accumulate(candidate_keys) - candidate_keys).max() <= self.tolerance:
+                order = candidate
+                self.stats['reused'] += 1
+            elif self.method == 'argsort':
+                order = candidate[np.argsort(keys[candidate], kind='stable')]
+                self.stats['repaired'] += 1
+        if order is None:
+            order = depth_order(keys, self.method, self.bits)
+            self.stats['sorted'] += 1
+        self.previous = ids[order]
+        return order
+
+
+def benchmark(name, frames, sort):
+    start = time.perf_counter()
+    try:
+        for keys in frames:
+            order = sort(keys)
+    except RecursionError:
+        print(f'{name:>12}: recursion limit reached')
+        return
+    elapsed = time.perf_counter() - start
+    # radix sorts quantized keys, so the order is checked at that resolution
+    in_order = array_is_in_order(list(quantize_depths(frames[-1])[order]))
+    print(f'{name:>12}: {1000 * elapsed / len(frames):8.3f} ms/frame  in order: {in_order}')
+
+
 if __name__ == '__main__':
     arr = random.sample(range(0, 100000), 10000)
     quick_sort(arr)
     print(array_is_in_order(arr))
+
+    # depths of random points seen by a camera rotating 0.01 rad per frame around the Y axis, like the frames
+    # produced by moving the azimuth slider
+    count = 10000
+    xs = np.random.uniform(-3, 3, count)
+    zs = np.random.uniform(-3, 3, count)
+    frames = [xs * np.sin(0.01 * frame) + zs * np.cos(0.01 * frame) for frame in range(20)]
+    ids = np.arange(count)
+
+    def quick_sort_order(keys):
+        pairs = [(key, position) for position, key in enumerate(keys)]
+        quick_sort(pairs)
+        return np.array([position for _, position in pairs])
+
+    def previous_frame_quick_sort_order(keys):
+        # quick_sort fed with the previous frame's (almost sorted) order, its worst case
+        pairs = [(keys[position], position) for position in sorted_frames[-1]]
+        quick_sort(pairs)
+        sorted_frames.append([position for _, position in pairs])
+        return np.array(sorted_frames[-1])
+
+    sorted_frames = [list(np.argsort(frames[0]))]
+    sorter = DepthSorter()
+    tolerant_sorter = DepthSorter(tolerance=0.1)
+    print(f'{count} keys, {len(frames)} frames')
+    benchmark('quick_sort', frames, quick_sort_order)
+    benchmark('quick_sort*', frames, previous_frame_quick_sort_order)
+    benchmark('argsort', frames, argsort_order)
+    benchmark('radix', frames, radix_order)
+    benchmark('incremental', frames, lambda keys: sorter.order(ids, keys))
+    benchmark('tolerant', frames, lambda keys: tolerant_sorter.order(ids, keys))
+    print(f'incremental: {sorter.stats}')
+    print(f'tolerant: {tolerant_sorter.stats}')